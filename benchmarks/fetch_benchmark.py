@@ -0,0 +1,116 @@
+"""
+Drives both fetchers against the local mock API server and reports latency, failures and how many upstream requests
+each call really cost (retries included).
+
+Example:
+    python -m benchmarks.fetch_benchmark --requests 500 --concurrency 16 --error-rate 0.05 --rate-limit-rate 0.02
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from benchmarks.mock_api_server import MockApiServer, MockApiConfig
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _timed_call(fetch: Callable[[], float]) -> Tuple[float, bool, str]:
+    start = time.perf_counter()
+    try:
+        value = fetch()
+        error = ""
+    except Exception as e:
+        value = -1.0
+        error = type(e).__name__
+    return time.perf_counter() - start, value >= 0, error
+
+
+def run_benchmark(name: str, fetch: Callable[[], float], requests: int, concurrency: int) -> dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: _timed_call(fetch), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency * 1000 for latency, _, _ in results]
+    successes = sum(1 for _, ok, _ in results if ok)
+    exceptions = [error for _, _, error in results if error]
+
+    return {
+        "name": name,
+        "calls": requests,
+        "succeeded": successes,
+        "failed": requests - successes,
+        "raised": len(exceptions),
+        "throughput_per_s": requests / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.mean(latencies) if latencies else 0.0,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": max(latencies, default=0.0),
+    }
+
+
+def _print_report(result: dict, upstream_requests: int):
+    amplification = upstream_requests / result["calls"] if result["calls"] else 0.0
+    print(f"\n== {result['name']}")
+    print(f"calls: {result['calls']}, succeeded: {result['succeeded']}, failed: {result['failed']}, "
+          f"raised: {result['raised']}")
+    print(f"upstream requests: {upstream_requests} ({amplification:.2f} per call)")
+    print(f"throughput: {result['throughput_per_s']:.1f} calls/s")
+    print(f"latency ms: mean {result['mean_ms']:.1f}, p50 {result['p50_ms']:.1f}, p95 {result['p95_ms']:.1f}, "
+          f"p99 {result['p99_ms']:.1f}, max {result['max_ms']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch-path load benchmark against the mock API server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--latency-jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0)
+    parser.add_argument("--malformed-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = MockApiConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+
+    with MockApiServer(config) as server:
+        os.environ["COINMARKETCAP_BASE_URL"] = server.base_url
+        os.environ["UNMINEABLE_BASE_URL"] = server.base_url
+        os.environ.setdefault("COINMARKETCAP_API_KEY", "benchmark")
+        os.environ.setdefault("MONERO_WALLET", "benchmark-wallet")
+
+        # Imported late so the fetchers never see the real endpoints.
+        from src.data_fetchers.crypto_value_fetcher import get_current_crypto_value
+        from src.data_fetchers.mined_value_fetcher import get_current_mined_value
+        from src.settings.settings import load_settings
+        load_settings()
+
+        for name, stat_key, fetch in (
+                ("crypto_value_fetcher", "coinmarketcap", get_current_crypto_value),
+                ("mined_value_fetcher", "unmineable", get_current_mined_value)):
+            result = run_benchmark(name, fetch, args.requests, args.concurrency)
+            _print_report(result, server.stats[stat_key])
+
+        print(f"\nserver outcomes: {dict(server.stats)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Offline benchmarks for the render, pack and transfer hot paths: main.draw_image end to end (with the same values and
+with new values), a frame the render cache answers (ticker mode), ImageBuilder.add_text and add_image, EPD.getbuffer,
+and the EPD display calls against a recording SPI stand-in (see recording_device.py).
+
+For each operation it reports the time per call, memory (peak and retained, from tracemalloc) and what went over the
+wire (SPI transactions, bytes, GPIO writes, busy reads). Results are compared against a stored baseline, and the run
+fails (exit code 1) on a regression:
+- SPI/GPIO counters are deterministic, so any increase fails.
+- Peak memory fails past the tolerance.
+- Times fail past the tolerance, but only if the baseline was recorded on the same kind of machine (architecture and
+Python version). Otherwise they're reported, not compared.
+
+Times are noisy, so:
+- The iterations are split into rounds, and the time compared is the best round's median: a burst of noise (another
+  process, a GC pass) doesn't fail the run.
+- Differences below TIME_SLACK_MS never fail it: the fastest operations take a few microseconds, where the timer's own
+  jitter is more than the tolerance.
+- Machines go through slower spells (CPU frequency scaling, busy neighbours) that last longer than a whole run, so
+  operations that regress are measured again (--retries, after a pause that doubles each time) and only fail if none of
+  the attempts is within the tolerance. For the same reason, --save-baseline keeps the best of --retries + 1
+  measurements of each operation.
+
+Example:
+    python -m benchmarks.hotpath_benchmark
+    python -m benchmarks.hotpath_benchmark --iterations 500 --rounds 10 --tolerance 0.1
+    python -m benchmarks.hotpath_benchmark --save-baseline
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from benchmarks.recording_device import RecordingDevice, install
+
+# Must run before anything imports the EPD driver.
+install()
+
+import main as app  # noqa: E402
+from src.drivers.waveshare_epd.epd2in13_V3 import EPD  # noqa: E402
+from src.image_builder.image_builder import ImageBuilder  # noqa: E402
+from src.settings.settings import get_settings  # noqa: E402
+from src.utils.asset_utils import get_available_images  # noqa: E402
+
+BASELINE_FILE = Path(__file__).parent.joinpath("baseline.json")
+COUNTERS = ("transactions", "bytes_sent", "gpio_writes", "busy_reads")
+# Peak memory can wobble by a few blocks between runs, so small increases never fail the run.
+PEAK_BYTES_SLACK = 4 * 1024
+# Same for times: small increases (in ms) never fail the run
+TIME_SLACK_MS = 0.01
+
+
+def _machine() -> str:
+    return f"{platform.machine()}-{platform.python_implementation()}-{platform.python_version()}"
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _best_round_median(operation: Callable[[], object], rounds: int, round_size: int) -> Tuple[float, List[float]]:
+    """
+    :return: The best round's median and every timing, in ms.
+    """
+    timings = []
+    round_medians = []
+    for _ in range(rounds):
+        round_timings = []
+        for _ in range(round_size):
+            start = time.perf_counter()
+            operation()
+            round_timings.append((time.perf_counter() - start) * 1000)
+        timings.extend(round_timings)
+        round_medians.append(statistics.median(round_timings))
+    return min(round_medians), timings
+
+
+def _measure_memory(operation: Callable[[], object]) -> Tuple[int, int]:
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = operation()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Keep the result alive until now, so returned objects count as retained
+    del result
+    return peak - start, current - start
+
+
+def run_operation(name: str, operation: Callable[[], object], device: RecordingDevice, iterations: int,
+                  warmup: int, rounds: int = 1) -> dict:
+    for _ in range(warmup):
+        operation()
+
+    device.reset_counters()
+    operation()
+    counters = device.counters()
+
+    best_p50_ms, timings = _best_round_median(operation, rounds, max(1, iterations // rounds))
+
+    peak_bytes, retained_bytes = _measure_memory(operation)
+
+    return {
+        "name": name,
+        "iterations": len(timings),
+        "rounds": rounds,
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": _percentile(timings, 50),
+        "p95_ms": _percentile(timings, 95),
+        "min_ms": min(timings),
+        "best_p50_ms": best_p50_ms,
+        "peak_bytes": peak_bytes,
+        "retained_bytes": retained_bytes,
+        **{counter: counters[counter] for counter in COUNTERS},
+    }
+
+
+def build_operations(device: RecordingDevice) -> List[Tuple[str, Callable[[], object]]]:
+    epd = EPD(device)
+    width, height = get_settings().display_size
+    frame = app.draw_image(0.01234567, 150.0, "Idle")
+    buffer = epd.getbuffer(frame)
+    builder = ImageBuilder(width, height)
+    monero_icon = get_available_images().get("monero(1)")
+    # draw_image's clock shows the seconds, so its frames are never cached, but the text tiles of values that don't
+    # change are. A new balance on every call gets new text tiles too.
+    balances = (0.01234567 + step * 1e-8 for step in itertools.count())
+    clock_glyphs = app.build_clock_glyphs()
+
+    return [
+        ("draw_image", lambda: app.draw_image(0.01234567, 150.0, "Idle")),
+        ("draw_image_new_values", lambda: app.draw_image(next(balances), 150.0, "Idle")),
+        ("draw_image_cached", lambda: app.render_frame(0.01234567, 150.0, "Idle", clock_glyphs, clock_time=0).image),
+        ("add_text", lambda: builder.add_text("0.01234567", "title", x_percent=0.62, y_percent=0.3, bold=True)),
+        ("add_image", lambda: builder.add_image(monero_icon, x_percent=0.2, y_percent=0.4, scale=0.1)),
+        ("getbuffer", lambda: epd.getbuffer(frame)),
+        ("display", lambda: epd.display(buffer)),
+        ("displayPartial", lambda: epd.displayPartial(buffer)),
+        ("displayPartBaseImage", lambda: epd.displayPartBaseImage(buffer)),
+        # The size of a clock digit update (see the clock ticker in main.py)
+        ("displayPartialWindow", lambda: epd.displayPartialWindow(buffer, 101, 18, 115, 24)),
+    ]
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[Tuple[str, str]]:
+    """
+    :return: The operation and a message, for each regression.
+    """
+    baseline_results = {result["name"]: result for result in baseline.get("results", [])}
+    compare_times = baseline.get("machine") == _machine()
+    regressions = []
+
+    for result in results:
+        previous = baseline_results.get(result["name"])
+        if previous is None:
+            continue
+
+        for counter in COUNTERS:
+            if result[counter] > previous[counter]:
+                regressions.append((result["name"], f"{counter} went from {previous[counter]} to {result[counter]}"))
+
+        if result["peak_bytes"] > previous["peak_bytes"] * (1 + tolerance) + PEAK_BYTES_SLACK:
+            regressions.append((result["name"], f"peak memory went from {previous['peak_bytes']} to "
+                                                f"{result['peak_bytes']} bytes"))
+
+        # Baselines from before the rounds only have the overall median
+        previous_ms = previous.get("best_p50_ms", previous["p50_ms"])
+        if compare_times and result["best_p50_ms"] > previous_ms * (1 + tolerance) + TIME_SLACK_MS:
+            regressions.append((result["name"], f"best round p50 went from {previous_ms:.3f} to "
+                                                f"{result['best_p50_ms']:.3f} ms"))
+
+    return regressions
+
+
+def _print_report(results: List[dict]):
+    print(f"\n{'operation':<22}{'best ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak KiB':>10}{'kept KiB':>10}"
+          f"{'SPI txns':>10}{'bytes':>8}{'GPIO':>8}{'busy':>6}")
+    for result in results:
+        print(f"{result['name']:<22}{result['best_p50_ms']:>10.3f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+              f"{result['peak_bytes'] / 1024:>10.1f}{result['retained_bytes'] / 1024:>10.1f}"
+              f"{result['transactions']:>10}{result['bytes_sent']:>8}{result['gpio_writes']:>8}"
+              f"{result['busy_reads']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render, pack and transfer hot path benchmarks")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per operation, over every round")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds the timed calls are split into")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown/growth (0.25 = 25%%)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--retries", type=int, default=3, help="Times operations that regress are measured again")
+    parser.add_argument("--retry-delay", type=float, default=1.0,
+                        help="Seconds to wait before the first retry (doubled for each one after it)")
+    args = parser.parse_args()
+
+    if not 1 <= args.rounds <= args.iterations:
+        parser.error(f"--rounds must be between 1 and --iterations. Got {args.rounds}.")
+
+    device = RecordingDevice()
+    operations = dict(build_operations(device))
+    results = [
+        run_operation(name, operation, device, args.iterations, args.warmup, args.rounds)
+        for name, operation in operations.items()
+    ]
+
+    if args.save_baseline:
+        for _ in range(args.retries):
+            results = [
+                min(result, run_operation(name, operation, device, args.iterations, args.warmup, args.rounds),
+                    key=lambda candidate: candidate["best_p50_ms"])
+                for result, (name, operation) in zip(results, operations.items())
+            ]
+
+    _print_report(results)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({"machine": _machine(), "results": results}, indent=2) + "\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}. Run with --save-baseline to create one.")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("machine") != _machine():
+        print(f"\nBaseline was recorded on {baseline.get('machine')}, this is {_machine()}. "
+              f"Only comparing counters and memory.")
+
+    regressions = compare(results, baseline, args.tolerance)
+    for attempt in range(args.retries):
+        regressed = {name for name, _ in regressions}
+        if not regressed:
+            break
+
+        print(f"\nMeasuring {', '.join(sorted(regressed))} again ({attempt + 1}/{args.retries})")
+        time.sleep(args.retry_delay * 2 ** attempt)
+        for index, result in enumerate(results):
+            if result["name"] in regressed:
+                retry = run_operation(result["name"], operations[result["name"]], device, args.iterations,
+                                      args.warmup, args.rounds)
+                results[index] = min(result, retry, key=lambda candidate: candidate["best_p50_ms"])
+        regressions = compare(results, baseline, args.tolerance)
+
+    if regressions:
+        print("\nRegressions:")
+        for name, regression in regressions:
+            print(f"  {name}: {regression}")
+        sys.exit(1)
+
+    print("\nNo regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Checks the Jetson Nano software SPI backend (epdconfig.JetsonNano) without Jetson hardware: builds a stub
+sysfs_software_spi.so (see stub_sysfs_software_spi.c) with and without the bulk transfer entry point, then counts the
+foreign calls, bytes and time it takes to send a frame through each build.
+
+The bulk build must send each buffer in one call, and both builds must put the same bytes on the wire. Otherwise the
+run fails (exit code 1). Needs a C compiler (cc, or the one in $CC).
+
+Example:
+    python -m benchmarks.jetson_spi_benchmark
+    python -m benchmarks.jetson_spi_benchmark --iterations 50
+"""
+import argparse
+import ctypes
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+STUB_SOURCE = Path(__file__).parent.joinpath("stub_sysfs_software_spi.c")
+
+
+class _StubGpio:
+    """
+    Stand-in for Jetson.GPIO: the busy pin always reads as idle.
+    """
+    BCM = OUT = IN = 0
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, enabled):
+        pass
+
+    def setup(self, pin, direction):
+        pass
+
+    def output(self, pin, value):
+        pass
+
+    def input(self, pin):
+        return 0
+
+    def cleanup(self, pins=None):
+        pass
+
+
+def _install_stub_gpio():
+    try:
+        import Jetson.GPIO  # noqa: F401
+    except ImportError:
+        jetson = types.ModuleType("Jetson")
+        jetson.GPIO = _StubGpio()
+        sys.modules["Jetson"] = jetson
+        sys.modules["Jetson.GPIO"] = jetson.GPIO
+
+
+def build_stub(output_folder: Path, with_bulk: bool) -> Path:
+    library = output_folder.joinpath("stub_bulk.so" if with_bulk else "stub_per_byte.so")
+    command = [os.environ.get("CC", "cc"), "-O2", "-shared", "-fPIC", "-o", str(library), str(STUB_SOURCE)]
+    if with_bulk:
+        command.insert(1, "-DWITH_BULK")
+    subprocess.run(command, check=True)
+    return library
+
+
+def run_backend(name: str, library: Path, frame: bytearray, iterations: int) -> dict:
+    from src.drivers.waveshare_epd.epd2in13_V3 import EPD
+    from src.drivers.waveshare_epd.epdconfig import JetsonNano
+
+    device = JetsonNano(spi_library=str(library))
+    device.delay_ms = lambda delaytime: None
+    epd = EPD(device)
+    stub = device.SPI
+    stub.stub_calls.restype = ctypes.c_uint64
+    stub.stub_bytes.restype = ctypes.c_uint64
+    stub.stub_checksum.restype = ctypes.c_uint32
+
+    operations: List[Tuple[str, Callable[[], object]]] = [
+        ("spi_writebyte2", lambda: device.spi_writebyte2(frame)),
+        ("spi_writebyte2 (list)", lambda: device.spi_writebyte2(list(frame))),
+        ("displayPartBaseImage", lambda: epd.displayPartBaseImage(frame)),
+    ]
+
+    results = []
+    for operation_name, operation in operations:
+        stub.stub_reset()
+        operation()
+        calls, sent, checksum = stub.stub_calls(), stub.stub_bytes(), stub.stub_checksum()
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        results.append({
+            "backend": name,
+            "operation": operation_name,
+            "calls": calls,
+            "bytes": sent,
+            "checksum": checksum,
+            "p50_ms": statistics.median(timings),
+        })
+
+    return {"bulk": device.has_bulk_transfer, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jetson Nano software SPI bulk transfer benchmark")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    _install_stub_gpio()
+    # A full frame of the 2.13" panel: 16 bytes per row, 250 rows
+    frame = bytearray(random.Random(0).getrandbits(8) for _ in range(16 * 250))
+
+    with tempfile.TemporaryDirectory() as folder:
+        per_byte = run_backend("per byte", build_stub(Path(folder), with_bulk=False), frame, args.iterations)
+        bulk = run_backend("bulk", build_stub(Path(folder), with_bulk=True), frame, args.iterations)
+
+    print(f"\n{'backend':<10}{'operation':<24}{'calls':>8}{'bytes':>8}{'p50 ms':>10}")
+    for result in per_byte["results"] + bulk["results"]:
+        print(f"{result['backend']:<10}{result['operation']:<24}{result['calls']:>8}{result['bytes']:>8}"
+              f"{result['p50_ms']:>10.3f}")
+
+    failures = []
+    if per_byte["bulk"] or not bulk["bulk"]:
+        failures.append("The bulk entry point wasn't detected correctly.")
+
+    for slow, fast in zip(per_byte["results"], bulk["results"]):
+        if (slow["bytes"], slow["checksum"]) != (fast["bytes"], fast["checksum"]):
+            failures.append(f"{fast['operation']}: the bulk build sent different bytes.")
+
+    frame_transfer = bulk["results"][0]
+    if frame_transfer["calls"] != 1:
+        failures.append(f"spi_writebyte2 took {frame_transfer['calls']} calls with the bulk build, expected 1.")
+
+    if failures:
+        print("\nFailures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    print("\nThe bulk build sends each buffer in one call.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Local stand-ins for the CoinMarketCap and unMineable APIs.
+
+Both response shapes are served by the same server, so a single instance can back both fetchers. Point the fetchers at
+it with the COINMARKETCAP_BASE_URL and UNMINEABLE_BASE_URL env vars.
+
+Example:
+    python -m benchmarks.mock_api_server --port 8080 --latency-ms 250 --error-rate 0.1 --rate-limit-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+from pydantic.dataclasses import dataclass
+from simple_log_factory.log_factory import log_factory
+
+
+@dataclass
+class MockApiConfig:
+    latency_ms: Optional[float] = 0  # Base latency added to every response
+    latency_jitter_ms: Optional[float] = 0  # Random extra latency (0 to this value)
+    error_rate: Optional[float] = 0  # Fraction of responses that are 500s
+    rate_limit_rate: Optional[float] = 0  # Fraction of responses that are 429s
+    malformed_rate: Optional[float] = 0  # Fraction of responses with a broken payload
+    price: Optional[float] = 150.0
+    balance: Optional[float] = 0.01234567
+    seed: Optional[int] = None
+
+
+class MockApiServer:
+    def __init__(self, config: MockApiConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self._logger = log_factory("MockApiServer", unique_handler_types=True)
+        self.config = config or MockApiConfig()
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _roll(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _pick_outcome(self) -> str:
+        roll = self._roll()
+        for outcome, rate in (
+                ("error", self.config.error_rate),
+                ("rate_limited", self.config.rate_limit_rate),
+                ("malformed", self.config.malformed_rate)):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "ok"
+
+    def _latency(self) -> float:
+        jitter = self._roll() * self.config.latency_jitter_ms
+        return (self.config.latency_ms + jitter) / 1000
+
+    def _coinmarketcap_payload(self, symbol: str) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "status": {"timestamp": now, "error_code": 0, "error_message": None, "credit_count": 1},
+            "data": {
+                symbol: [{
+                    "id": 328,
+                    "name": "Monero",
+                    "symbol": symbol,
+                    "quote": {"USD": {"price": self.config.price, "last_updated": now}}
+                }]
+            }
+        }
+
+    def _unmineable_payload(self) -> dict:
+        return {
+            "success": True,
+            "msg": "Ok",
+            "data": {
+                "balance": f"{self.config.balance:.8f}",
+                "balance_payable": "0.00000000",
+                "payment_threshold": "0.1",
+                "network": "xmr"
+            }
+        }
+
+    def _build_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                # The default handler writes every request to stderr, which would drown the benchmark output.
+                pass
+
+            def _send(self, status: int, body: bytes, headers: dict = None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+
+                if parsed.path == "/v2/cryptocurrency/quotes/latest":
+                    symbol = parse_qs(parsed.query).get("symbol", ["XMR"])[0]
+                    payload = server._coinmarketcap_payload(symbol)
+                    server._count("coinmarketcap")
+                elif parsed.path.startswith("/v4/address/"):
+                    payload = server._unmineable_payload()
+                    server._count("unmineable")
+                else:
+                    server._count("not_found")
+                    self._send(404, b'{"message": "Not found"}')
+                    return
+
+                time.sleep(server._latency())
+                outcome = server._pick_outcome()
+                server._count(outcome)
+
+                if outcome == "error":
+                    self._send(500, b'{"message": "Internal server error"}')
+                elif outcome == "rate_limited":
+                    self._send(429, b'{"message": "Too many requests"}', {"Retry-After": "1"})
+                elif outcome == "malformed":
+                    # Alternate between broken JSON and valid JSON with the wrong shape.
+                    if server._roll() < 0.5:
+                        self._send(200, json.dumps(payload).encode()[:-7])
+                    else:
+                        self._send(200, json.dumps({"data": [payload["data"]]}).encode())
+                else:
+                    self._send(200, json.dumps(payload).encode())
+
+        return Handler
+
+    def start(self) -> "MockApiServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MockApiServer", daemon=True)
+        self._thread.start()
+        self._logger.info(f"Mock API server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockApiServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock CoinMarketCap/unMineable API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0)
+    parser.add_argument("--malformed-rate", type=float, default=0)
+    parser.add_argument("--price", type=float, default=150.0)
+    parser.add_argument("--balance", type=float, default=0.01234567)
+    args = parser.parse_args()
+
+    config = MockApiConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        price=args.price,
+        balance=args.balance
+    )
+
+    server = MockApiServer(config, host=args.host, port=args.port).start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(dict(server.stats))
+
+
+if __name__ == '__main__':
+    main()
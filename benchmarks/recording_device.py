@@ -0,0 +1,97 @@
+"""
+Stand-in for the epdconfig module (SPI + GPIO) that records what the EPD driver sends instead of talking to hardware.
+
+The busy pin always reads as idle and delays are only added up, so driver code runs at full speed and only the Python
+side of each transfer is measured.
+
+Import this module before anything that imports the EPD driver: install() puts a stand-in epdconfig module in
+sys.modules, so the real one (which probes the board and claims GPIO pins on first use) is never loaded.
+"""
+import sys
+import types
+from typing import Optional
+
+
+class RecordingDevice:
+    # Same pin numbers as the Raspberry Pi implementation in epdconfig
+    RST_PIN = 17
+    DC_PIN = 25
+    CS_PIN = 8
+    BUSY_PIN = 24
+    PWR_PIN = 18
+
+    def __init__(self):
+        self.transactions = 0  # SPI write calls
+        self.bytes_sent = 0
+        self.gpio_writes = 0
+        self.busy_reads = 0
+        self.delay_ms_total = 0.0
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.gpio_writes = 0
+        self.busy_reads = 0
+        self.delay_ms_total = 0.0
+
+    def counters(self) -> dict:
+        return {
+            "transactions": self.transactions,
+            "bytes_sent": self.bytes_sent,
+            "gpio_writes": self.gpio_writes,
+            "busy_reads": self.busy_reads,
+            "delay_ms": self.delay_ms_total,
+        }
+
+    def digital_write(self, pin, value):
+        self.gpio_writes += 1
+
+    def digital_read(self, pin):
+        self.busy_reads += 1
+        return 0
+
+    def delay_ms(self, delaytime):
+        self.delay_ms_total += delaytime
+
+    def spi_writebyte(self, data):
+        self.transactions += 1
+        self.bytes_sent += len(data)
+
+    def spi_writebyte2(self, data):
+        self.transactions += 1
+        self.bytes_sent += len(data)
+
+    def module_init(self, cleanup=False):
+        return 0
+
+    def module_exit(self, cleanup=False):
+        pass
+
+
+_default_device: Optional[RecordingDevice] = None
+
+
+def install() -> RecordingDevice:
+    """
+    Makes src.drivers.waveshare_epd.epdconfig a recording stand-in (if the driver wasn't imported yet).
+
+    :return: The device behind the stand-in module, which EPD() uses when no device is given.
+    """
+    global _default_device
+
+    module_name = "src.drivers.waveshare_epd.epdconfig"
+    if _default_device is not None:
+        return _default_device
+
+    if module_name in sys.modules:
+        raise RuntimeError(f"{module_name} was imported before the recording device could be installed.")
+
+    _default_device = RecordingDevice()
+    module = types.ModuleType(module_name)
+    for name in dir(_default_device):
+        if not name.startswith("_"):
+            setattr(module, name, getattr(_default_device, name))
+    module.create_device = lambda *args, **kwargs: RecordingDevice()
+
+    sys.modules[module_name] = module
+    return _default_device
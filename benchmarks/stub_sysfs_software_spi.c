@@ -0,0 +1,45 @@
+/*
+ * Stand-in for Waveshare's sysfs_software_spi.so that counts calls instead of toggling pins. Built by
+ * jetson_spi_benchmark.py, with -DWITH_BULK for the bulk entry point and without it for the per-byte fallback.
+ */
+#include <stdint.h>
+
+static uint64_t calls = 0;
+static uint64_t bytes = 0;
+static uint32_t checksum = 0;
+
+void SYSFS_software_spi_begin(void) {}
+
+void SYSFS_software_spi_end(void) {}
+
+uint8_t SYSFS_software_spi_transfer(uint8_t value)
+{
+    calls++;
+    bytes++;
+    checksum += value;
+    return 0;
+}
+
+#ifdef WITH_BULK
+void SYSFS_software_spi_transfer_bulk(const uint8_t *data, uint32_t length)
+{
+    calls++;
+    bytes += length;
+    for (uint32_t i = 0; i < length; i++) {
+        checksum += data[i];
+    }
+}
+#endif
+
+uint64_t stub_calls(void) { return calls; }
+
+uint64_t stub_bytes(void) { return bytes; }
+
+uint32_t stub_checksum(void) { return checksum; }
+
+void stub_reset(void)
+{
+    calls = 0;
+    bytes = 0;
+    checksum = 0;
+}
@@ -1,17 +1,62 @@
+from __future__ import annotations
+
+import time
+
+# Taken before the other imports, so the startup report includes them.
+_STARTED_AT = time.perf_counter()
+
+import dataclasses
 import logging
+import signal
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
-from PIL.Image import Image
 from simple_log_factory.log_factory import log_factory
 
-from src.config import WAVESHARE_DISPLAY, DISPLAY_SIZES
+from src.data_fetchers.circuit_breaker import CircuitBreaker
 from src.data_fetchers.crypto_value_fetcher import get_current_crypto_value
 from src.data_fetchers.mined_value_fetcher import get_current_mined_value
-from src.display_controller.display import DisplayController
-from src.image_builder.image_builder import ImageBuilder
-from src.image_builder.image_builder_types import ImageElementInfo
+from src.config import FRAME_CACHE_SIZE, MONERO_ICON, MONERO_ICON_SCALE, WALLET_VALUE_FONT_SIZE, create_folders
+from src.metrics.cycle_profiler import CycleProfiler
+from src.scheduler.prefetch_pipeline import PrefetchPipeline
+from src.storage.time_series_store import TimeSeriesStore
 from src.utils.asset_utils import get_available_images
+from src.utils.region_utils import Region, clamp_region, merge_regions, union_regions
+
+# PIL, pydantic and dotenv take most of the startup time on a Pi Zero. Modules that need them are imported where
+# they're used (see main()): the panels are set up, and pick up the frame they kept, before the image builder loads.
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
+    from src.image_builder.glyph_set import GlyphSet
+    from src.image_builder.image_builder import ImageBuilder
+    from src.image_builder.image_builder_types import FrameInputs, ImageElementInfo, RenderedFrame
+    from src.image_builder.render_cache import RenderCache
+    from src.scheduler.polling_scheduler import PollingScheduler, RequestBudget
+    from src.scheduler.scheduler_types import SourceUpdate
+    from src.settings.settings_types import Settings
+
+PRICE_SOURCE = "price"
+BALANCE_SOURCE = "balance"
+MISSING_VALUE = "--"
+IDLE_STATUS = "Idle"
+
+# Frame elements that can be redrawn on their own (partial refresh)
+OUTLINE_ELEMENT = "outline"
+PRICE_ELEMENT = "price"
+STATUS_ELEMENT = "status"
+CLOCK_ELEMENT = "clock"
+# Clock ticker (see CLOCK_TICKER in src/config.py)
+CLOCK_FORMAT = "%H:%M"
+CLOCK_CHARACTERS = "0123456789:"
+# Extra pixels cleared around text, so anti-aliasing leftovers don't stay on the panel
+REDRAW_PADDING = 1
+# Part of every frame's cache key. Bump it when a change to the layout code changes what frames look like.
+LAYOUT_VERSION = 2
+
+# Created on the first render (see _render_cached)
+_frame_cache: Optional[RenderCache[RenderedFrame]] = None
 
 
 def _add_border(builder: ImageBuilder) -> ImageElementInfo:
@@ -33,7 +78,7 @@ def _add_monero_icon(builder: ImageBuilder, monero_icon: Path, outline_info: Ima
         image_path=monero_icon,
         x_percent=prev_x + position_adjust_x,
         y_percent=prev_y + position_adjust_y,
-        scale=0.1
+        scale=MONERO_ICON_SCALE
     )
 
 
@@ -47,7 +92,7 @@ def _add_wallet_value(builder: ImageBuilder, wallet_value: str, wallet_icon_info
         bold=True,
         x_percent=0.62,
         y_percent=prev_y + position_adjust_y,
-        font_size_override=31
+        font_size_override=WALLET_VALUE_FONT_SIZE
     )
 
 
@@ -89,15 +134,37 @@ def _add_wallet_worth_label(builder: ImageBuilder, label: str, wallet_worth_valu
     )
 
 
-def _add_status_text(builder: ImageBuilder, status_text: str, outline_info: ImageElementInfo) -> ImageElementInfo:
-    prev_y = builder.height_to_percent(outline_info.y_end)
-    y = prev_y - 0.12
+def _status_y_percent(builder: ImageBuilder, outline_info: ImageElementInfo) -> float:
+    return builder.height_to_percent(outline_info.y_end) - 0.12
+
+
+def _add_status_text(
+        builder: ImageBuilder,
+        status_text: str,
+        outline_info: ImageElementInfo,
+        price_info: ImageElementInfo,
+        clock_info: ImageElementInfo
+) -> ImageElementInfo:
+    """
+    Writes the status caption between the price and the clock (centered on the panel if there's room), shortened if it
+    doesn't fit there.
+    """
+    # Leaves room for the padding of each box (see _padded_ink_box), so the caption can be redrawn on its own
+    left = price_info.extra.ink_box[2] + 2 * REDRAW_PADDING + 1
+    right = clock_info.extra.ink_box[0] - 2 * REDRAW_PADDING - 1
+
+    status_text = builder.fit_text(status_text, "caption", right - left + 1)
+    bbox = builder.text_bbox(status_text, "caption")
+    text_width = bbox[2] - bbox[0]
+    ink_x = min(max(int(builder.width * 0.5 - text_width / 2) + bbox[0], left), right - text_width + 1)
+    # add_text takes the center of the text. The extra half pixel keeps its rounding from moving the text left.
+    center_x = ink_x - bbox[0] + text_width / 2 + 0.5
 
     return builder.add_text(
         text=status_text,
         text_type="caption",
-        x_percent=0.5,
-        y_percent=y,
+        x_percent=builder.width_to_percent(center_x),
+        y_percent=_status_y_percent(builder, outline_info),
     )
 
 
@@ -129,80 +196,675 @@ def _add_monero_value_label(builder: ImageBuilder, label: str, monero_value_info
     )
 
 
-def _add_last_updated(builder: ImageBuilder, last_updated_text: str, status_text_info: ImageElementInfo) -> ImageElementInfo:
-    y = status_text_info.y_percent
-
+def _add_last_updated(builder: ImageBuilder, last_updated_text: str, y_percent: float) -> ImageElementInfo:
     return builder.add_text(
         text=last_updated_text,
         text_type="caption",
         x_percent=0.86,
-        y_percent=y,
+        y_percent=y_percent,
     )
 
 
-def draw_image(wallet_value: float, monero_usd_value: float, status_text: str) -> Image:
-    width, height = DISPLAY_SIZES.get(WAVESHARE_DISPLAY)
+def _add_clock(
+        builder: ImageBuilder,
+        clock_text: str,
+        clock_glyphs: GlyphSet,
+        y_percent: float,
+        previous_text: Optional[str] = None
+) -> ImageElementInfo:
+    return builder.add_glyph_text(
+        text=clock_text,
+        glyph_set=clock_glyphs,
+        x_percent=0.86,
+        y_percent=y_percent,
+        previous_text=previous_text
+    )
+
+
+def build_clock_glyphs() -> GlyphSet:
+    from src.image_builder.glyph_set import GlyphSet
+    from src.image_builder.image_builder_types import ImageBuilderConfig
+
+    font, _ = ImageBuilderConfig().get_font("caption")
+    return GlyphSet(CLOCK_CHARACTERS, font)
+
+
+def _is_valid(value: Optional[float]) -> bool:
+    return value is not None and value >= 0
+
+
+def format_frame_inputs(
+        wallet_value: Optional[float],
+        monero_usd_value: Optional[float],
+        status_text: str,
+        clock_ticker: bool = False,
+        clock_time: Optional[float] = None
+) -> FrameInputs:
+    """
+    Formats what a frame shows. Values that format the same (e.g.: a price that rounds to the same cents) give the same
+    inputs, so the frame isn't rendered or sent again.
+
+    :param wallet_value: Wallet balance (None or negative if unknown).
+    :param monero_usd_value: Coin price in USD (None or negative if unknown).
+    :param status_text: Status caption.
+    :param clock_ticker: If True, the clock shows HH:MM (ticker mode), otherwise the time of this update as HH:MM:SS.
+    :param clock_time: Time shown on the clock (timestamp). Defaults to now.
+    """
+    from src.image_builder.image_builder_types import FrameInputs
+    from src.settings.settings import get_settings
+
+    settings = get_settings()
+
+    # Missing values (never fetched, or a failed fetch) show as "--" instead of garbage.
+    if _is_valid(wallet_value) and _is_valid(monero_usd_value):
+        wallet_worth_value_str = f"{wallet_value * monero_usd_value:.10f}"
+    else:
+        wallet_worth_value_str = MISSING_VALUE
+
+    clock = datetime.fromtimestamp(clock_time if clock_time is not None else time.time())
+    return FrameInputs(
+        layout_version=LAYOUT_VERSION,
+        coin=settings.coin,
+        display_size=settings.display_size,
+        wallet_value=f"{wallet_value:.8f}" if _is_valid(wallet_value) else MISSING_VALUE,
+        usd_value=f"${monero_usd_value:.2f}" if _is_valid(monero_usd_value) else f"${MISSING_VALUE}",
+        wallet_worth_value=wallet_worth_value_str,
+        status_text=status_text,
+        clock_text=clock.strftime(CLOCK_FORMAT if clock_ticker else "%H:%M:%S"),
+        clock_ticker=clock_ticker
+    )
+
+
+def _render_frame(inputs: FrameInputs, clock_glyphs: Optional[GlyphSet]) -> RenderedFrame:
+    from src.image_builder.image_builder import ImageBuilder
+    from src.image_builder.image_builder_types import RenderedFrame
+
+    width, height = inputs.display_size
     available_images = get_available_images()
     builder = ImageBuilder(width, height)
 
     outline_info = _add_border(builder)
 
-    monero_icon = available_images.get("monero(1)")
+    monero_icon = available_images.get(MONERO_ICON)
 
     monero_icon_info = _add_monero_icon(builder, monero_icon, outline_info)
 
-    wallet_value_str = f"{wallet_value:.8f}"
+    wallet_value_info = _add_wallet_value(builder, inputs.wallet_value, monero_icon_info)
+    wallet_value_label_info = _add_wallet_value_label(builder, inputs.coin, wallet_value_info)
 
-    wallet_value_info = _add_wallet_value(builder, wallet_value_str, monero_icon_info)
-    wallet_value_label_info = _add_wallet_value_label(builder, "XMR", wallet_value_info)
+    monero_value_label_info = _add_monero_value_label(builder, f"1 {inputs.coin} > USD", monero_icon_info)
+    monero_value_info = _add_monero_value_info(builder, inputs.usd_value, monero_value_label_info)
 
-    monero_value_label_info = _add_monero_value_label(builder, "1 XMR > USD", monero_icon_info)
-    monero_value_info = _add_monero_value_info(builder, f"${monero_usd_value:.2f}", monero_value_label_info)
+    wallet_worth_value_info = _add_wallet_worth_value(builder, inputs.wallet_worth_value, wallet_value_label_info)
 
-    wallet_worth_value = wallet_value * monero_usd_value
-    wallet_worth_value_str = f"{wallet_worth_value:.10f}"
+    wallet_worth_label_info = _add_wallet_worth_label(builder, "USD", wallet_worth_value_info)
 
-    wallet_worth_value_info = _add_wallet_worth_value(builder, wallet_worth_value_str, wallet_value_label_info)
+    # The clock goes first: the status caption has to fit between the price and the clock.
+    status_y = _status_y_percent(builder, outline_info)
+    if clock_glyphs is not None:
+        last_updated_text_info = _add_clock(builder, inputs.clock_text, clock_glyphs, status_y)
+    else:
+        last_updated_text_info = _add_last_updated(builder, inputs.clock_text, status_y)
+
+    status_text_info = _add_status_text(
+        builder,
+        inputs.status_text,
+        outline_info,
+        monero_value_info,
+        last_updated_text_info
+    )
 
-    wallet_worth_label_info = _add_wallet_worth_label(builder, "USD", wallet_worth_value_info)
+    return RenderedFrame(
+        image=builder.build(),
+        elements={
+            OUTLINE_ELEMENT: outline_info,
+            PRICE_ELEMENT: monero_value_info,
+            STATUS_ELEMENT: status_text_info,
+            CLOCK_ELEMENT: last_updated_text_info,
+        },
+        inputs=inputs
+    )
+
+
+def render_frame(
+        wallet_value: Optional[float],
+        monero_usd_value: Optional[float],
+        status_text: str,
+        clock_glyphs: Optional[GlyphSet] = None,
+        clock_time: Optional[float] = None
+) -> RenderedFrame:
+    """
+    Renders the whole frame, or returns the cached one if a frame with the same text was rendered recently (ticker mode
+    only: otherwise the clock shows the seconds, so frames never repeat).
+
+    :param wallet_value: Wallet balance (None or negative if unknown).
+    :param monero_usd_value: Coin price in USD (None or negative if unknown).
+    :param status_text: Status caption.
+    :param clock_glyphs: Pre-rendered clock digits. If set, the clock shows the time as HH:MM (ticker mode). If not,
+    it shows the time of this update as HH:MM:SS.
+    :param clock_time: Time shown on the clock (timestamp). Defaults to now.
+    :return: The frame, with the elements that can be redrawn on their own. Don't draw on its image: it's shared.
+    """
+    inputs = format_frame_inputs(wallet_value, monero_usd_value, status_text, clock_glyphs is not None, clock_time)
+    return _render_cached(inputs, clock_glyphs)
+
+
+def _render_cached(inputs: FrameInputs, clock_glyphs: Optional[GlyphSet]) -> RenderedFrame:
+    if not inputs.clock_ticker:
+        # The clock shows the seconds, so a frame never comes back: caching would only hold on to images
+        return _render_frame(inputs, clock_glyphs)
+
+    global _frame_cache
+    if _frame_cache is None:
+        from src.image_builder.render_cache import RenderCache
+        _frame_cache = RenderCache("frame", FRAME_CACHE_SIZE)
+    return _frame_cache.get_or_render(inputs, lambda: _render_frame(inputs, clock_glyphs))
+
+
+def draw_image(wallet_value: Optional[float], monero_usd_value: Optional[float], status_text: str) -> Image:
+    return render_frame(wallet_value, monero_usd_value, status_text).image
+
+
+def _padded_ink_box(info: ImageElementInfo) -> Region:
+    x0, y0, x1, y1 = info.extra.ink_box
+    return x0 - REDRAW_PADDING, y0 - REDRAW_PADDING, x1 + REDRAW_PADDING, y1 + REDRAW_PADDING
+
+
+def _overlaps(first: Region, second: Region) -> bool:
+    return first[0] <= second[2] and second[0] <= first[2] and first[1] <= second[3] and second[1] <= first[3]
+
+
+def render_status(frame: RenderedFrame, status_text: str) -> Optional[Tuple[RenderedFrame, Region]]:
+    """
+    Redraws only the status caption on top of a frame.
+
+    :param frame: The frame on the panel.
+    :param status_text: The new status text.
+    :return: The new frame and the region that changed, or None if the status can't be redrawn on its own (e.g.: it
+    runs into the price or the clock), in which case the whole frame must be rendered.
+    """
+    from src.image_builder.image_builder import ImageBuilder
+    from src.image_builder.image_builder_types import RenderedFrame
+
+    width, height = frame.image.size
+    builder = ImageBuilder(width, height, base_image=frame.image)
+
+    old_box = _padded_ink_box(frame.elements[STATUS_ELEMENT])
+    neighbour_boxes = [_padded_ink_box(frame.elements[name]) for name in (PRICE_ELEMENT, CLOCK_ELEMENT)]
+    if any(_overlaps(old_box, box) for box in neighbour_boxes):
+        return None
+
+    builder.clear_region(*clamp_region(old_box, width, height))
+    status_text_info = _add_status_text(
+        builder,
+        status_text,
+        frame.elements[OUTLINE_ELEMENT],
+        frame.elements[PRICE_ELEMENT],
+        frame.elements[CLOCK_ELEMENT]
+    )
+
+    new_box = _padded_ink_box(status_text_info)
+    if any(_overlaps(new_box, box) for box in neighbour_boxes):
+        return None
+
+    elements = dict(frame.elements)
+    elements[STATUS_ELEMENT] = status_text_info
+    inputs = dataclasses.replace(frame.inputs, status_text=status_text) if frame.inputs is not None else None
+    region = clamp_region(union_regions(old_box, new_box), width, height)
+    return RenderedFrame(image=builder.build(), elements=elements, inputs=inputs), region
+
+
+def render_clock(frame: RenderedFrame, clock_time: float, clock_glyphs: GlyphSet) -> Optional[Tuple[RenderedFrame, Region]]:
+    """
+    Updates the clock of a frame rendered in ticker mode, pasting only the digits that changed.
+
+    :param frame: The frame on the panel.
+    :param clock_time: Time to show (timestamp).
+    :param clock_glyphs: Pre-rendered clock digits (the same ones used to render the frame).
+    :return: The new frame and the region that changed, or None if the clock didn't change.
+    """
+    from src.image_builder.image_builder import ImageBuilder
+    from src.image_builder.image_builder_types import RenderedFrame
+
+    previous = frame.elements[CLOCK_ELEMENT]
+    clock_text = datetime.fromtimestamp(clock_time).strftime(CLOCK_FORMAT)
+
+    width, height = frame.image.size
+    builder = ImageBuilder(width, height, base_image=frame.image)
+    clock_info = builder.add_glyph_text(
+        text=clock_text,
+        glyph_set=clock_glyphs,
+        x_percent=previous.x_percent,
+        y_percent=previous.y_percent,
+        previous_text=previous.text
+    )
+
+    region = clock_info.extra.ink_box
+    if region is None:
+        return None
+
+    elements = dict(frame.elements)
+    # The element keeps covering the whole clock, not just the digits pasted this time
+    elements[CLOCK_ELEMENT] = dataclasses.replace(clock_info, extra=previous.extra)
+    inputs = dataclasses.replace(frame.inputs, clock_text=clock_text) if frame.inputs is not None else None
+    return RenderedFrame(image=builder.build(), elements=elements, inputs=inputs), region
+
+
+def render_partial_update(
+        frame: RenderedFrame,
+        status_text: Optional[str] = None,
+        clock_time: Optional[float] = None,
+        clock_glyphs: Optional[GlyphSet] = None
+) -> Optional[Tuple[RenderedFrame, List[Region]]]:
+    """
+    Redraws the status and/or the clock on top of a frame.
+
+    :param frame: The frame on the panel.
+    :param status_text: New status text, or None if it didn't change.
+    :param clock_time: New clock time, or None if the clock doesn't need an update.
+    :param clock_glyphs: Pre-rendered clock digits (required to update the clock).
+    :return: The new frame and the regions that changed (refreshed together), or None if the whole frame must be
+    rendered instead.
+    """
+    regions = []
+
+    if status_text is not None:
+        status_update = render_status(frame, status_text)
+        if status_update is None:
+            return None
+        frame, status_region = status_update
+        regions.append(status_region)
+
+    if clock_time is not None and clock_glyphs is not None:
+        clock_update = render_clock(frame, clock_time, clock_glyphs)
+        if clock_update is not None:
+            frame, clock_region = clock_update
+            regions.append(clock_region)
+
+    if not regions:
+        return None
+
+    return frame, merge_regions(regions)
+
+
+def _next_minute(now: float) -> float:
+    return (int(now // 60) + 1) * 60
+
+
+def _format_age(age: Optional[float]) -> str:
+    if age is None:
+        return MISSING_VALUE
+    if age < 60 * 60:
+        return f"{int(age // 60)}m"
+    if age < 24 * 60 * 60:
+        return f"{int(age // (60 * 60))}h"
+    return f"{int(age // (24 * 60 * 60))}d"
+
+
+def build_status_text(breakers: List[CircuitBreaker], idle_text: str = IDLE_STATUS) -> str:
+    """
+    :param breakers: Breakers of every source.
+    :param idle_text: Shown when every source is healthy (e.g.: a pushed status). Stale sources take precedence.
+    :return: The caption text.
+    """
+    unhealthy = [breaker for breaker in breakers if not breaker.is_healthy]
+    if not unhealthy:
+        return idle_text
+
+    # Source initials (e.g.: "Stale: P 12m, B 3h"), so it fits between the price and the clock
+    return "Stale: " + ", ".join(f"{breaker.name[0].upper()} {_format_age(breaker.age())}" for breaker in unhealthy)
+
+
+def _render_latest(
+        scheduler: PollingScheduler,
+        status_text: str,
+        clock_glyphs: Optional[GlyphSet] = None,
+        clock_time: Optional[float] = None
+) -> RenderedFrame:
+    wallet_value = scheduler.get_value(BALANCE_SOURCE)
+    monero_usd_value = scheduler.get_value(PRICE_SOURCE)
+    return render_frame(wallet_value, monero_usd_value, status_text, clock_glyphs, clock_time)
+
+
+def shows_latest_values(frame: RenderedFrame, scheduler: PollingScheduler) -> bool:
+    """
+    :return: True if the frame already shows the latest values as they'd be formatted (the status and clock aside).
+    """
+    if frame.inputs is None:
+        return False
+
+    latest = format_frame_inputs(
+        scheduler.get_value(BALANCE_SOURCE),
+        scheduler.get_value(PRICE_SOURCE),
+        frame.inputs.status_text,
+        frame.inputs.clock_ticker
+    )
+    return dataclasses.replace(latest, clock_text=frame.inputs.clock_text) == frame.inputs
+
+
+def restore_frame(
+        saved_inputs: Optional[Dict[str, Any]],
+        scheduler: PollingScheduler,
+        clock_glyphs: Optional[GlyphSet] = None
+) -> Optional[RenderedFrame]:
+    """
+    Renders the frame the panels kept from before a restart (see DisplayManager.saved_inputs).
 
-    last_updated = datetime.now()
-    status_text_info = _add_status_text(builder, status_text, outline_info)
+    :param saved_inputs: Inputs of the frame on the panels, as saved.
+    :param scheduler: Source of the latest values.
+    :param clock_glyphs: Pre-rendered clock digits, in ticker mode.
+    :return: The frame, or None if there's none or it doesn't show the latest values (or not the same way, e.g.: the
+    layout version or the coin changed).
+    """
+    if saved_inputs is None:
+        return None
 
-    last_updated_text = last_updated.strftime("%H:%M:%S")
-    last_updated_text_info = _add_last_updated(builder, last_updated_text, status_text_info)
+    from src.image_builder.image_builder_types import FrameInputs
 
-    img = builder.build()
-    return img
+    try:
+        inputs = FrameInputs(**saved_inputs)
+    except (TypeError, ValueError):
+        return None
+
+    if inputs.clock_ticker != (clock_glyphs is not None):
+        return None
+
+    frame = _render_cached(inputs, clock_glyphs)
+    return frame if shows_latest_values(frame, scheduler) else None
+
+
+def _saved_inputs(frame: RenderedFrame) -> Optional[Dict[str, Any]]:
+    return dataclasses.asdict(frame.inputs) if frame.inputs is not None else None
+
+
+def build_price_budget(settings: Settings) -> RequestBudget:
+    from src.scheduler.polling_scheduler import RequestBudget
+    from src.scheduler.scheduler_types import RequestBudgetConfig
+
+    return RequestBudget(
+        RequestBudgetConfig(
+            per_day=settings.coinmarketcap_daily_request_budget,
+            per_month=settings.coinmarketcap_monthly_request_budget
+        ),
+        state_file=settings.request_budget_file
+    )
+
+
+def build_breakers(settings: Settings, price_budget: RequestBudget) -> Dict[str, CircuitBreaker]:
+    return {
+        PRICE_SOURCE: CircuitBreaker(
+            name=PRICE_SOURCE,
+            fetch=get_current_crypto_value,
+            failure_threshold=settings.circuit_failure_threshold,
+            probe_interval=settings.circuit_probe_interval,
+            # The breaker spends the budget on every request it makes (calls and probes), and only then: failing fast
+            # while the circuit is open is free.
+            before_request=price_budget.try_spend
+        ),
+        BALANCE_SOURCE: CircuitBreaker(
+            name=BALANCE_SOURCE,
+            fetch=get_current_mined_value,
+            failure_threshold=settings.circuit_failure_threshold,
+            probe_interval=settings.circuit_probe_interval
+        ),
+    }
+
+
+def build_scheduler(
+        settings: Settings,
+        breakers: Dict[str, CircuitBreaker],
+        price_budget: RequestBudget,
+        on_update: Optional[Callable[[SourceUpdate], None]] = None
+) -> PollingScheduler:
+    from src.scheduler.polling_scheduler import PollingScheduler, PolledSource
+    from src.scheduler.scheduler_types import PollingPolicy
+
+    price_source = PolledSource(
+        name=PRICE_SOURCE,
+        fetch=breakers[PRICE_SOURCE],
+        policy=PollingPolicy(
+            base_interval=settings.price_poll_interval,
+            min_interval=settings.price_poll_min_interval,
+            max_interval=settings.price_poll_max_interval,
+            change_threshold=settings.price_change_threshold
+        ),
+        budget=price_budget,
+        initial_value=breakers[PRICE_SOURCE].last_value,
+        # Spent by the breaker (see build_breakers)
+        spend_budget=False
+    )
+
+    balance_source = PolledSource(
+        name=BALANCE_SOURCE,
+        fetch=breakers[BALANCE_SOURCE],
+        policy=PollingPolicy(
+            base_interval=settings.balance_poll_interval,
+            min_interval=settings.balance_poll_min_interval,
+            max_interval=settings.balance_poll_max_interval,
+            change_threshold=settings.balance_change_threshold
+        ),
+        initial_value=breakers[BALANCE_SOURCE].last_value
+    )
+
+    return PollingScheduler([price_source, balance_source], on_update=on_update)
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt(f"Got signal {signum}")
 
 
 def main():
     logging.basicConfig(level=logging.INFO)
     logger = log_factory("Main", unique_handler_types=True)
-    delay_between_updates = 10 * 60  # 10 minutes
+    # systemd stops (and restarts) the service with SIGTERM. It's handled like Ctrl+C, so the cleanup below still runs:
+    # the panels are turned off and their state is saved.
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    # Everything below needs pydantic (the settings, panel configs and metrics are pydantic dataclasses), so it can't
+    # wait for the panels. PIL and the image builder can: they're loaded by the first render.
+    from src.display_controller.display_manager import DisplayManager
+    from src.metrics.stage_metrics import MetricsExporter, get_metrics, timed
+    from src.metrics.startup_report import StartupReport
+    from src.push_server.push_inbox import PushInbox
+    from src.push_server.push_server import PushServer
+    from src.settings.settings import get_settings, load_panel_configs, reload_settings_if_changed
+
+    startup = StartupReport(_STARTED_AT)
+    startup.mark("imports")
     display_controller = None
+    history = None
+    metrics_exporter = None
+    profiler = None
+    push_inbox = None
+    push_server = None
+    breakers = {}
 
     try:
-        display_controller = DisplayController()
+        # Settings are read once here. The loop only checks if the .env file changed.
+        settings = get_settings()
+        create_folders(settings.folders)
+        startup.mark("settings")
+
+        # The panels come first: those that kept their frame through the restart keep showing it, and aren't cleared.
+        # Every panel shows the same frame: data is fetched and the frame rendered once, then fanned out.
+        display_controller = DisplayManager(load_panel_configs(settings.panels_file), settings.panel_state_folder)
+        startup.mark("display_init")
+
+        history = TimeSeriesStore(settings.history_folder, settings.history_capacity)
+        metrics_exporter = MetricsExporter(
+            get_metrics(),
+            textfile=settings.metrics_textfile,
+            json_file=settings.metrics_json_file,
+            interval=settings.metrics_write_interval
+        )
+
+        profiler = CycleProfiler(settings.profile_folder)
+        profiler.request(settings.profile_cycles)
+        if settings.profile_signal_cycles > 0:
+            profiler.install_signal_handler(settings.profile_signal_cycles)
+
+        def record_history(update: SourceUpdate):
+            history.append(update.name, update.timestamp, update.value)
+
+        # Last good values survive restarts through the history store.
+        price_budget = build_price_budget(settings)
+        breakers = build_breakers(settings, price_budget)
+        for name, breaker in breakers.items():
+            latest = history.get_series(name).latest()
+            if latest is not None:
+                breaker.seed(value=latest[1], fetched_at=latest[0])
+        startup.mark("history")
+
+        # Nothing is fetched yet: the first frame shows the last known values (from the history store), and every
+        # source is due right away, so the first prefetch brings them up to date.
+        scheduler = build_scheduler(settings, breakers, price_budget, on_update=record_history)
+        status_text = build_status_text(list(breakers.values()))
+
+        # Digits are rendered once, so a clock tick is just a few pastes and a small partial refresh.
+        clock_glyphs = build_clock_glyphs() if settings.clock_ticker else None
+
+        # The frame on the panel, and the regions that changed since the previous one (None means the whole frame)
+        with timed("layout", kind="full"):
+            frame = restore_frame(display_controller.saved_inputs(), scheduler, clock_glyphs)
+            if frame is not None:
+                # The panels kept this frame through the restart and it still shows the latest values, so it's not
+                # sent again. The status and clock catch up on the first prefetch, with a partial refresh.
+                status_text = frame.inputs.status_text
+            else:
+                frame = _render_latest(scheduler, status_text, clock_glyphs)
+        regions: Optional[List[Region]] = None
+        startup.mark("first_render")
+
+        # Status text pushed through the push API (None until something is pushed)
+        pushed_status: Optional[str] = None
+
+        def prefetch_frame(deadline: float) -> Optional[Tuple[RenderedFrame, Optional[List[Region]]]]:
+            nonlocal status_text, pushed_status
+            updates = {}
+            pushed = push_inbox.take() if push_inbox is not None else None
+            if pushed is not None:
+                # Pushed values count as fresh fetches, so those sources aren't polled below.
+                for name, value in pushed.values.items():
+                    updates[name] = scheduler.push(name, value)
+                if pushed.status_changed:
+                    pushed_status = pushed.status
+
+            updates.update(scheduler.poll_due(due_by=deadline))
+            new_status_text = build_status_text(list(breakers.values()), pushed_status or IDLE_STATUS)
+            # A value that moved but formats the same (e.g.: the price rounds to the same cents) doesn't need a redraw
+            values_changed = (
+                any(update.changed for update in updates.values())
+                and not shows_latest_values(frame, scheduler)
+            )
+            status_changed = new_status_text != status_text
+            clock_changed = (
+                clock_glyphs is not None
+                and datetime.fromtimestamp(deadline).strftime(CLOCK_FORMAT) != frame.elements[CLOCK_ELEMENT].text
+            )
+
+            if not values_changed and not status_changed and not clock_changed:
+                return None
+
+            status_text = new_status_text
+
+            if not values_changed:
+                # Only the caption (e.g.: how stale a value is) and/or the clock changed, so a partial refresh is enough.
+                with timed("layout", kind="partial"):
+                    partial_update = render_partial_update(
+                        frame,
+                        status_text=status_text if status_changed else None,
+                        clock_time=deadline if clock_changed else None,
+                        clock_glyphs=clock_glyphs
+                    )
+                if partial_update is not None:
+                    display_controller.wake(clear=False)
+                    return partial_update
+
+            # Waking the panel up is part of the work, so it also happens before the deadline. It isn't cleared: the full
+            # refresh redraws all of it anyway, and a blank panel would show for the whole lead time.
+            display_controller.wake(clear=False)
+            with timed("layout", kind="full"):
+                return _render_latest(scheduler, status_text, clock_glyphs, deadline), None
+
+        def idle_sleep(seconds: float):
+            # Cut short when something is pushed
+            with timed("sleep"):
+                pipeline.interrupted.wait(seconds)
+
+        pipeline = PrefetchPipeline(prefetch_frame, sleep=idle_sleep)
+
+        if settings.push_socket is not None or settings.push_http_port is not None:
+            # Pushes are debounced by the inbox, then wake the loop up to draw them right away.
+            push_inbox = PushInbox(
+                scheduler.source_names,
+                on_ready=pipeline.interrupt,
+                debounce=settings.push_debounce_seconds,
+                max_delay=settings.push_max_delay_seconds
+            )
+            push_server = PushServer(push_inbox, settings.push_socket, settings.push_http_port)
+            try:
+                push_server.start()
+            except OSError as e:
+                logger.error(f"Could not start the push API. Only polling will update the display. Error: {e}")
+                push_server.stop()
+
+        def next_deadline() -> float:
+            deadline = scheduler.next_poll_at()
+            if clock_glyphs is not None:
+                deadline = min(deadline, _next_minute(time.time()))
+            # Overdue sources (e.g.: right after startup) are fetched now, not at some time in the past.
+            return max(deadline, time.time())
+
+        def wait_for_next_frame() -> Tuple[RenderedFrame, Optional[List[Region]]]:
+            while True:
+                next_frame = pipeline.run_until(next_deadline())
+                if next_frame is not None:
+                    return next_frame
+
         while True:
-            monero_usd_value = get_current_crypto_value()
-            wallet_value = get_current_mined_value()
-            img = draw_image(wallet_value, monero_usd_value, "Idle")
+            profiler.before_cycle()
+
+            if regions is None:
+                display_controller.display(frame.image, _saved_inputs(frame))
+            else:
+                display_controller.display_regions(frame.image, regions, _saved_inputs(frame))
 
-            display_controller.display(img)
+            if startup is not None:
+                startup.log_summary()
+                display_controller.submit(lambda controller, report=startup: report.panel_ready(controller.panel.name))
+                startup = None
 
-            display_controller.sleep(delay_between_updates)
+            # The panel sleeps while the next frame is fetched and rendered ahead of the next poll deadline.
+            frame, regions = display_controller.sleep_until(wait_for_next_frame)
 
-            img = draw_image(wallet_value, monero_usd_value, "Updating")
-            display_controller.display(img)
+            reload_settings_if_changed()
+            metrics_exporter.write_if_due()
+            profiler.after_cycle()
 
-    except KeyboardInterrupt:
-        logger.info("User Exiting")
+    except KeyboardInterrupt as e:
+        logger.info(f"Exiting ({str(e) or 'interrupted'})")
 
     except Exception as e:
         logger.error(f"Error: {e}")
 
     finally:
+        if push_server is not None:
+            push_server.stop()
+
+        if push_inbox is not None:
+            push_inbox.close()
+
+        for breaker in breakers.values():
+            breaker.close()
+
+        if history is not None:
+            history.close()
+
+        if metrics_exporter is not None:
+            metrics_exporter.write()
+
+        if profiler is not None:
+            profiler.stop()
+
         if display_controller is not None:
             display_controller.off()
 
@@ -0,0 +1,235 @@
+"""
+Bakes the assets the app draws, so it doesn't have to decode, scale or rasterize them at runtime:
+- The sprites each layout draws (see LAYOUT_SPRITES in src/config.py), into 1-bit atlases. Each layout gets one atlas
+  file (<layout>.sprites), which ImageBuilder maps into memory and reads as is.
+- The default fonts (regular and bold), at every size of ConfigFontSizes plus EXTRA_FONT_SIZES, into 1-bit bitmap fonts
+  (<font>-<size>.font) with the characters in BAKED_FONT_CHARACTERS.
+Images and fonts that weren't baked, or changed since, are still loaded from their files.
+
+Run it again after changing an image, a font or a layout's sprites.
+
+Example:
+    python -m src.asset_baking.bake_assets
+    python -m src.asset_baking.bake_assets --threshold 128
+"""
+import argparse
+import dataclasses
+import itertools
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from src.config import BAKED_ASSETS_FOLDER, BAKED_FONT_CHARACTERS, EXTRA_FONT_SIZES, LAYOUT_SPRITES
+from src.image_builder.bitmap_font import Glyph, bitmap_font_path, write_bitmap_font
+from src.image_builder.image_builder import load_sprite
+from src.image_builder.image_builder_types import BakedSprite, ConfigFontSizes, ImageBuilderConfig
+from src.image_builder.sprite_atlas import ATLAS_SUFFIX, write_atlas
+from src.utils.asset_utils import get_available_images
+
+# Alpha from which a pixel of the sprite covers the background
+MASK_ALPHA_THRESHOLD = 128
+# Drawn after each character to measure where FreeType puts it. Its bitmap must be right of the pen and below the
+# baseline, so it never moves the other bitmaps of the text itself.
+ANCHOR_CHARACTER = "_"
+
+
+def bake_sprite(
+        image_path: Path,
+        scale: float,
+        threshold: Optional[int] = None
+) -> Tuple[BakedSprite, Image.Image, Image.Image]:
+    """
+    Scales an image the same way ImageBuilder.add_image does and reduces it to 1 bit.
+
+    :param image_path: The image.
+    :param scale: Scale factor.
+    :param threshold: Gray level (0-255) below which a pixel is black. None: Floyd-Steinberg dithering.
+    :return: The sprite's info, ink and mask.
+    """
+    sprite = load_sprite(str(image_path), scale).convert("RGBA")
+    alpha = sprite.getchannel("A")
+
+    # Transparent parts are white, so they don't bleed into the edges when dithering
+    gray = Image.alpha_composite(Image.new("RGBA", sprite.size, "white"), sprite).convert("L")
+    if threshold is None:
+        ink = gray.convert("1")
+    else:
+        ink = gray.point(lambda value: 255 if value >= threshold else 0, "1")
+    mask = alpha.point(lambda value: 255 if value >= MASK_ALPHA_THRESHOLD else 0, "1")
+
+    stat = image_path.stat()
+    info = BakedSprite(name=image_path.name, scale=scale, width=sprite.width, height=sprite.height,
+                       source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+    return info, ink, mask
+
+
+def bake_layout(
+        layout: str,
+        sprites: Sequence[Tuple[str, float]],
+        output_folder: Path,
+        threshold: Optional[int] = None
+) -> Path:
+    """
+    Bakes a layout's sprites into its atlas.
+
+    :param layout: Name of the layout.
+    :param sprites: (image name, scale) of each sprite.
+    :param output_folder: Where the atlas goes.
+    :param threshold: See bake_sprite.
+    :return: The atlas file.
+    """
+    available_images = get_available_images()
+    missing = [name for name, _ in sprites if name not in available_images]
+    if missing:
+        raise FileNotFoundError(f"Layout '{layout}' uses images that aren't in the images folder: {', '.join(missing)}")
+
+    baked = [bake_sprite(available_images[name], scale, threshold) for name, scale in sprites]
+    path = output_folder.joinpath(f"{layout}{ATLAS_SUFFIX}")
+    output_folder.mkdir(parents=True, exist_ok=True)
+    size = write_atlas(path, baked)
+
+    source_size = sum(info.source_size for info, _, _ in baked)
+    print(f"{layout}: {len(baked)} sprite(s), {source_size} bytes of images -> {size} bytes ({path})")
+    for info, _, _ in baked:
+        print(f"  {info.name} x{info.scale}: {info.width}x{info.height}")
+    return path
+
+
+def _draw_text(font: ImageFont.FreeTypeFont, text: str) -> Image.Image:
+    """
+    Draws text the way ImageBuilder does on 1-bit images (FreeType's monochrome rendering), with the pen starting on
+    the baseline at (font.size * 2, font.size * 2) of an image big enough for a few characters.
+
+    The text is drawn a quarter of a pixel lower, which the glyphs are rounded back from, but which gives Pillow's
+    image of the text one more row: ANCHOR_CHARACTER isn't cut off after a glyph that has no ink but a bitmap above
+    its bounding box (e.g.: a space, which FreeType gives a one pixel bitmap).
+    """
+    canvas = Image.new("1", (font.size * 8, font.size * 4), 0)
+    ImageDraw.Draw(canvas).text((font.size * 2, font.size * 2 + 0.25), text, fill=1, font=font, anchor="ls")
+    return canvas
+
+
+def bake_glyph(font: ImageFont.FreeTypeFont, character: str) -> Optional[Glyph]:
+    """
+    Rasterizes a character and measures where FreeType puts it in a line of text (see Glyph). FreeType doesn't say
+    where a glyph's bitmap starts, but Pillow places every bitmap from the top left of the text's bitmaps: drawn after
+    the character, ANCHOR_CHARACTER moves by as much as the character's bitmap pushes that corner.
+
+    :return: The glyph's advance, bounding box, bitmap origin, ink position and ink, or None if it can't be measured.
+    """
+    pen = font.size * 2
+    bbox = font.getbbox(character, mode="1", anchor="ls")
+    pair_bbox = font.getbbox(character + ANCHOR_CHARACTER, mode="1", anchor="ls")
+    advance = round(font.getlength(character, mode="1") * 64)
+    anchor_x = round((font.getlength(character + ANCHOR_CHARACTER, mode="1")
+                      - font.getlength(ANCHOR_CHARACTER, mode="1")) * 64)
+
+    text = _draw_text(font, character)
+    anchor_ink = _draw_text(font, ANCHOR_CHARACTER).getbbox()
+    # The character stays where it is with the anchor after it, so the anchor is what changed
+    anchor_after = ImageChops.logical_xor(_draw_text(font, character + ANCHOR_CHARACTER), text).getbbox()
+    anchor_size = (anchor_ink[2] - anchor_ink[0], anchor_ink[3] - anchor_ink[1])
+    if (pair_bbox[:2] != bbox[:2] or anchor_after is None
+            or (anchor_after[2] - anchor_after[0], anchor_after[3] - anchor_after[1]) != anchor_size):
+        return None
+
+    origin = (pair_bbox[0] + ((anchor_x + 32) >> 6) + anchor_ink[0] - anchor_after[0],
+              pair_bbox[1] + anchor_ink[1] - anchor_after[1])
+    ink_box = text.getbbox()
+    if ink_box is None:
+        return advance, bbox, origin, (0, 0), None
+
+    ink_position = (ink_box[0] - pen - bbox[0] + origin[0], ink_box[1] - pen - bbox[1] + origin[1])
+    return advance, bbox, origin, ink_position, text.crop(ink_box)
+
+
+def bake_kerning(font: ImageFont.FreeTypeFont, characters: str) -> Dict[str, int]:
+    """
+    :return: Pair of characters -> adjustment of the first one's advance (1/64 pixels), for the pairs FreeType kerns.
+    """
+    advances = {character: round(font.getlength(character, mode="1") * 64) for character in characters}
+    kerning = {}
+    for first, second in itertools.product(characters, repeat=2):
+        adjustment = round(font.getlength(first + second, mode="1") * 64) - advances[first] - advances[second]
+        if adjustment:
+            kerning[first + second] = adjustment
+    return kerning
+
+
+def bake_font(font_path: Union[str, Path], size: int, output_folder: Path, characters: str) -> Optional[Path]:
+    """
+    Rasterizes a font's characters at a size into a bitmap font. Characters that can't be measured are left out (and
+    so is text with them).
+
+    :param font_path: The font file.
+    :param size: Font size.
+    :param output_folder: Where the bitmap font goes.
+    :param characters: Characters to bake.
+    :return: The bitmap font file, or None if the font can't be baked.
+    """
+    font = ImageFont.truetype(str(font_path), size)
+    # Shaping (libraqm) can replace or move glyphs depending on their neighbours, which glyph by glyph drawing can't do
+    if font.layout_engine != ImageFont.Layout.BASIC:
+        print(f"{Path(font_path).name} at {size}: not baked, only FreeType's basic layout is supported")
+        return None
+
+    if (font.getbbox(ANCHOR_CHARACTER, mode="1", anchor="ls")[:2] != (0, 0)
+            or _draw_text(font, ANCHOR_CHARACTER).getbbox() is None):
+        print(f"{Path(font_path).name} at {size}: not baked, '{ANCHOR_CHARACTER}' has no ink, or ink above the baseline "
+              f"or left of the pen")
+        return None
+
+    glyphs = {character: bake_glyph(font, character) for character in characters}
+    skipped = "".join(character for character, glyph in glyphs.items() if glyph is None)
+    glyphs = {character: glyph for character, glyph in glyphs.items() if glyph is not None}
+    kerning = bake_kerning(font, "".join(glyphs))
+    path = bitmap_font_path(font_path, size, output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    file_size = write_bitmap_font(path, font_path, size, font.getmetrics(), glyphs, kerning)
+    print(f"{Path(font_path).name} at {size}: {len(glyphs)} glyphs, {len(kerning)} kerning pairs -> {file_size} bytes "
+          f"({path})")
+    if skipped:
+        print(f"  Left out (drawn with the font file): {skipped!r}")
+    return path
+
+
+def font_sizes() -> List[int]:
+    """
+    :return: Every font size the app uses: the ConfigFontSizes defaults and the extra sizes.
+    """
+    sizes = {size for size in dataclasses.asdict(ConfigFontSizes()).values() if size}
+    return sorted(sizes.union(EXTRA_FONT_SIZES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake the layouts' sprites into 1-bit atlases")
+    parser.add_argument("--output", type=Path, default=BAKED_ASSETS_FOLDER, help="Folder for the atlases")
+    parser.add_argument("--threshold", type=int, default=None,
+                        help="Gray level (0-255) below which a pixel is black. Default: dithering")
+    parser.add_argument("--layout", action="append", choices=sorted(LAYOUT_SPRITES),
+                        help="Only bake the sprites of this layout (can be repeated)")
+    parser.add_argument("--no-sprites", action="store_true", help="Don't bake the sprites")
+    parser.add_argument("--no-fonts", action="store_true", help="Don't bake the fonts")
+    args = parser.parse_args()
+
+    if args.threshold is not None and not 0 <= args.threshold <= 255:
+        parser.error(f"--threshold must be between 0 and 255. Got {args.threshold}.")
+
+    layouts: Dict[str, Sequence[Tuple[str, float]]] = {
+        layout: sprites for layout, sprites in LAYOUT_SPRITES.items()
+        if not args.layout or layout in args.layout
+    }
+    if not args.no_sprites:
+        for layout, sprites in layouts.items():
+            bake_layout(layout, sprites, args.output, args.threshold)
+
+    if not args.no_fonts:
+        config = ImageBuilderConfig()
+        for font_path in (config.default_font, config.default_font_bold):
+            for size in font_sizes():
+                bake_font(font_path, size, args.output, BAKED_FONT_CHARACTERS)
+
+
+if __name__ == '__main__':
+    main()
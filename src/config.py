@@ -1,10 +1,17 @@
 from pathlib import Path
+from typing import Iterable
 
 ROOT_FOLDER = Path(__file__).parent.parent
 DATA_FOLDER = ROOT_FOLDER.joinpath(".data")
 IMAGES_FOLDER = DATA_FOLDER.joinpath("images")
 FONTS_FOLDER = DATA_FOLDER.joinpath("fonts")
 ROBOTO_FONT_FOLDER = FONTS_FOLDER.joinpath("Roboto")
+HISTORY_FOLDER = DATA_FOLDER.joinpath("history")
+REQUEST_BUDGET_FILE = DATA_FOLDER.joinpath("request_budget.json")
+METRICS_JSON_FILE = DATA_FOLDER.joinpath("metrics.json")
+PROFILE_FOLDER = DATA_FOLDER.joinpath("profiles")
+PANEL_STATE_FOLDER = DATA_FOLDER.joinpath("panels")
+BAKED_ASSETS_FOLDER = DATA_FOLDER.joinpath("baked")
 
 FONT_ARIAL = FONTS_FOLDER.joinpath("arial.ttf")
 FONT_ARIAL_BOLD = FONTS_FOLDER.joinpath("arialbd.ttf")
@@ -20,8 +27,107 @@ DISPLAY_SIZES = {
     WAVESHARE_DISPLAY: (250, 122),
 }
 
-creatable_folder = [DATA_FOLDER, IMAGES_FOLDER, FONTS_FOLDER, ROBOTO_FONT_FOLDER]
-for folder in creatable_folder:
-    if folder.exists():
-        continue
-    folder.mkdir(exist_ok=True)
+# Panels are cleared (full refresh) at least this often, to get rid of ghosting from partial refreshes
+SAFETY_REFRESH_SECONDS = 60 * 60 * 24
+
+# SPI clock of the panels. The SSD1680 controller is rated for 20MHz writes; long or noisy wires may need less.
+SPI_SPEED_HZ = 4000000
+
+# Frames sent to a panel within this window of each other are merged into one refresh, and a panel never starts a
+# waveform less than the min interval after the previous one ended.
+COALESCE_SECONDS = 0.25
+MIN_REFRESH_INTERVAL_SECONDS = 1.0
+
+# Polling intervals, in seconds. Each source backs off towards the max interval while its value is flat and
+# tightens towards the min interval when it moves beyond the change threshold.
+PRICE_POLL_INTERVAL = 10 * 60
+PRICE_POLL_MIN_INTERVAL = 5 * 60
+PRICE_POLL_MAX_INTERVAL = 60 * 60
+PRICE_CHANGE_THRESHOLD = 0.002  # 0.2%
+
+BALANCE_POLL_INTERVAL = 10 * 60
+BALANCE_POLL_MIN_INTERVAL = 5 * 60
+BALANCE_POLL_MAX_INTERVAL = 2 * 60 * 60
+BALANCE_CHANGE_THRESHOLD = 0.0005  # 0.05%
+
+# Defaults for everything below can be overridden through env vars or the .env file. See src/settings.
+
+# Upstream APIs. Base URLs can be overridden with the COINMARKETCAP_BASE_URL and UNMINEABLE_BASE_URL env vars
+# (e.g.: to point at the mock servers in the benchmarks folder).
+COINMARKETCAP_BASE_URL = "https://pro-api.coinmarketcap.com"
+UNMINEABLE_BASE_URL = "https://api.unminable.com"
+REQUEST_TIMEOUT_SECONDS = 10
+
+# Circuit breaker: after this many consecutive failures, a source stops being called (we show the last good value and
+# its age instead) and is probed in the background every CIRCUIT_PROBE_INTERVAL seconds until it recovers.
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_PROBE_INTERVAL = 2 * 60
+
+# CoinMarketCap basic plan gives us 10k credits per month (~333 per day). Leaving some room for manual calls. Requests
+# spent are kept in REQUEST_BUDGET_FILE, so restarts don't reset them.
+COINMARKETCAP_DAILY_REQUEST_BUDGET = 300
+COINMARKETCAP_MONTHLY_REQUEST_BUDGET = 9000
+
+# Clock ticker: when enabled, the clock shows the current time (HH:MM) and is updated every minute with a partial
+# refresh of just the digits that changed. When disabled, it shows when the values were last updated.
+CLOCK_TICKER = False
+
+# Number of samples kept per history series (price, balance). Each sample takes 16 bytes on disk, so this is ~1.7MB
+# per series, or about a year of 5-minute samples.
+HISTORY_CAPACITY = 105_120
+
+# Stage timing metrics. Histogram buckets are in seconds (Prometheus "le" bounds); percentiles in the JSON file are
+# computed over the last METRICS_WINDOW samples of each stage. Files are rewritten at most every METRICS_WRITE_INTERVAL
+# seconds, to spare the SD card.
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_WINDOW = 256
+METRICS_WRITE_INTERVAL = 60
+
+# Profiling (cProfile + tracemalloc), off by default. PROFILE_CYCLES profiles the first cycles after startup, and
+# SIGUSR1 profiles the next PROFILE_SIGNAL_CYCLES cycles. The caps below keep it safe to use in production.
+PROFILE_CYCLES = 0
+PROFILE_SIGNAL_CYCLES = 3
+PROFILE_MAX_CYCLES = 10  # Per session
+PROFILE_MAX_SECONDS = 60 * 60  # Per session
+PROFILE_MAX_FOLDER_BYTES = 10 * 1024 * 1024  # Oldest dumps are deleted past this
+PROFILE_TOP_ENTRIES = 40  # Functions/allocation sites in the text reports
+PROFILE_TRACEBACK_FRAMES = 1  # Frames kept per allocation. More frames, more overhead.
+
+# Push API (see src/push_server). Off unless PUSH_SOCKET and/or PUSH_HTTP_PORT are set.
+PUSH_DEBOUNCE_SECONDS = 0.5  # Quiet time after the last push before the frame is redrawn
+PUSH_MAX_DELAY_SECONDS = 3.0  # A steady stream of pushes still redraws at least this often
+# Longer status text is refused. What fits the caption depends on the characters, so the layout shortens the caption to
+# its space on the panel anyway (with "...").
+PUSH_STATUS_MAX_LENGTH = 40
+
+# Render caches, keyed on the exact text shown: whole frames, and text tiles (the rasterized text of one element)
+FRAME_CACHE_SIZE = 8
+TEXT_CACHE_SIZE = 128
+# Packed framebuffers kept per panel, for frames that come back (e.g.: a value flipping between two roundings)
+PACK_CACHE_SIZE = 4
+
+# Sprites (image name in the images folder, scale) each layout draws. `python -m src.asset_baking.bake_assets` bakes
+# them into BAKED_ASSETS_FOLDER, one atlas per layout.
+MONERO_ICON = "monero(1)"
+MONERO_ICON_SCALE = 0.1
+LAYOUT_SPRITES = {
+    "main": ((MONERO_ICON, MONERO_ICON_SCALE),),
+}
+# Fonts are baked into bitmap fonts too (same command), at every size of ConfigFontSizes plus the extra sizes below,
+# for these characters. Text with other characters is drawn with the font file.
+WALLET_VALUE_FONT_SIZE = 31
+EXTRA_FONT_SIZES = (WALLET_VALUE_FONT_SIZE,)
+BAKED_FONT_CHARACTERS = "".join(chr(code_point) for code_point in range(32, 127))  # Printable ASCII
+
+CREATABLE_FOLDERS = [DATA_FOLDER, IMAGES_FOLDER, FONTS_FOLDER, ROBOTO_FONT_FOLDER]
+
+
+def create_folders(folders: Iterable[Path] = ()):
+    """
+    Creates the data folders that don't exist yet. Called once at startup (not on import, so importing the config is
+    free of side effects).
+
+    :param folders: Other folders to create along with CREATABLE_FOLDERS (e.g.: the ones the settings point at).
+    """
+    for folder in [*CREATABLE_FOLDERS, *folders]:
+        folder.mkdir(parents=True, exist_ok=True)
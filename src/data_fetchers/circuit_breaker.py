@@ -0,0 +1,148 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from simple_log_factory.log_factory import log_factory
+
+from src.data_fetchers.data_fetchers_types import CircuitState
+
+
+class CircuitBreaker:
+    """
+    Wraps a fetch function (one that returns a negative value on failure) with a circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens: calls fail fast (returning -1.0) instead of going
+    through the retrying request again, and a background thread probes the source every probe_interval seconds. When
+    a probe succeeds, the circuit closes and the next call returns the probed value without another request.
+
+    before_request runs before every request the breaker actually makes (calls and probes), so a request budget is
+    only spent on real requests: failing fast and handing out a probed value are free.
+
+    The last good value and when it was fetched are kept, so callers can show it along with its age.
+    """
+    def __init__(
+            self,
+            name: str,
+            fetch: Callable[[], float],
+            failure_threshold: int = 3,
+            probe_interval: float = 120,
+            before_request: Optional[Callable[[], bool]] = None,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        :param name: Source name (used in logs and status text).
+        :param fetch: The fetch function. Must return a negative value on failure.
+        :param failure_threshold: Consecutive failures before the circuit opens.
+        :param probe_interval: Seconds between background probes while the circuit is open.
+        :param before_request: Optional check run right before each request, calls and probes alike (e.g.: spending the
+        request budget). Returning False skips the request: a call then returns -1.0 without counting as a failure.
+        :param clock: Time source.
+        """
+        self._logger = log_factory(f"CircuitBreaker:{name}", unique_handler_types=True)
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self._fetch = fetch
+        self._before_request = before_request
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stop_probing = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probed_value: Optional[float] = None
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.last_value: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+
+    def seed(self, value: float, fetched_at: float):
+        """
+        Sets the last good value (e.g.: from the history store after a restart).
+        """
+        with self._lock:
+            if self.last_success_at is None or fetched_at > self.last_success_at:
+                self.last_value = value
+                self.last_success_at = fetched_at
+
+    def age(self) -> Optional[float]:
+        """
+        :return: Seconds since the last good value was fetched, or None if we never had one.
+        """
+        if self.last_success_at is None:
+            return None
+        return self._clock() - self.last_success_at
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.state == CircuitState.CLOSED
+
+    def _record_success(self, value: float):
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.last_value = value
+        self.last_success_at = self._clock()
+
+    def _record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == CircuitState.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._logger.warning(f"{self.consecutive_failures} consecutive failures. Opening circuit.")
+            self.state = CircuitState.OPEN
+            self._start_probing()
+
+    def _start_probing(self):
+        self._stop_probing.clear()
+        self._probe_thread = threading.Thread(target=self._probe_loop, name=f"Probe:{self.name}", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while not self._stop_probing.wait(self.probe_interval):
+            if self._before_request is not None and not self._before_request():
+                continue
+
+            with self._lock:
+                self.state = CircuitState.HALF_OPEN
+
+            try:
+                value = self._fetch()
+            except Exception as e:
+                self._logger.debug(f"Probe raised: {e}")
+                value = -1.0
+
+            with self._lock:
+                if value is not None and value >= 0:
+                    self._logger.info("Probe succeeded. Closing circuit.")
+                    self._record_success(value)
+                    self._probed_value = value
+                    return
+
+                self.state = CircuitState.OPEN
+
+    def __call__(self) -> float:
+        with self._lock:
+            if self._probed_value is not None:
+                value, self._probed_value = self._probed_value, None
+                return value
+
+            if self.state != CircuitState.CLOSED:
+                return -1.0
+
+        if self._before_request is not None and not self._before_request():
+            return -1.0
+
+        try:
+            value = self._fetch()
+        except Exception as e:
+            self._logger.error(f"Fetch raised: {e}")
+            value = -1.0
+
+        with self._lock:
+            if value is not None and value >= 0:
+                self._record_success(value)
+            else:
+                self._record_failure()
+
+        return value
+
+    def close(self):
+        self._stop_probing.set()
+        if self._probe_thread is not None:
+            self._probe_thread.join(timeout=1)
@@ -1,23 +1,26 @@
-from requests import HTTPError
-
-from raccoontools.shared.requests_with_retry import get
 from simple_log_factory.log_factory import log_factory
 
-from src.utils.env_utils import get_env_var
-
 __logger = log_factory("CryptoValueFetcher", unique_handler_types=True)
 
 
-def get_current_crypto_value(coin_name: str = "XMR") -> float:
-    api_key = get_env_var("COINMARKETCAP_API_KEY")
+def get_current_crypto_value(coin_name: str = None) -> float:
+    # requests and raccoontools are slow to import on a Pi Zero. They're only needed once we fetch, which happens after
+    # the first frame is on screen, so they're imported here instead of at startup.
+    # A single attempt, without the retrying wrapper the other fetcher uses: each attempt costs a credit of the request
+    # budget, and failed fetches are retried by the scheduler (and the circuit breaker) anyway.
+    from requests import RequestException, get
+    from src.settings.settings import get_settings
+
+    settings = get_settings()
+    coin_name = coin_name or settings.coin
     headers = {
         "Accepts": "application/json",
-        "X-CMC_PRO_API_KEY": api_key,
+        "X-CMC_PRO_API_KEY": settings.coinmarketcap_api_key,
     }
-    url = f" https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest?symbol={coin_name}&convert=USD"
+    url = f"{settings.coinmarketcap_base_url}/v2/cryptocurrency/quotes/latest?symbol={coin_name}&convert=USD"
 
     try:
-        response = get(url, headers=headers)
+        response = get(url, headers=headers, timeout=settings.request_timeout_seconds)
         response.raise_for_status()
 
         content = response.json()
@@ -38,6 +41,10 @@ def get_current_crypto_value(coin_name: str = "XMR") -> float:
 
         return usd_value
 
-    except HTTPError as e:
+    except RequestException as e:
         __logger.error(f"Error getting crypto value: {e}")
-        return -1.0
\ No newline at end of file
+        return -1.0
+
+    except (ValueError, AttributeError, IndexError) as e:
+        __logger.error(f"Error getting crypto value: Malformed response. {e}")
+        return -1.0
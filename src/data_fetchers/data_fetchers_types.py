@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"  # Source is healthy, requests go through
+    OPEN = "open"  # Source is failing, requests fail fast while a background probe checks on it
+    HALF_OPEN = "half_open"  # A background probe is talking to the source right now
+
+    def to_str(self) -> str:
+        return str(self.value)
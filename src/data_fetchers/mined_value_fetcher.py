@@ -1,20 +1,19 @@
-from requests import HTTPError
-
-from raccoontools.shared.requests_with_retry import get
 from simple_log_factory.log_factory import log_factory
 
-from src.utils.env_utils import get_env_var
-
 __logger = log_factory("MinedValueFetcher", unique_handler_types=True)
 
 
 def get_current_mined_value() -> float:
-    wallet = get_env_var("MONERO_WALLET")
-    coin = "XMR"
-    url = f"https://api.unminable.com/v4/address/{wallet}?coin={coin}"
+    # Imported on the first fetch to keep startup fast (see crypto_value_fetcher)
+    from requests import RequestException
+    from raccoontools.shared.requests_with_retry import get
+    from src.settings.settings import get_settings
+
+    settings = get_settings()
+    url = f"{settings.unmineable_base_url}/v4/address/{settings.monero_wallet}?coin={settings.coin}"
 
     try:
-        response = get(url)
+        response = get(url, timeout=settings.request_timeout_seconds)
         response.raise_for_status()
 
         content = response.json()
@@ -32,6 +31,10 @@ def get_current_mined_value() -> float:
 
         return float(balance)
 
-    except HTTPError as e:
+    except RequestException as e:
         __logger.error(f"Error getting mined value: {e}")
         return -1.0
+
+    except (ValueError, AttributeError) as e:
+        __logger.error(f"Error getting mined value: Malformed response. {e}")
+        return -1.0
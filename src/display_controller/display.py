@@ -1,23 +1,55 @@
+from __future__ import annotations
+
 import time
 from datetime import datetime
-from typing import Union
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple, TypeVar, Union
 
-from PIL.Image import Image
 from simple_log_factory.log_factory import log_factory
 
+from src.config import PACK_CACHE_SIZE
+from src.display_controller.display_types import PanelConfig, PanelSnapshot
+from src.metrics.stage_metrics import get_metrics, timed
+from src.utils.region_utils import Region
+
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
 try:
     from src.drivers.waveshare_epd import epd2in13_V3
 except (ImportError, ModuleNotFoundError, OSError):
     pass
 
 
+T = TypeVar("T")
+
+
 class EPaperDisplay(object):
-    def __init__(self):
-        self._logger = log_factory("EPaperDisplay", unique_handler_types=True)
-        self._display = epd2in13_V3.EPD()
+    def __init__(self, panel: PanelConfig = None):
+        self.panel = panel or PanelConfig()
+        self._logger = log_factory(f"EPaperDisplay:{self.panel.name}", unique_handler_types=True)
+        # One long-lived SPI/GPIO session per panel, kept across sleep, wake-ups and safety refreshes
+        self._device = epd2in13_V3.epdconfig.create_device(
+            spi_bus=self.panel.spi_bus,
+            spi_device=self.panel.spi_device,
+            rst_pin=self.panel.rst_pin,
+            dc_pin=self.panel.dc_pin,
+            busy_pin=self.panel.busy_pin,
+            pwr_pin=self.panel.pwr_pin,
+            spi_speed_hz=self.panel.spi_speed_hz,
+            spi_chunk_size=self.panel.spi_chunk_size,
+            power_off_when_asleep=self.panel.power_off_when_asleep
+        )
+        self._display = epd2in13_V3.EPD(self._device)
         self._first_date: Union[datetime, None] = None
-        # Set refresh to a day
-        self.refresh_after_seconds = 60 * 60 * 24
+        self.refresh_after_seconds = self.panel.safety_refresh_seconds
+        # What the panel is showing right now (packed), and the state of the controller. The driver tracks what its
+        # RAM planes hold.
+        self._current_buffer: Optional[bytearray] = None
+        self._partial_lut_loaded = False
+        self._partial_refreshes = 0
+        # Recently packed frames, newest first. Cached frames come back as the same image object (see
+        # RenderCache), so they're found by identity.
+        self._packed: List[Tuple[Image, bytearray]] = []
 
     def _process_safety_refresh(self):
         if self._first_date is None:
@@ -31,32 +63,137 @@ class EPaperDisplay(object):
                 self.off()
                 time.sleep(10)
                 self._logger.info("Reinitializing display...")
-                self._display = epd2in13_V3.EPD()
+                self._display = epd2in13_V3.EPD(self._device)
                 self.init_and_clear()
                 self._first_date = now
 
-    def init_and_clear(self):
+    def init(self):
         self._display.init()
+        self._partial_lut_loaded = False
+
+    def _pack(self, image: Image) -> bytearray:
+        start = time.perf_counter()
+        for packed_image, buffer in self._packed:
+            if packed_image is image:
+                get_metrics().observe("render_cache", time.perf_counter() - start, cache="pack", outcome="hit")
+                return buffer
+
+        with timed("pack", panel=self.panel.name):
+            buffer = self._display.getbuffer(image)
+        self._packed = [(image, buffer)] + self._packed[:PACK_CACHE_SIZE - 1]
+        get_metrics().observe("render_cache", time.perf_counter() - start, cache="pack", outcome="miss")
+        return buffer
+
+    def init_and_clear(self):
+        self.init()
         self._display.Clear(0xFF)
+        self._current_buffer = None
+
+    @property
+    def current_buffer(self) -> Optional[bytearray]:
+        """
+        What the panel shows (packed), or None if unknown or blank.
+        """
+        return self._current_buffer
+
+    def restore(self, buffer: bytes) -> bool:
+        """
+        Picks up a panel that still shows a frame (e.g.: from before a restart) without clearing it: the frame is
+        written to both RAM planes, with no refresh.
+
+        :param buffer: Packed frame the panel shows.
+        :return: False if the buffer doesn't fit the panel (nothing is done then).
+        """
+        if len(buffer) != self._display.linewidth * self._display.height:
+            return False
+
+        self.init()
+        buffer = bytearray(buffer)
+        self._display.loadBaseImage(buffer)
+        self._current_buffer = buffer
+        return True
 
     def display(self, image: Image):
         self._process_safety_refresh()
-        self._display.display(self._display.getbuffer(image))
+        buffer = self._pack(image)
+        if buffer == self._current_buffer:
+            # Already on the panel (e.g.: the frame it kept through a restart)
+            return
+
+        if self._partial_lut_loaded:
+            # init() loads the full refresh LUT back
+            self.init()
+
+        # Writing both RAM planes lets us do partial updates on top of this frame later.
+        self._display.displayPartBaseImage(buffer)
+        self._current_buffer = buffer
+        self._partial_refreshes = 0
+
+    def _to_panel_window(self, region: Region, image_width: int):
+        # getbuffer rotates landscape images 90 degrees counter-clockwise: (x, y) -> (y, width - 1 - x)
+        x0, y0, x1, y1 = region
+        return y0, image_width - 1 - x1, y1, image_width - 1 - x0
+
+    def display_region(self, image: Image, region: Region):
+        """
+        Partial refresh of a region of the panel. The image is the whole new frame, but only the region is sent.
+
+        :param image: The new frame.
+        :param region: Region that changed (x0, y0, x1, y1), inclusive, in image pixels.
+        """
+        self.display_regions(image, [region])
+
+    def display_regions(self, image: Image, regions: List[Region]):
+        """
+        Partial refresh of several regions of the panel at once (one waveform). Only the regions are sent.
+
+        :param image: The new frame.
+        :param regions: Regions that changed (x0, y0, x1, y1), inclusive, in image pixels.
+        """
+        self._process_safety_refresh()
+
+        if self._current_buffer is None or not self.panel.partial_refresh or (
+                self.panel.max_partial_refreshes is not None
+                and self._partial_refreshes >= self.panel.max_partial_refreshes):
+            # Nothing to do a partial update on top of, or the refresh policy asks for a full refresh
+            self.display(image)
+            return
+
+        buffer = self._pack(image)
+
+        # Both RAM planes must hold what the panel shows. After each partial update the driver keeps them in step, so
+        # this only sends something after a wake-up (the RAM is gone) and costs a compare otherwise.
+        self._display.sync(self._current_buffer)
+
+        self._display.displayPartialWindows(buffer, [self._to_panel_window(region, image.width) for region in regions])
+        self._partial_lut_loaded = True
+        self._current_buffer = buffer
+        self._partial_refreshes += 1
 
     def sleep(self):
         self._display.sleep()
 
     def off(self):
-        epd2in13_V3.epdconfig.module_exit(cleanup=True)
+        self._display.device.module_exit(cleanup=True)
 
 
 class ShowImageDisplay(object):
-    def __init__(self):
+    def __init__(self, panel: PanelConfig = None):
+        self.panel = panel or PanelConfig()
+
+    def init(self):
         pass
 
     def init_and_clear(self):
         pass
 
+    @property
+    def current_buffer(self) -> Optional[bytearray]:
+        return None
+
+    def restore(self, buffer: bytes) -> bool:
+        return False
+
     def sleep(self):
         pass
 
@@ -67,31 +204,109 @@ class ShowImageDisplay(object):
     def display(image: Image):
         image.show()
 
+    @staticmethod
+    def display_region(image: Image, region: Region):
+        image.crop((region[0], region[1], region[2] + 1, region[3] + 1)).show()
+
+    @staticmethod
+    def display_regions(image: Image, regions: List[Region]):
+        for region in regions:
+            ShowImageDisplay.display_region(image, region)
+
 
 class DisplayController(object):
-    def __init__(self):
-        self._logger = log_factory("DisplayController", unique_handler_types=True)
+    def __init__(self, panel: PanelConfig = None, snapshot: Optional[PanelSnapshot] = None):
+        """
+        :param panel: The panel.
+        :param snapshot: What the panel showed before the process (re)started. If set, the panel isn't cleared, and a
+        first frame identical to it isn't sent again.
+        """
+        self.panel = panel or PanelConfig()
+        self._logger = log_factory(f"DisplayController:{self.panel.name}", unique_handler_types=True)
         try:
-            self._display = EPaperDisplay()
+            self._display = EPaperDisplay(self.panel)
         except Exception as e:
             self._logger.error(f"Error initializing EPaperDisplay. Falling back to showing image. Error: {e}")
-            self._display = ShowImageDisplay()
+            self._display = ShowImageDisplay(self.panel)
 
-        self._display.init_and_clear()
+        if snapshot is not None and self._display.restore(snapshot.buffer):
+            self._logger.info(f"Panel kept its frame from {datetime.fromtimestamp(snapshot.saved_at)}, not clearing it")
+        else:
+            self._display.init_and_clear()
+        self._is_asleep = False
+
+    @property
+    def current_buffer(self) -> Optional[bytearray]:
+        """
+        What the panel shows (packed), or None if unknown or blank.
+        """
+        return self._display.current_buffer
 
     def clear(self):
         self._display.init_and_clear()
 
     def display(self, data: Image):
+        self.wake()
         self._display.display(data)
 
-    def wake(self):
-        self._display.init_and_clear()
+    def display_region(self, data: Image, region: Region):
+        """
+        Updates only a region of the panel (partial refresh), e.g.: the status caption.
 
-    def sleep(self, sleep_time):
+        :param data: The whole new frame.
+        :param region: Region that changed (x0, y0, x1, y1), inclusive, in image pixels.
+        """
+        self.display_regions(data, [region])
+
+    def display_regions(self, data: Image, regions: List[Region]):
+        """
+        Updates several regions of the panel with one partial refresh, e.g.: the status caption and the clock.
+
+        :param data: The whole new frame.
+        :param regions: Regions that changed (x0, y0, x1, y1), inclusive, in image pixels.
+        """
+        self.wake(clear=False)
+        self._display.display_regions(data, regions)
+
+    def wake(self, clear: bool = True):
+        """
+        Wakes the display up, if it's asleep.
+
+        :param clear: If True, clears the panel (full refresh). Pass False when the next thing shown is a partial
+        update, so the current image stays on the panel.
+        """
+        if not self._is_asleep:
+            return
+
+        if clear:
+            self._display.init_and_clear()
+        else:
+            self._display.init()
+        self._is_asleep = False
+
+    def suspend(self):
+        """
+        Puts the display to sleep (deep sleep) until the next wake() or display call.
+        """
         self._display.sleep()
-        time.sleep(sleep_time)
-        self._display.init_and_clear()
+        self._is_asleep = True
+
+    def sleep(self, sleep_time):
+        self.sleep_until(lambda: time.sleep(sleep_time))
+
+    def sleep_until(self, wait: Callable[[], T]) -> T:
+        """
+        Puts the display to sleep while the wait function runs, then wakes it up (if the wait function didn't already
+        do it). Waking up here doesn't clear the panel, so a partial update can still follow.
+
+        :param wait: Blocking function to run while the display is asleep.
+        :return: Whatever the wait function returned.
+        """
+        self.suspend()
+        try:
+            return wait()
+        finally:
+            self.wake(clear=False)
 
     def off(self):
         self._display.sleep()
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.display_controller.display import DisplayController
+from src.display_controller.display_types import PanelConfig
+from src.display_controller.panel_state import PanelStateStore
+from src.display_controller.update_coalescer import UpdateCoalescer
+from src.metrics.stage_metrics import get_metrics
+from src.utils.region_utils import Region
+
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
+T = TypeVar("T")
+PanelJob = Callable[[DisplayController], None]
+
+
+class _Frame:
+    """
+    A frame waiting for its panel. regions are what changed since the previous frame (None: the whole frame).
+    """
+    def __init__(self, image: Image, regions: Optional[List[Region]], inputs: Optional[Dict[str, Any]]):
+        self.image = image
+        self.regions = regions
+        self.inputs = inputs
+        self.future: "Future[bool]" = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class PanelWorker:
+    """
+    Runs the commands for one panel, in order, on its own thread. SPI transfers and busy-waits of one panel never hold
+    up the other panels (or the main loop). The thread creates the panel's controller, so it owns the SPI/GPIO session.
+
+    Frames are latest-frame-wins: a frame that is still waiting when a newer one comes in is dropped, and the newer one
+    also covers the regions the dropped one changed. Frames go through an UpdateCoalescer, so a burst of frames ends up
+    in one refresh, and refreshes are spaced out by the panel's min interval.
+
+    With a state store, what the panel shows is saved after every refresh (in place, see PanelStateStore), and the next
+    process picks the panel up from there instead of clearing it.
+    """
+    def __init__(self, panel: PanelConfig, state_store: Optional[PanelStateStore] = None):
+        self._logger = log_factory(f"PanelWorker:{panel.name}", unique_handler_types=True)
+        self.panel = panel
+        self._state_store = state_store
+        # The buffer last saved to the state store, and the inputs of the last frame shown
+        self._saved_buffer: Optional[bytearray] = None
+        self._shown_inputs: Optional[Dict[str, Any]] = None
+        self.controller: Optional[DisplayController] = None
+        self._queue: "queue.Queue[Optional[PanelJob]]" = queue.Queue()
+        self._lock = threading.Lock()
+        # The newest frame that didn't start yet
+        self._waiting_frame: Optional[_Frame] = None
+        self._coalescer = UpdateCoalescer(panel.coalesce_seconds, panel.min_refresh_interval_seconds)
+        self._thread = threading.Thread(target=self._run, name=f"PanelWorker:{panel.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # The controller is created here too: unless the panel kept its last frame, it clears the panel, which is a full
+        # refresh (a few seconds).
+        snapshot = self._state_store.load(self.panel.name) if self._state_store is not None else None
+        self.controller = DisplayController(self.panel, snapshot)
+        self._saved_buffer = self.controller.current_buffer
+
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                job(self.controller)
+                self._save_state()
+            except Exception as e:
+                self._logger.error(f"Panel command failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _save_state(self):
+        # A new buffer means the panel changed. Cleared panels have no buffer, and nothing is kept for them.
+        buffer = self.controller.current_buffer
+        if self._state_store is None or buffer is self._saved_buffer:
+            return
+
+        try:
+            if buffer is None:
+                self._state_store.delete(self.panel.name)
+            else:
+                self._state_store.save(self.panel.name, buffer, self._shown_inputs)
+        except OSError as e:
+            self._logger.warning(f"Could not save the panel state: {e}")
+        self._saved_buffer = buffer
+
+    def submit(self, job: PanelJob):
+        self._queue.put(job)
+
+    def submit_frame(
+            self,
+            image: Image,
+            regions: Optional[List[Region]] = None,
+            inputs: Optional[Dict[str, Any]] = None
+    ) -> "Future[bool]":
+        """
+        Queues a frame. Returns right away: packing, the SPI transfer and the refresh happen on the panel's thread.
+
+        :param image: The whole new frame.
+        :param regions: Regions that changed since the previous frame (None: the whole frame).
+        :param inputs: What the frame shows (JSON serializable), saved with it in the state store.
+        :return: Future set to True once the frame is on the panel. It's cancelled if a newer frame replaced it first,
+        and has the exception if showing the frame failed.
+        """
+        frame = _Frame(image, regions, inputs)
+        with self._lock:
+            if self._waiting_frame is not None:
+                # Cancelled frames stay in the queue and are skipped (see _show_frame).
+                self._waiting_frame.future.cancel()
+            self._waiting_frame = frame
+
+        self._queue.put(lambda controller: self._show_frame(controller, frame))
+        return frame.future
+
+    def _show_frame(self, controller: DisplayController, frame: _Frame):
+        if not frame.future.cancelled():
+            # Frames sent meanwhile replace this one
+            self._coalescer.hold(frame.submitted_at)
+
+        with self._lock:
+            if self._waiting_frame is frame:
+                self._waiting_frame = None
+
+            if not frame.future.set_running_or_notify_cancel():
+                self._coalescer.drop(frame.regions, frame.submitted_at)
+                get_metrics().observe("frame", time.perf_counter() - frame.submitted_at, panel=self.panel.name,
+                                      outcome="dropped")
+                return
+
+        regions = self._coalescer.take(frame.regions)
+        try:
+            if regions is None:
+                controller.display(frame.image)
+            else:
+                controller.display_regions(frame.image, regions)
+        except Exception as e:
+            # The panel may show part of it, so the next frame is drawn in full.
+            self._coalescer.drop(None, frame.submitted_at)
+            frame.future.set_exception(e)
+            raise
+        finally:
+            self._coalescer.refreshed()
+
+        self._shown_inputs = frame.inputs
+        get_metrics().observe("frame", time.perf_counter() - frame.submitted_at, panel=self.panel.name,
+                              outcome="shown")
+        frame.future.set_result(True)
+
+    def wait_idle(self):
+        """
+        Blocks until every command submitted so far is done.
+        """
+        self._queue.join()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Finishes the commands already submitted, then stops the thread.
+
+        :param timeout: Max seconds to wait for the thread.
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+class DisplayManager:
+    """
+    Drives several panels from one process. Same interface as DisplayController: every call is forwarded to each
+    panel's worker and returns right away, so frames are rendered once and fanned out, and a slow panel doesn't delay
+    the others.
+    """
+    def __init__(self, panels: List[PanelConfig], state_folder: Optional[Union[str, Path]] = None):
+        """
+        :param panels: The panels.
+        :param state_folder: Where the last frame of each panel is kept across restarts (None: panels are cleared on
+        startup).
+        """
+        self._logger = log_factory("DisplayManager", unique_handler_types=True)
+        if not panels:
+            raise ValueError("At least one panel is required.")
+
+        names = [panel.name for panel in panels]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Panel names must be unique. Got: {', '.join(names)}.")
+
+        self._state_store = PanelStateStore(state_folder) if state_folder is not None else None
+        self._workers = [PanelWorker(panel, self._state_store) for panel in panels]
+        self._logger.info(f"Driving {len(self._workers)} panel(s): {', '.join(names)}")
+
+    @property
+    def panels(self) -> List[PanelConfig]:
+        return [worker.panel for worker in self._workers]
+
+    def submit(self, job: PanelJob):
+        """
+        Runs a job on every panel, after the commands already submitted to it.
+
+        :param job: Function called with each panel's controller, on that panel's thread.
+        """
+        for worker in self._workers:
+            worker.submit(job)
+
+    def saved_inputs(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: The inputs of the frame every panel kept from before the process started, if they all kept the same
+        one. None otherwise.
+        """
+        if self._state_store is None:
+            return None
+
+        snapshots = [self._state_store.load(worker.panel.name) for worker in self._workers]
+        if any(snapshot is None for snapshot in snapshots):
+            return None
+
+        inputs = snapshots[0].inputs
+        if any(snapshot.inputs != inputs for snapshot in snapshots[1:]):
+            return None
+        return inputs
+
+    def clear(self):
+        self.submit(lambda controller: controller.clear())
+
+    def _submit_frame(
+            self,
+            image: Image,
+            regions: Optional[List[Region]],
+            inputs: Optional[Dict[str, Any]]
+    ) -> "Future[Dict[str, bool]]":
+        futures = {worker.panel.name: worker.submit_frame(image, regions, inputs) for worker in self._workers}
+        combined: "Future[Dict[str, bool]]" = Future()
+        combined.set_running_or_notify_cancel()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_panel_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+
+            errors = [future.exception() for future in futures.values()
+                      if not future.cancelled() and future.exception() is not None]
+            if errors:
+                combined.set_exception(errors[0])
+            else:
+                combined.set_result({name: not future.cancelled() for name, future in futures.items()})
+
+        for future in futures.values():
+            future.add_done_callback(on_panel_done)
+        return combined
+
+    def display(self, data: Image, inputs: Optional[Dict[str, Any]] = None) -> "Future[Dict[str, bool]]":
+        """
+        Shows a frame on every panel (full refresh). Returns right away.
+
+        :param data: The new frame.
+        :param inputs: What the frame shows (JSON serializable), kept with it across restarts (see saved_inputs).
+        :return: Future set once every panel is done with the frame: panel name -> True if the panel showed it, False if
+        a newer frame replaced it first. It has the exception if a panel failed.
+        """
+        return self._submit_frame(data, None, inputs)
+
+    def display_region(
+            self,
+            data: Image,
+            region: Region,
+            inputs: Optional[Dict[str, Any]] = None
+    ) -> "Future[Dict[str, bool]]":
+        """
+        Same as display, but only the region is refreshed (partial refresh).
+
+        :param data: The whole new frame.
+        :param region: Region that changed since the previous frame (x0, y0, x1, y1), inclusive, in image pixels.
+        :param inputs: See display.
+        :return: See display.
+        """
+        return self._submit_frame(data, [region], inputs)
+
+    def display_regions(
+            self,
+            data: Image,
+            regions: List[Region],
+            inputs: Optional[Dict[str, Any]] = None
+    ) -> "Future[Dict[str, bool]]":
+        """
+        Same as display_region, for several regions refreshed at once (one waveform).
+
+        :param data: The whole new frame.
+        :param regions: Regions that changed since the previous frame (x0, y0, x1, y1), inclusive, in image pixels.
+        :param inputs: See display.
+        :return: See display.
+        """
+        return self._submit_frame(data, list(regions), inputs)
+
+    def wake(self, clear: bool = True):
+        self.submit(lambda controller: controller.wake(clear))
+
+    def suspend(self):
+        self.submit(lambda controller: controller.suspend())
+
+    def sleep_until(self, wait: Callable[[], T]) -> T:
+        """
+        Puts every panel to sleep while the wait function runs, then wakes them up (without clearing them).
+
+        :param wait: Blocking function to run while the panels are asleep.
+        :return: Whatever the wait function returned.
+        """
+        self.suspend()
+        try:
+            return wait()
+        finally:
+            self.wake(clear=False)
+
+    def wait_idle(self):
+        """
+        Blocks until every panel finished the commands submitted so far.
+        """
+        for worker in self._workers:
+            worker.wait_idle()
+
+    def off(self, timeout: Optional[float] = 60):
+        """
+        Turns every panel off and stops the workers.
+
+        :param timeout: Max seconds to wait for each worker.
+        """
+        self.submit(lambda controller: controller.off())
+        for worker in self._workers:
+            worker.stop(timeout)
+        if self._state_store is not None:
+            self._state_store.close()
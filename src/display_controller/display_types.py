@@ -0,0 +1,66 @@
+from typing import Any, Dict, Optional
+
+from pydantic.dataclasses import dataclass
+
+from src.config import COALESCE_SECONDS, MIN_REFRESH_INTERVAL_SECONDS, SAFETY_REFRESH_SECONDS, SPI_SPEED_HZ
+
+
+@dataclass(frozen=True)
+class PanelConfig:
+    """
+    One physical panel. Pins left as None keep the driver defaults. A second panel on the same host needs its own
+    chip select (spi_device) and its own RST, DC, BUSY and PWR pins.
+    """
+    name: Optional[str] = "main"
+    spi_bus: Optional[int] = 0
+    spi_device: Optional[int] = 0  # Chip select (CE0 = 0, CE1 = 1)
+    rst_pin: Optional[int] = None
+    dc_pin: Optional[int] = None
+    busy_pin: Optional[int] = None
+    pwr_pin: Optional[int] = None
+
+    # SPI session (Raspberry Pi only). The bus is opened once and kept open across sleep and wake-ups.
+    spi_speed_hz: Optional[int] = SPI_SPEED_HZ
+    spi_chunk_size: Optional[int] = None  # Bytes per SPI write (None: the whole buffer, split at spidev's bufsiz)
+    power_off_when_asleep: Optional[bool] = True  # If False, the module stays powered while the panel sleeps
+
+    # Refresh policy
+    safety_refresh_seconds: Optional[float] = SAFETY_REFRESH_SECONDS  # Clear the panel this often (ghosting)
+    partial_refresh: Optional[bool] = True  # If False, partial updates are shown as full refreshes
+    max_partial_refreshes: Optional[int] = None  # Full refresh after this many partial ones in a row (None: no limit)
+    coalesce_seconds: Optional[float] = COALESCE_SECONDS  # Frames sent within this window share one refresh
+    min_refresh_interval_seconds: Optional[float] = MIN_REFRESH_INTERVAL_SECONDS  # Idle time between two waveforms
+
+    def __post_init__(self):
+        if self.safety_refresh_seconds <= 0:
+            raise ValueError(f"Panel '{self.name}': safety_refresh_seconds must be positive. "
+                             f"Got {self.safety_refresh_seconds}.")
+
+        if self.spi_speed_hz <= 0:
+            raise ValueError(f"Panel '{self.name}': spi_speed_hz must be positive. Got {self.spi_speed_hz}.")
+
+        if self.spi_chunk_size is not None and self.spi_chunk_size <= 0:
+            raise ValueError(f"Panel '{self.name}': spi_chunk_size must be positive. Got {self.spi_chunk_size}.")
+
+        if self.max_partial_refreshes is not None and self.max_partial_refreshes <= 0:
+            raise ValueError(f"Panel '{self.name}': max_partial_refreshes must be positive. "
+                             f"Got {self.max_partial_refreshes}.")
+
+        if self.coalesce_seconds < 0:
+            raise ValueError(f"Panel '{self.name}': coalesce_seconds can't be negative. Got {self.coalesce_seconds}.")
+
+        if self.min_refresh_interval_seconds < 0:
+            raise ValueError(f"Panel '{self.name}': min_refresh_interval_seconds can't be negative. "
+                             f"Got {self.min_refresh_interval_seconds}.")
+
+
+@dataclass(frozen=True)
+class PanelSnapshot:
+    """
+    What a panel showed after its last refresh. E-paper keeps its image without power, so after a restart the panel
+    still shows this.
+    """
+    buffer: bytes  # Packed framebuffer (as returned by EPD.getbuffer)
+    digest: str  # SHA-256 of the buffer, to catch damaged files
+    saved_at: float  # Timestamp
+    inputs: Optional[Dict[str, Any]] = None  # What the frame shows, as given by the app (e.g.: FrameInputs)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.display_controller.display_types import PanelSnapshot
+
+STATE_FORMAT_VERSION = 2
+STATE_SUFFIX = ".state"
+
+# Header: magic, version, buffer size, inputs size, saved at, SHA-256 of the buffer and inputs
+_HEADER = struct.Struct("<4sIIId32s")
+_HEADER_SIZE = 64
+_MAGIC = b"PNLS"
+# Room for the frame inputs (JSON). Bigger inputs aren't kept, only the frame.
+INPUTS_CAPACITY = 4096
+
+
+class PanelStateStore:
+    """
+    Keeps the last frame of each panel on disk, so a restart can pick up where the panel is instead of clearing it.
+
+    Each panel gets one fixed-size, memory-mapped file (header, buffer, inputs), like RingBufferSeries: a save
+    overwrites the same couple of blocks in place, with no new file or rename, so it can run after every refresh (even
+    the partial ones, every minute) and the file is never missing. The digest covers the buffer and the inputs, so a
+    save cut short reads as a damaged file (and the panel is cleared).
+    """
+    def __init__(self, folder: Union[str, Path]):
+        self._logger = log_factory("PanelStateStore", unique_handler_types=True)
+        self._folder = Path(folder)
+        # Panel name -> open file and its map, for the panels saved so far
+        self._maps: Dict[str, Tuple[Any, mmap.mmap]] = {}
+
+    def _path(self, panel_name: str) -> Path:
+        return self._folder.joinpath(f"{re.sub(r'[^A-Za-z0-9_.-]', '_', panel_name)}{STATE_SUFFIX}")
+
+    def load(self, panel_name: str) -> Optional[PanelSnapshot]:
+        """
+        :param panel_name: Name of the panel.
+        :return: The panel's last frame, or None if there's none (or the file is damaged).
+        """
+        path = self._path(panel_name)
+        if not path.exists():
+            return None
+
+        try:
+            content = path.read_bytes()
+            if len(content) < _HEADER_SIZE:
+                raise ValueError(f"it's too short for a header ({len(content)} bytes)")
+
+            magic, version, buffer_size, inputs_size, saved_at, digest = _HEADER.unpack_from(content, 0)
+            if magic != _MAGIC or version != STATE_FORMAT_VERSION:
+                return None
+            if len(content) != _HEADER_SIZE + buffer_size + INPUTS_CAPACITY or inputs_size > INPUTS_CAPACITY:
+                raise ValueError(f"it has {len(content)} bytes, but its header says a {buffer_size} bytes buffer and "
+                                 f"{inputs_size} bytes of inputs")
+
+            buffer = content[_HEADER_SIZE:_HEADER_SIZE + buffer_size]
+            inputs = content[_HEADER_SIZE + buffer_size:_HEADER_SIZE + buffer_size + inputs_size]
+            if hashlib.sha256(buffer + inputs).digest() != digest:
+                raise ValueError("the buffer doesn't match its digest")
+
+            return PanelSnapshot(buffer=buffer, digest=hashlib.sha256(buffer).hexdigest(), saved_at=saved_at,
+                                 inputs=json.loads(inputs) if inputs else None)
+        except Exception as e:
+            self._logger.warning(f"Ignoring the saved state of panel '{panel_name}' ({path}): {e}")
+            return None
+
+    def _map(self, panel_name: str, buffer_size: int) -> mmap.mmap:
+        """
+        :return: The panel's file, mapped, sized for the buffer. Created (or recreated, if the buffer size changed).
+        """
+        opened = self._maps.get(panel_name)
+        if opened is not None and len(opened[1]) == _HEADER_SIZE + buffer_size + INPUTS_CAPACITY:
+            return opened[1]
+
+        self._close(panel_name)
+        path = self._path(panel_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_size = _HEADER_SIZE + buffer_size + INPUTS_CAPACITY
+        f = open(path, "r+b" if path.exists() else "w+b")
+        try:
+            if os.fstat(f.fileno()).st_size != file_size:
+                f.truncate(0)
+                f.truncate(file_size)
+            self._maps[panel_name] = f, mmap.mmap(f.fileno(), file_size)
+        except BaseException:
+            f.close()
+            raise
+        return self._maps[panel_name][1]
+
+    def save(self, panel_name: str, buffer: bytes, inputs: Optional[Dict[str, Any]] = None):
+        """
+        :param panel_name: Name of the panel.
+        :param buffer: Packed framebuffer the panel shows now.
+        :param inputs: What the frame shows, as given by the app (JSON serializable).
+        """
+        buffer = bytes(buffer)
+        encoded_inputs = json.dumps(inputs).encode("utf-8") if inputs is not None else b""
+        if len(encoded_inputs) > INPUTS_CAPACITY:
+            self._logger.warning(f"The inputs of panel '{panel_name}' take {len(encoded_inputs)} bytes, more than "
+                                 f"{INPUTS_CAPACITY}. Saving the frame without them.")
+            encoded_inputs = b""
+
+        state_map = self._map(panel_name, len(buffer))
+        # Data first, header last: the digest only matches once both are written
+        state_map[_HEADER_SIZE:_HEADER_SIZE + len(buffer)] = buffer
+        state_map[_HEADER_SIZE + len(buffer):_HEADER_SIZE + len(buffer) + len(encoded_inputs)] = encoded_inputs
+        _HEADER.pack_into(state_map, 0, _MAGIC, STATE_FORMAT_VERSION, len(buffer), len(encoded_inputs), time.time(),
+                          hashlib.sha256(buffer + encoded_inputs).digest())
+        state_map.flush()
+
+    def delete(self, panel_name: str):
+        """
+        Forgets the panel's last frame (e.g.: the panel was cleared).
+        """
+        self._close(panel_name)
+        self._path(panel_name).unlink(missing_ok=True)
+
+    def _close(self, panel_name: str):
+        opened = self._maps.pop(panel_name, None)
+        if opened is not None:
+            f, state_map = opened
+            state_map.flush()
+            state_map.close()
+            f.close()
+
+    def close(self):
+        for panel_name in list(self._maps):
+            self._close(panel_name)
@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from src.utils.region_utils import Region, merge_regions
+
+
+class UpdateCoalescer:
+    """
+    Sits in front of one panel and turns a burst of changes (a new price, the balance, the status caption, the
+    clock...) into one refresh:
+    - A frame is held back for a short window after it was sent, so newer frames can replace it. The frame that's shown
+      covers what the frames it replaced changed: their regions are merged (overlapping and adjacent ones into their
+      union), and a full frame anywhere in the burst makes it a full refresh.
+    - A waveform never starts less than the min interval after the previous one ended.
+
+    The window counts from the first frame of a burst, so a steady stream of frames still gets drawn.
+    """
+    def __init__(
+            self,
+            window: float,
+            min_interval: float,
+            clock: Callable[[], float] = time.perf_counter,
+            sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        :param window: Seconds a frame is held back, from when the first frame of the burst was sent.
+        :param min_interval: Min seconds between the end of a refresh and the start of the next one.
+        :param clock: Monotonic clock (the one the frame times come from).
+        :param sleep: Sleep function.
+        """
+        self._window = window
+        self._min_interval = min_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Changes of the frames that were replaced (not on the panel yet), and when the first of them was sent
+        self._regions: List[Region] = []
+        self._full = False
+        self._burst_started_at: Optional[float] = None
+        self._last_refresh_at: Optional[float] = None
+
+    def hold(self, sent_at: float):
+        """
+        Blocks until the frame can be shown: the coalescing window is over and the panel rested long enough.
+
+        :param sent_at: When the frame was sent (on the coalescer's clock).
+        """
+        with self._lock:
+            started_at = sent_at if self._burst_started_at is None else min(sent_at, self._burst_started_at)
+            ready_at = started_at + self._window
+            if self._last_refresh_at is not None:
+                ready_at = max(ready_at, self._last_refresh_at + self._min_interval)
+
+        delay = ready_at - self._clock()
+        if delay > 0:
+            self._sleep(delay)
+
+    def drop(self, regions: Optional[List[Region]], sent_at: float):
+        """
+        Carries the changes of a frame that won't be shown over to the next one.
+
+        :param regions: Regions the frame changed (None: the whole frame).
+        :param sent_at: When the frame was sent.
+        """
+        with self._lock:
+            if regions is None:
+                self._full = True
+            else:
+                self._regions.extend(regions)
+            if self._burst_started_at is None or sent_at < self._burst_started_at:
+                self._burst_started_at = sent_at
+
+    def take(self, regions: Optional[List[Region]]) -> Optional[List[Region]]:
+        """
+        Adds the changes carried over from dropped frames to the frame about to be shown, and starts a new burst.
+
+        :param regions: Regions the frame changed (None: the whole frame).
+        :return: Regions to refresh, merged (None: the whole frame).
+        """
+        with self._lock:
+            full = self._full or regions is None
+            merged = None if full else merge_regions(self._regions + regions)
+            self._regions = []
+            self._full = False
+            self._burst_started_at = None
+            return merged
+
+    def refreshed(self):
+        """
+        Marks the end of a refresh, for the min interval.
+        """
+        with self._lock:
+            self._last_refresh_at = self._clock()
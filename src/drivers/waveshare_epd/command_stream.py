@@ -0,0 +1,39 @@
+from typing import Iterable, Iterator, List, Tuple, Union
+
+Step = Tuple[int, bytes]
+
+
+class CommandStream:
+    """
+    A sequence of controller commands, each with its data bytes, e.g.:
+        CommandStream().command(0x22, 0xC7).command(0x20)
+
+    EPD.send_stream sends each command with one SPI write for the command byte and one for its whole data block, with a
+    single DC transition, instead of four GPIO/SPI operations per byte. Streams are immutable once built, so the fixed
+    sequences (init, LUTs, partial refresh preamble...) are built once and reused.
+    """
+    def __init__(self, steps: Iterable[Step] = ()):
+        self._steps: List[Step] = list(steps)
+
+    def command(self, command: int, *data: Union[int, bytes, bytearray]) -> "CommandStream":
+        """
+        :param command: Command register.
+        :param data: Data bytes, as ints and/or byte strings.
+        :return: A new stream with the command appended.
+        """
+        payload = bytearray()
+        for item in data:
+            if isinstance(item, int):
+                payload.append(item & 0xFF)
+            else:
+                payload += item
+        return CommandStream(self._steps + [(command, bytes(payload))])
+
+    def __add__(self, other: "CommandStream") -> "CommandStream":
+        return CommandStream(self._steps + other._steps)
+
+    def __iter__(self) -> Iterator[Step]:
+        return iter(self._steps)
+
+    def __len__(self) -> int:
+        return len(self._steps)
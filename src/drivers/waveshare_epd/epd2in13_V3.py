@@ -30,22 +30,75 @@
 
 import logging
 from src.drivers.waveshare_epd import epdconfig
+from src.drivers.waveshare_epd.command_stream import CommandStream
+from src.metrics.stage_metrics import timed
 
 # Display resolution
 EPD_WIDTH = 122
 EPD_HEIGHT = 250
 
+# RAM planes: the image to show, and the image on the panel (what partial refreshes are diffed against)
+NEW_IMAGE_RAM = 0x24
+OLD_IMAGE_RAM = 0x26
+
 logger = logging.getLogger(__name__)
 
 
+def _window_stream(x_start, y_start, x_end, y_end):
+    # x point must be the multiple of 8 or the last 3 bits will be ignored
+    return CommandStream() \
+        .command(0x44, (x_start >> 3) & 0xFF, (x_end >> 3) & 0xFF) \
+        .command(0x45, y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF)
+
+
+def _cursor_stream(x, y):
+    # SET_RAM_X_ADDRESS_COUNTER, SET_RAM_Y_ADDRESS_COUNTER
+    return CommandStream().command(0x4E, x & 0xFF).command(0x4F, y & 0xFF, (y >> 8) & 0xFF)
+
+
+def _lut_streams(lut):
+    # The waveform (the controller needs a busy wait after it), then the gate, source and VCOM voltages
+    waveform = CommandStream().command(0x32, bytes(lut[:153]))
+    voltages = CommandStream() \
+        .command(0x3f, lut[153]) \
+        .command(0x03, lut[154]) \
+        .command(0x04, lut[155], lut[156], lut[157]) \
+        .command(0x2c, lut[158])
+    return waveform, voltages
+
+
+# Fixed sequences, built once. Each command costs one SPI write, plus one for its data (see CommandStream).
+_FULL_WINDOW = _window_stream(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + _cursor_stream(0, 0)
+_INIT = CommandStream().command(0x01, 0xf9, 0x00, 0x00).command(0x11, 0x03) + _FULL_WINDOW + CommandStream() \
+    .command(0x3c, 0x05) \
+    .command(0x21, 0x00, 0x80) \
+    .command(0x18, 0x80)
+_PARTIAL_PREAMBLE = CommandStream() \
+    .command(0x37, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00) \
+    .command(0x3C, 0x80) \
+    .command(0x22, 0xC0) \
+    .command(0x20)
+_TURN_ON_DISPLAY = CommandStream().command(0x22, 0xC7).command(0x20)
+_TURN_ON_DISPLAY_PART = CommandStream().command(0x22, 0x0f).command(0x20)  # fast:0x0c, quality:0x0f, 0xcf
+_DEEP_SLEEP = CommandStream().command(0x10, 0x01)
+
+
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, device=None):
+        # device: object with the epdconfig interface (see epdconfig.create_device). Defaults to the epdconfig module.
+        self.device = device if device is not None else epdconfig
+        self.reset_pin = self.device.RST_PIN
+        self.dc_pin = self.device.DC_PIN
+        self.busy_pin = self.device.BUSY_PIN
+        self.cs_pin = self.device.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.linewidth = (self.width + 7) // 8
+        # What each RAM plane holds (a full buffer, as returned by getbuffer), or None if we don't know. Both are lost
+        # on init(), since the module may have been powered down.
+        self.planes = {NEW_IMAGE_RAM: None, OLD_IMAGE_RAM: None}
+        # The RAM window (first byte, last byte, first row, last row), or None if unknown (e.g.: after a reset)
+        self._window = None
 
     lut_partial_update = [
         0x0, 0x40, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0,
@@ -91,18 +144,21 @@ class EPD:
         0x22, 0x17, 0x41, 0x0, 0x32, 0x36,
     ]
 
+    _partial_lut_streams = _lut_streams(lut_partial_update)
+    _full_lut_streams = _lut_streams(lut_full_update)
+
     '''
     function :Hardware reset
     parameter:
     '''
 
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)
+        self.device.digital_write(self.reset_pin, 1)
+        self.device.delay_ms(20)
+        self.device.digital_write(self.reset_pin, 0)
+        self.device.delay_ms(2)
+        self.device.digital_write(self.reset_pin, 1)
+        self.device.delay_ms(20)
 
     '''
     function :send command
@@ -111,10 +167,10 @@ class EPD:
     '''
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.device.digital_write(self.dc_pin, 0)
+        self.device.digital_write(self.cs_pin, 0)
+        self.device.spi_writebyte([command])
+        self.device.digital_write(self.cs_pin, 1)
 
     '''
     function :send data
@@ -123,27 +179,48 @@ class EPD:
     '''
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.device.digital_write(self.dc_pin, 1)
+        self.device.digital_write(self.cs_pin, 0)
+        self.device.spi_writebyte([data])
+        self.device.digital_write(self.cs_pin, 1)
 
     # send a lot of data   
+    @timed("spi_transfer")
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.device.digital_write(self.dc_pin, 1)
+        self.device.digital_write(self.cs_pin, 0)
+        self.device.spi_writebyte2(data)
+        self.device.digital_write(self.cs_pin, 1)
+
+    '''
+    function :send a command stream
+    parameter:
+     stream : CommandStream. Each command goes in one SPI write and its data in another.
+    Where CS is a GPIO (Jetson Nano), the command and its data share one chip select frame. On the Raspberry Pi, spidev
+    drives CS itself and toggles it around every write (and every spi_chunk_size chunk), so they don't. The controller
+    reads DC on each byte, so that's fine either way.
+    '''
+
+    def send_stream(self, stream):
+        for command, data in stream:
+            self.device.digital_write(self.dc_pin, 0)
+            self.device.digital_write(self.cs_pin, 0)
+            self.device.spi_writebyte([command])
+            if data:
+                self.device.digital_write(self.dc_pin, 1)
+                self.device.spi_writebyte2(data)
+            self.device.digital_write(self.cs_pin, 1)
 
     '''
     function :Wait until the busy_pin goes LOW
     parameter:
     '''
 
+    @timed("busy_wait")
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while (epdconfig.digital_read(self.busy_pin) == 1):  # 0: idle, 1: busy
-            epdconfig.delay_ms(10)
+        while (self.device.digital_read(self.busy_pin) == 1):  # 0: idle, 1: busy
+            self.device.delay_ms(10)
         logger.debug("e-Paper busy release")
 
     '''
@@ -152,9 +229,7 @@ class EPD:
     '''
 
     def TurnOnDisplay(self):
-        self.send_command(0x22)  # Display Update Control
-        self.send_data(0xC7)
-        self.send_command(0x20)  # Activate Display Update Sequence
+        self.send_stream(_TURN_ON_DISPLAY)  # Display Update Control, Activate Display Update Sequence
         self.ReadBusy()
 
     '''
@@ -163,9 +238,7 @@ class EPD:
     '''
 
     def TurnOnDisplayPart(self):
-        self.send_command(0x22)  # Display Update Control
-        self.send_data(0x0f)  # fast:0x0c, quality:0x0f, 0xcf
-        self.send_command(0x20)  # Activate Display Update Sequence
+        self.send_stream(_TURN_ON_DISPLAY_PART)  # Display Update Control, Activate Display Update Sequence
         self.ReadBusy()
 
     '''
@@ -174,10 +247,15 @@ class EPD:
         lut : lut data
     '''
 
+    def _get_lut_streams(self, lut):
+        if lut is self.lut_full_update:
+            return self._full_lut_streams
+        if lut is self.lut_partial_update:
+            return self._partial_lut_streams
+        return _lut_streams(lut)
+
     def Lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        self.send_stream(self._get_lut_streams(lut)[0])
         self.ReadBusy()
 
     '''
@@ -188,16 +266,7 @@ class EPD:
 
     def SetLut(self, lut):
         self.Lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03)  # gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04)  # source voltage
-        self.send_data(lut[155])  # VSH
-        self.send_data(lut[156])  # VSH2
-        self.send_data(lut[157])  # VSL
-        self.send_command(0x2c)  # VCOM
-        self.send_data(lut[158])
+        self.send_stream(self._get_lut_streams(lut)[1])
 
     '''
     function : Setting the display window
@@ -209,16 +278,9 @@ class EPD:
     '''
 
     def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44)  # SET_RAM_X_ADDRESS_START_END_POSITION
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data((x_start >> 3) & 0xFF)
-        self.send_data((x_end >> 3) & 0xFF)
-
-        self.send_command(0x45)  # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        # SET_RAM_X_ADDRESS_START_END_POSITION, SET_RAM_Y_ADDRESS_START_END_POSITION
+        self.send_stream(_window_stream(x_start, y_start, x_end, y_end))
+        self._window = (x_start >> 3, x_end >> 3, y_start, y_end)
 
     '''
     function : Set Cursor
@@ -228,13 +290,7 @@ class EPD:
     '''
 
     def SetCursor(self, x, y):
-        self.send_command(0x4E)  # SET_RAM_X_ADDRESS_COUNTER
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(x & 0xFF)
-
-        self.send_command(0x4F)  # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.send_stream(_cursor_stream(x, y))
 
     '''
     function : Initialize the e-Paper register
@@ -242,7 +298,7 @@ class EPD:
     '''
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.device.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -251,31 +307,103 @@ class EPD:
         self.send_command(0x12)  # SWRESET
         self.ReadBusy()
 
-        self.send_command(0x01)  # Driver output control
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        # Driver output control, data entry mode, full window and cursor, border, display update control, sensor
+        self.send_stream(_INIT)
+        self.ReadBusy()
+        self._window = self._full_window()
+        self.planes = {NEW_IMAGE_RAM: None, OLD_IMAGE_RAM: None}
 
-        self.send_command(0x11)  # data entry mode
-        self.send_data(0x03)
+        self.SetLut(self.lut_full_update)
+        return 0
 
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+    '''
+    function : RAM plane bookkeeping
+    '''
 
-        self.send_command(0x3c)
-        self.send_data(0x05)
+    def _full_window(self):
+        return 0, self.linewidth - 1, 0, self.height - 1
 
-        self.send_command(0x21)  # Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+    def _use_full_window(self):
+        # Full frame writes start at the top left of the full window. Once a plane was written through it, the address
+        # counter wraps back there.
+        if self._window != self._full_window():
+            self.send_stream(_FULL_WINDOW)
+            self._window = self._full_window()
 
-        self.send_command(0x18)
-        self.send_data(0x80)
+    def _track(self, plane, image, window):
+        first_byte, last_byte, y_start, y_end = window
+        if window == self._full_window():
+            self.planes[plane] = bytearray(image)
+            return
 
-        self.ReadBusy()
+        tracked = self.planes[plane]
+        if tracked is None:
+            # Part of a plane we know nothing about is still a plane we know nothing about
+            return
 
-        self.SetLut(self.lut_full_update)
-        return 0
+        for j in range(y_start, y_end + 1):
+            row = j * self.linewidth
+            tracked[row + first_byte:row + last_byte + 1] = image[row + first_byte:row + last_byte + 1]
+
+    def _write_plane(self, plane, image, window):
+        """
+        Writes a window (first byte, last byte, first row, last row) of a full buffer to a RAM plane.
+        """
+        first_byte, last_byte, y_start, y_end = window
+        stream = _cursor_stream(first_byte, y_start)
+        if self._window != window:
+            stream = _window_stream(first_byte << 3, y_start, (last_byte << 3) | 0x07, y_end) + stream
+
+        if window == self._full_window():
+            data = image
+        else:
+            data = bytearray()
+            for j in range(y_start, y_end + 1):
+                row = j * self.linewidth
+                data += image[row + first_byte:row + last_byte + 1]
+
+        self.send_stream(stream)
+        self._window = window
+        self.send_command(plane)
+        self.send_data2(data)
+        self._track(plane, image, window)
+
+    def _changed_window(self, tracked, image):
+        # Smallest window (first byte, last byte, first row, last row) holding every difference, None if there's none
+        if tracked is None:
+            return self._full_window()
+
+        first_byte, last_byte, y_start, y_end = self.linewidth, -1, None, None
+        for j in range(self.height):
+            row = j * self.linewidth
+            old_row = tracked[row:row + self.linewidth]
+            new_row = image[row:row + self.linewidth]
+            if old_row == new_row:
+                continue
+
+            changed = [i for i in range(self.linewidth) if old_row[i] != new_row[i]]
+            first_byte = min(first_byte, changed[0])
+            last_byte = max(last_byte, changed[-1])
+            y_start = j if y_start is None else y_start
+            y_end = j
+
+        if y_start is None:
+            return None
+        return first_byte, last_byte, y_start, y_end
+
+    '''
+    function : Makes both RAM planes hold an image, without refreshing the panel. Only the part of each plane that
+               differs from the image is sent (everything, if we don't know what the plane holds).
+    parameter:
+        image : Image data (as returned by getbuffer)
+    '''
+
+    def sync(self, image):
+        image = bytes(image)
+        for plane in (NEW_IMAGE_RAM, OLD_IMAGE_RAM):
+            window = self._changed_window(self.planes[plane], image)
+            if window is not None:
+                self._write_plane(plane, image, window)
 
     '''
     function : Display images
@@ -311,10 +439,10 @@ class EPD:
         else:
             linewidth = int(self.width / 8) + 1
 
+        self._use_full_window()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])
+        self.send_data2(image[:self.height * linewidth])
+        self.planes[NEW_IMAGE_RAM] = bytearray(image[:self.height * linewidth])
         self.TurnOnDisplay()
 
     '''
@@ -324,40 +452,79 @@ class EPD:
     '''
 
     def displayPartial(self, image):
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
+        self.device.digital_write(self.reset_pin, 0)
+        self.device.delay_ms(1)
+        self.device.digital_write(self.reset_pin, 1)
 
         self.SetLut(self.lut_partial_update)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C)  # BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x22)
-        self.send_data(0xC0)
-        self.send_command(0x20)
+        self.send_stream(_PARTIAL_PREAMBLE)  # Option for display update, BorderWavefrom, load the LUT
         self.ReadBusy()
 
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        # The reset put the RAM window back to its defaults
+        self._window = None
+        self._write_plane(NEW_IMAGE_RAM, image, self._full_window())
+        self.TurnOnDisplayPart()
+        # The old image plane gets the new image too, so the next partial update is diffed against what's shown
+        self._write_plane(OLD_IMAGE_RAM, image, self._full_window())
 
-        self.send_command(0x24)  # WRITE_RAM
-        # for j in range(0, self.height):
-        #     for i in range(0, linewidth):
-        #         self.send_data(image[i + j * linewidth])   
-        self.send_data2(image)
+    '''
+    function : Sends a window of the image buffer to e-Paper and partial refresh only that window
+    parameter:
+        image : Full image data (as returned by getbuffer)
+        x_start : X-axis starting position (rounded down to a multiple of 8)
+        y_start : Y-axis starting position
+        x_end : End position of X-axis (rounded up to the end of its byte)
+        y_end : End position of Y-axis
+    '''
+
+    def displayPartialWindow(self, image, x_start, y_start, x_end, y_end):
+        self.displayPartialWindows(image, [(x_start, y_start, x_end, y_end)])
+
+    '''
+    function : Sends several windows of the image buffer to e-Paper and partial refresh them all at once (one waveform)
+    parameter:
+        image : Full image data (as returned by getbuffer)
+        windows : (x_start, y_start, x_end, y_end) of each window, as in displayPartialWindow
+    '''
+
+    def displayPartialWindows(self, image, windows):
+        if self.width % 8 == 0:
+            linewidth = int(self.width / 8)
+        else:
+            linewidth = int(self.width / 8) + 1
+
+        byte_windows = [
+            (x_start >> 3, min(x_end | 0x07, linewidth * 8 - 1) >> 3, y_start, y_end)
+            for x_start, y_start, x_end, y_end in windows
+        ]
+
+        self.device.digital_write(self.reset_pin, 0)
+        self.device.delay_ms(1)
+        self.device.digital_write(self.reset_pin, 1)
+
+        self.SetLut(self.lut_partial_update)
+        self.send_stream(_PARTIAL_PREAMBLE)  # Option for display update, BorderWavefrom, load the LUT
+        self.ReadBusy()
+
+        # The reset put the RAM window back to its defaults
+        self._window = None
+        for window in byte_windows:
+            self._write_plane(NEW_IMAGE_RAM, image, window)
         self.TurnOnDisplayPart()
+        # Only the windows changed, so only those windows of the old image plane need to catch up. With both planes
+        # matching the panel, partial updates can go on without reloading a base image.
+        for window in byte_windows:
+            self._write_plane(OLD_IMAGE_RAM, image, window)
+
+    '''
+    function : Writes a base image to both RAM planes without refreshing the panel
+    parameter:
+        image : Image data
+    '''
+
+    def loadBaseImage(self, image):
+        self._write_plane(NEW_IMAGE_RAM, image, self._full_window())
+        self._write_plane(OLD_IMAGE_RAM, image, self._full_window())
 
     '''
     function : Refresh a base image
@@ -366,11 +533,13 @@ class EPD:
     '''
 
     def displayPartBaseImage(self, image):
+        self._use_full_window()
         self.send_command(0x24)
         self.send_data2(image)
 
         self.send_command(0x26)
         self.send_data2(image)
+        self.planes = {NEW_IMAGE_RAM: bytearray(image), OLD_IMAGE_RAM: bytearray(image)}
         self.TurnOnDisplay()
 
     '''
@@ -385,8 +554,10 @@ class EPD:
             linewidth = int(self.width / 8) + 1
         # logger.debug(linewidth)
 
+        self._use_full_window()
         self.send_command(0x24)
         self.send_data2([color] * int(self.height * linewidth))
+        self.planes[NEW_IMAGE_RAM] = bytearray([color] * int(self.height * linewidth))
         self.TurnOnDisplay()
 
     '''
@@ -395,10 +566,11 @@ class EPD:
     '''
 
     def sleep(self):
-        self.send_command(0x10)  # enter deep sleep
-        self.send_data(0x01)
+        self.send_stream(_DEEP_SLEEP)  # enter deep sleep
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        # Give the panel time to enter deep sleep before its power is cut. No need if it stays powered.
+        if getattr(self.device, "power_off_when_asleep", True):
+            self.device.delay_ms(2000)
+        self.device.module_exit()
 
 ### END OF FILE ###
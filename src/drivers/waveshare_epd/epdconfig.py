@@ -29,9 +29,10 @@
 
 import os
 import logging
+import struct
 import sys
+import threading
 import time
-import subprocess
 
 from ctypes import *
 
@@ -48,17 +49,65 @@ class RaspberryPi:
     MOSI_PIN = 10
     SCLK_PIN = 11
 
-    def __init__(self):
+    SPI_SPEED_HZ = 4000000
+
+    def __init__(self, spi_bus=0, spi_device=0, rst_pin=None, dc_pin=None, busy_pin=None, pwr_pin=None,
+                 spi_speed_hz=None, spi_chunk_size=None, power_off_when_asleep=True):
+        # Pins left as None keep the defaults above. spi_device is the chip select (CE0 = 0, CE1 = 1).
+        self.RST_PIN = rst_pin if rst_pin is not None else self.RST_PIN
+        self.DC_PIN = dc_pin if dc_pin is not None else self.DC_PIN
+        self.BUSY_PIN = busy_pin if busy_pin is not None else self.BUSY_PIN
+        self.PWR_PIN = pwr_pin if pwr_pin is not None else self.PWR_PIN
+        self.spi_bus = spi_bus
+        self.spi_device = spi_device
+        self.spi_speed_hz = spi_speed_hz if spi_speed_hz is not None else self.SPI_SPEED_HZ
+        # Bytes per SPI write. None sends each buffer in one call (spidev still splits it at its bufsiz, 4096 by
+        # default).
+        self.spi_chunk_size = spi_chunk_size
+        # If True, the module is powered down every time the panel goes to sleep. If False, it stays powered (and
+        # the bus stays set up) until close(), so waking up is just a reset.
+        self.power_off_when_asleep = power_off_when_asleep
+
+        self.SPI = None
+        self.DEV_SPI = None
+        self._is_open = False
+        self.open()
+
+    def open(self):
+        """
+        Claims the GPIO pins and opens the SPI bus. The session stays open across sleep and wake-ups, until close().
+        """
+        if self._is_open:
+            return
+
         import spidev
         import gpiozero
 
-        self.SPI = spidev.SpiDev()
         self.GPIO_RST_PIN = gpiozero.LED(self.RST_PIN)
         self.GPIO_DC_PIN = gpiozero.LED(self.DC_PIN)
         # self.GPIO_CS_PIN     = gpiozero.LED(self.CS_PIN)
         self.GPIO_PWR_PIN = gpiozero.LED(self.PWR_PIN)
         self.GPIO_BUSY_PIN = gpiozero.Button(self.BUSY_PIN, pull_up=False)
 
+        self.SPI = spidev.SpiDev()
+        self.SPI.open(self.spi_bus, self.spi_device)
+        self.SPI.max_speed_hz = self.spi_speed_hz
+        self.SPI.mode = 0b00
+        self._is_open = True
+
+    def configure(self, spi_speed_hz=None, spi_chunk_size=None, power_off_when_asleep=None):
+        """
+        Changes the session settings. Arguments left as None keep their current value.
+        """
+        if spi_speed_hz is not None:
+            self.spi_speed_hz = spi_speed_hz
+            if self._is_open:
+                self.SPI.max_speed_hz = spi_speed_hz
+        if spi_chunk_size is not None:
+            self.spi_chunk_size = spi_chunk_size
+        if power_off_when_asleep is not None:
+            self.power_off_when_asleep = power_off_when_asleep
+
     def digital_write(self, pin, value):
         if pin == self.RST_PIN:
             if value:
@@ -100,7 +149,13 @@ class RaspberryPi:
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
-        self.SPI.writebytes2(data)
+        if self.spi_chunk_size is None:
+            self.SPI.writebytes2(data)
+            return
+
+        view = memoryview(data) if isinstance(data, (bytes, bytearray)) else data
+        for start in range(0, len(data), self.spi_chunk_size):
+            self.SPI.writebytes2(view[start:start + self.spi_chunk_size])
 
     def DEV_SPI_write(self, data):
         self.DEV_SPI.DEV_SPI_SendData(data)
@@ -112,52 +167,75 @@ class RaspberryPi:
         return self.DEV_SPI.DEV_SPI_ReadData()
 
     def module_init(self, cleanup=False):
+        self.open()
         self.GPIO_PWR_PIN.on()
 
         if cleanup:
-            find_dirs = [
-                os.path.dirname(os.path.realpath(__file__)),
-                '/usr/local/lib',
-                '/usr/lib',
-            ]
-            self.DEV_SPI = None
-            for find_dir in find_dirs:
-                val = int(os.popen('getconf LONG_BIT').read())
-                logging.debug("System is %d bit" % val)
-                if val == 64:
-                    so_filename = os.path.join(find_dir, 'DEV_Config_64.so')
-                else:
-                    so_filename = os.path.join(find_dir, 'DEV_Config_32.so')
-                if os.path.exists(so_filename):
-                    self.DEV_SPI = CDLL(so_filename)
-                    break
-            if self.DEV_SPI is None:
-                RuntimeError('Cannot find DEV_Config.so')
-
+            self.DEV_SPI = _load_dev_config()
             self.DEV_SPI.DEV_Module_Init()
-
-        else:
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(0, 0)
-            self.SPI.max_speed_hz = 4000000
-            self.SPI.mode = 0b00
         return 0
 
     def module_exit(self, cleanup=False):
-        logger.debug("spi end")
-        self.SPI.close()
+        """
+        Called by EPD.sleep() once the panel is in deep sleep, and with cleanup=True on shutdown. The bus stays open
+        unless cleaning up. The module is powered down if power_off_when_asleep is set (or when cleaning up).
+        """
+        if cleanup:
+            self.close()
+        elif self.power_off_when_asleep:
+            self.power_down()
 
+    def power_down(self):
         self.GPIO_RST_PIN.off()
         self.GPIO_DC_PIN.off()
         self.GPIO_PWR_PIN.off()
         logger.debug("close 5V, Module enters 0 power consumption ...")
 
-        if cleanup:
-            self.GPIO_RST_PIN.close()
-            self.GPIO_DC_PIN.close()
-            # self.GPIO_CS_PIN.close()
-            self.GPIO_PWR_PIN.close()
-            self.GPIO_BUSY_PIN.close()
+    def close(self):
+        """
+        Powers the module down, closes the SPI bus and releases the GPIO pins. The next module_init() opens them again.
+        """
+        if not self._is_open:
+            return
+
+        self.power_down()
+        logger.debug("spi end")
+        self.SPI.close()
+
+        self.GPIO_RST_PIN.close()
+        self.GPIO_DC_PIN.close()
+        # self.GPIO_CS_PIN.close()
+        self.GPIO_PWR_PIN.close()
+        self.GPIO_BUSY_PIN.close()
+        self._is_open = False
+
+
+_dev_config = None
+
+
+def _load_dev_config():
+    """
+    Loads Waveshare's DEV_Config library (for the process's word size) once, and keeps the handle.
+    """
+    global _dev_config
+    if _dev_config is not None:
+        return _dev_config
+
+    word_size = struct.calcsize('P') * 8
+    logger.debug("System is %d bit" % word_size)
+    so_name = 'DEV_Config_64.so' if word_size == 64 else 'DEV_Config_32.so'
+    find_dirs = [
+        os.path.dirname(os.path.realpath(__file__)),
+        '/usr/local/lib',
+        '/usr/lib',
+    ]
+    for find_dir in find_dirs:
+        so_filename = os.path.join(find_dir, so_name)
+        if os.path.exists(so_filename):
+            _dev_config = CDLL(so_filename)
+            return _dev_config
+
+    raise RuntimeError('Cannot find DEV_Config.so')
 
 
 class JetsonNano:
@@ -168,7 +246,9 @@ class JetsonNano:
     BUSY_PIN = 24
     PWR_PIN = 18
 
-    def __init__(self):
+    def __init__(self, spi_library=None):
+        # spi_library: path to sysfs_software_spi.so. By default, it's looked up next to this file, then in the lib
+        # folders.
         import ctypes
         find_dirs = [
             os.path.dirname(os.path.realpath(__file__)),
@@ -176,17 +256,33 @@ class JetsonNano:
             '/usr/lib',
         ]
         self.SPI = None
-        for find_dir in find_dirs:
-            so_filename = os.path.join(find_dir, 'sysfs_software_spi.so')
-            if os.path.exists(so_filename):
-                self.SPI = ctypes.cdll.LoadLibrary(so_filename)
-                break
+        if spi_library is not None:
+            self.SPI = ctypes.cdll.LoadLibrary(spi_library)
+        else:
+            for find_dir in find_dirs:
+                so_filename = os.path.join(find_dir, 'sysfs_software_spi.so')
+                if os.path.exists(so_filename):
+                    self.SPI = ctypes.cdll.LoadLibrary(so_filename)
+                    break
         if self.SPI is None:
             raise RuntimeError('Cannot find sysfs_software_spi.so')
 
+        # Sends a whole buffer in one foreign call, instead of one call per byte. Only there if the library was built
+        # with sysfs_software_spi_bulk.c.
+        self._transfer_bulk = getattr(self.SPI, 'SYSFS_software_spi_transfer_bulk', None)
+        if self._transfer_bulk is not None:
+            self._transfer_bulk.argtypes = [ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint32]
+            self._transfer_bulk.restype = None
+        else:
+            logger.debug("sysfs_software_spi.so has no bulk transfer. Sending one byte per call.")
+
         import Jetson.GPIO
         self.GPIO = Jetson.GPIO
 
+    @property
+    def has_bulk_transfer(self):
+        return self._transfer_bulk is not None
+
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
 
@@ -200,10 +296,17 @@ class JetsonNano:
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
     def spi_writebyte2(self, data):
-        for i in range(len(data)):
-            self.SPI.SYSFS_software_spi_transfer(data[i])
+        if self._transfer_bulk is None:
+            for i in range(len(data)):
+                self.SPI.SYSFS_software_spi_transfer(data[i])
+            return
+
+        # from_buffer shares the bytearray's memory, so the only copy is the one for lists and bytes
+        buffer = data if isinstance(data, bytearray) else bytearray(data)
+        if buffer:
+            self._transfer_bulk((c_uint8 * len(buffer)).from_buffer(buffer), len(buffer))
 
-    def module_init(self):
+    def module_init(self, cleanup=False):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
         self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
@@ -217,7 +320,7 @@ class JetsonNano:
         self.SPI.SYSFS_software_spi_begin()
         return 0
 
-    def module_exit(self):
+    def module_exit(self, cleanup=False):
         logger.debug("spi end")
         self.SPI.SYSFS_software_spi_end()
 
@@ -262,7 +365,7 @@ class SunriseX3:
         #     self.SPI.writebytes([data[i]])
         self.SPI.xfer3(data)
 
-    def module_init(self):
+    def module_init(self, cleanup=False):
         if self.Flag == 0:
             self.Flag = 1
             self.GPIO.setmode(self.GPIO.BCM)
@@ -283,7 +386,7 @@ class SunriseX3:
         else:
             return 0
 
-    def module_exit(self):
+    def module_exit(self, cleanup=False):
         logger.debug("spi end")
         self.SPI.close()
 
@@ -296,22 +399,84 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
-
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
-
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+implementation = None
+# Panel workers open their devices from their own threads: only one of them detects the board and claims its pins
+_init_lock = threading.Lock()
+
+
+def _is_raspberry_pi():
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            return 'Raspberry' in cpuinfo.read()
+    except OSError:
+        return False
+
+
+def _board():
+    """
+    :return: The interface class of the board this runs on. Nothing is set up, so no pin is claimed.
+    """
+    if _is_raspberry_pi():
+        return RaspberryPi
+    if os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        return SunriseX3
+    return JetsonNano
+
+
+def init():
+    """
+    Detects the board and sets up its SPI/GPIO interface. Runs once, on first use (not on import), so importing the
+    driver is cheap and never touches the hardware. Thread safe.
+    """
+    global implementation
+    with _init_lock:
+        if implementation is not None:
+            return implementation
+
+        detected = _board()()
+        _export(detected)
+        implementation = detected
+        return implementation
+
+
+def _export(detected):
+    # The module itself is the default device: it exposes the detected board's interface.
+    for func in [x for x in dir(detected) if not x.startswith('_')]:
+        setattr(sys.modules[__name__], func, getattr(detected, func))
+
+
+def __getattr__(name):
+    # Only called for names the module doesn't have yet, i.e.: the board interface before init() ran
+    if name.startswith('_'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    init()
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+
+def create_device(spi_bus=0, spi_device=0, rst_pin=None, dc_pin=None, busy_pin=None, pwr_pin=None, spi_speed_hz=None,
+                  spi_chunk_size=None, power_off_when_asleep=None):
+    """
+    Returns the object an EPD talks to. With the default wiring, that's this module (the board detected on first use).
+    Other chip selects or pins get their own instance, so several panels can be driven at once. The wiring, SPI speed,
+    chunk size and power policy only apply to Raspberry Pi (None keeps the driver defaults).
+    """
+    if (spi_bus, spi_device, rst_pin, dc_pin, busy_pin, pwr_pin) == (0, 0, None, None, None, None):
+        detected = init()
+        if isinstance(detected, RaspberryPi):
+            with _init_lock:
+                detected.configure(spi_speed_hz, spi_chunk_size, power_off_when_asleep)
+                _export(detected)
+        return sys.modules[__name__]
+
+    # The default interface isn't set up here: it would claim the default pins, which these panels may be wired to
+    if _board() is not RaspberryPi:
+        raise RuntimeError('Custom SPI chip selects and pins are only supported on Raspberry Pi')
+
+    return RaspberryPi(spi_bus, spi_device, rst_pin, dc_pin, busy_pin, pwr_pin, spi_speed_hz, spi_chunk_size,
+                       True if power_off_when_asleep is None else power_off_when_asleep)
 
 ### END OF FILE ###
@@ -0,0 +1,17 @@
+/*
+ * Bulk transfer entry point for Waveshare's sysfs software SPI library (Jetson Nano).
+ *
+ * epdconfig.JetsonNano uses it, when the library has it, to send a whole buffer in one ctypes call instead of one call
+ * per byte. Build it into the library, next to Waveshare's sources (RaspberryPi_JetsonNano/c/lib/Config), e.g.:
+ *     gcc -O2 -shared -fPIC -o sysfs_software_spi.so sysfs_software_spi.c sysfs_gpio.c sysfs_software_spi_bulk.c
+ */
+#include <stdint.h>
+
+uint8_t SYSFS_software_spi_transfer(uint8_t value);
+
+void SYSFS_software_spi_transfer_bulk(const uint8_t *data, uint32_t length)
+{
+    for (uint32_t i = 0; i < length; i++) {
+        SYSFS_software_spi_transfer(data[i]);
+    }
+}
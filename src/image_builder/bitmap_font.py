@@ -0,0 +1,219 @@
+import mmap
+import os
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from PIL import Image
+from simple_log_factory.log_factory import log_factory
+
+from src.config import BAKED_ASSETS_FOLDER
+from src.utils.file_utils import atomic_write_bytes
+
+# File layout (little-endian):
+#   header: see _HEADER
+#   index: one entry per glyph (see _GLYPH)
+#   kerning: one entry per pair of characters FreeType moves closer or apart (see _KERNING)
+#   data: the ink of each glyph, packed like PIL's "1" mode (rows padded to a byte, most significant bit first)
+FONT_SUFFIX = ".font"
+FONT_MAGIC = b"BFNT"
+FONT_VERSION = 2
+# Magic, format version, font file name, size, ascent, descent, number of glyphs, number of kerning pairs, font file
+# size and mtime (to spot stale fonts)
+_HEADER = struct.Struct("<4sH64sHhhHIQq")
+# Code point, advance (1/64 pixels), bounding box, bitmap origin, ink position (see Glyph), ink size, data offset
+_GLYPH = struct.Struct("<IihhhhhhhhHHI")
+# Code points of the two characters, adjustment of the first one's advance (1/64 pixels)
+_KERNING = struct.Struct("<IIi")
+
+# Advance (1/64 pixels), bounding box (x0, y0, x1, y1), bitmap origin (x, y), ink position (x, y) and ink ("1" mode,
+# None if it has no ink). Positions are relative to the pen, on the baseline. The bounding box is the one FreeType
+# measures text with, which isn't always where it puts the glyph's bitmap: the origin says where that bitmap would
+# push the start of the text (never right of or below the pen).
+Glyph = Tuple[int, Tuple[int, int, int, int], Tuple[int, int], Tuple[int, int], Optional[Image.Image]]
+
+__logger = log_factory("bitmap_font", unique_handler_types=True)
+
+
+def bitmap_font_path(font_path: Union[str, Path], size: int, folder: Path = BAKED_ASSETS_FOLDER) -> Path:
+    """
+    :return: Where the baked version of a font at a size goes.
+    """
+    return folder.joinpath(f"{Path(font_path).stem}-{size}{FONT_SUFFIX}")
+
+
+def write_bitmap_font(
+        path: Union[str, Path],
+        font_path: Union[str, Path],
+        size: int,
+        metrics: Tuple[int, int],
+        glyphs: Dict[str, Glyph],
+        kerning: Optional[Dict[str, int]] = None
+) -> int:
+    """
+    Writes a bitmap font.
+
+    :param path: Bitmap font file.
+    :param font_path: The font it was rasterized from.
+    :param size: Font size.
+    :param metrics: Ascent and descent of the font.
+    :param glyphs: Character -> glyph.
+    :param kerning: Pair of characters -> adjustment of the first one's advance (1/64 pixels).
+    :return: Size of the file, in bytes.
+    """
+    font_path = Path(font_path)
+    name = font_path.name.encode("utf-8")
+    if len(name) > 64:
+        raise ValueError(f"Font file names are limited to 64 bytes. Got '{font_path.name}'.")
+
+    stat = font_path.stat()
+    ascent, descent = metrics
+    kerning = kerning or {}
+    offset = _HEADER.size + _GLYPH.size * len(glyphs) + _KERNING.size * len(kerning)
+    index, data = bytearray(), bytearray()
+    for character, (advance, bbox, origin, ink_position, ink) in sorted(glyphs.items()):
+        ink_size = ink.size if ink is not None else (0, 0)
+        index += _GLYPH.pack(ord(character), advance, *bbox, *origin, *ink_position, *ink_size, offset + len(data))
+        if ink is not None:
+            data += ink.tobytes("raw", "1")
+    for (first, second), adjustment in sorted(kerning.items()):
+        index += _KERNING.pack(ord(first), ord(second), adjustment)
+
+    header = _HEADER.pack(FONT_MAGIC, FONT_VERSION, name, size, ascent, descent, len(glyphs), len(kerning),
+                          stat.st_size, stat.st_mtime_ns)
+    content = header + index + data
+    atomic_write_bytes(path, content)
+    return len(content)
+
+
+class BitmapFont:
+    """
+    A font rasterized ahead of time at one size (see src/asset_baking/bake_assets.py), memory-mapped. Text is drawn by
+    pasting the glyphs one after the other, with no font shaping or rasterization, where FreeType's basic layout would
+    put them on a 1-bit image: same bounding box, same pixels.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, name, self.size, self.ascent, self.descent, count, kerning_count, self.source_size,
+         self.source_mtime_ns) = _HEADER.unpack_from(self._map, 0)
+        if magic != FONT_MAGIC or version != FONT_VERSION:
+            raise ValueError(f"{self.path} isn't a bitmap font of version {FONT_VERSION}.")
+        self.source_name = name.rstrip(b"\0").decode("utf-8")
+
+        # Character -> advance, bounding box, bitmap origin, ink position, ink size and data offset
+        self._index: Dict[str, tuple] = {}
+        for i in range(count):
+            (code_point, advance, x0, y0, x1, y1, origin_x, origin_y, ink_x, ink_y, width, height,
+             offset) = _GLYPH.unpack_from(self._map, _HEADER.size + i * _GLYPH.size)
+            if offset + self._ink_size(width, height) > len(self._map):
+                raise ValueError(f"{self.path} is truncated.")
+            self._index[chr(code_point)] = (advance, (x0, y0, x1, y1), (origin_x, origin_y), (ink_x, ink_y),
+                                            (width, height), offset)
+
+        # Pair of characters -> adjustment of the first one's advance
+        self._kerning: Dict[str, int] = {}
+        kerning_start = _HEADER.size + count * _GLYPH.size
+        for i in range(kerning_count):
+            first, second, adjustment = _KERNING.unpack_from(self._map, kerning_start + i * _KERNING.size)
+            self._kerning[chr(first) + chr(second)] = adjustment
+        self._glyphs: Dict[str, Glyph] = {}
+
+    @staticmethod
+    def _ink_size(width: int, height: int) -> int:
+        if width <= 0 or height <= 0:
+            return 0
+        return (width + 7) // 8 * height
+
+    def getmetrics(self) -> Tuple[int, int]:
+        """
+        :return: Ascent and descent, like FreeTypeFont.getmetrics.
+        """
+        return self.ascent, self.descent
+
+    def covers(self, text: str) -> bool:
+        """
+        :return: True if every character of the text has a glyph.
+        """
+        return all(character in self._index for character in text)
+
+    def glyph(self, character: str) -> Glyph:
+        glyph = self._glyphs.get(character)
+        if glyph is None:
+            advance, bbox, origin, ink_position, (width, height), offset = self._index[character]
+            ink = None
+            if self._ink_size(width, height):
+                data = memoryview(self._map)[offset:offset + self._ink_size(width, height)]
+                ink = Image.frombuffer("1", (width, height), data, "raw", "1", 0, 1)
+            glyph = self._glyphs[character] = advance, bbox, origin, ink_position, ink
+        return glyph
+
+    def render(self, text: str, mask_mode: str) -> Tuple[Tuple[int, int, int, int], Optional[Image.Image]]:
+        """
+        Rasterizes text, the same way ImageBuilder's text tiles are on 1-bit images (see _render_text_tile), with the
+        same pixels. Follows Pillow's FreeType rendering: the pen advances in 1/64 pixels and each glyph starts at the
+        rounded pen position. The bounding box comes from the glyphs' boxes, and the glyphs' bitmaps are placed from
+        the top left of the bitmap origins instead (and clipped to the box).
+
+        :param text: Text to render. Every character must be covered.
+        :param mask_mode: Mode of the mask ("1" or "L"). Either way, the text isn't anti-aliased.
+        :return: The text's bounding box, relative to the drawing position, and its mask (None if it's empty).
+        """
+        if not text:
+            return (0, 0, 0, 0), None
+
+        placed = []
+        pen = 0
+        # Relative to where the pen starts, on the baseline. The pen line itself is part of the box.
+        x0 = y0 = x1 = y1 = 0
+        origin_x = origin_y = 0
+        for i, character in enumerate(text):
+            advance, bbox, origin, ink_position, ink = self.glyph(character)
+            x = (pen + 32) >> 6
+            pen += advance + self._kerning.get(text[i:i + 2], 0)
+            x0, y0 = min(x0, x + bbox[0]), min(y0, bbox[1])
+            x1, y1 = max(x1, x + bbox[2], (pen + 32) >> 6), max(y1, bbox[3])
+            origin_x, origin_y = min(origin_x, x + origin[0]), min(origin_y, origin[1])
+            if ink is not None:
+                placed.append((x + ink_position[0], ink_position[1], ink))
+
+        bbox = (x0, self.ascent + y0, x1, self.ascent + y1)
+        width, height = x1 - x0, y1 - y0
+        if width <= 0 or height <= 0:
+            return bbox, None
+
+        mask = Image.new("1", (width, height), 0)
+        for x, y, ink in placed:
+            mask.paste(1, (x - origin_x, y - origin_y), ink)
+        return bbox, mask if mask_mode == "1" else mask.convert(mask_mode)
+
+
+@lru_cache(maxsize=None)
+def load_bitmap_font(font_path: str, size: int, folder: Path = BAKED_ASSETS_FOLDER) -> Optional[BitmapFont]:
+    """
+    Looks for a baked version of a font at a size. Looked up once per process.
+
+    :param font_path: The font file.
+    :param size: Font size.
+    :param folder: Where the bitmap fonts are.
+    :return: The bitmap font, or None if it wasn't baked or the font file changed since.
+    """
+    path = bitmap_font_path(font_path, size, folder)
+    if not path.exists():
+        return None
+
+    try:
+        font = BitmapFont(path)
+        stat = os.stat(font_path)
+    except (OSError, ValueError, struct.error) as e:
+        __logger.warning(f"Skipping bitmap font {path}: {e}")
+        return None
+
+    source = (os.path.basename(font_path), stat.st_size, stat.st_mtime_ns)
+    if (font.source_name, font.source_size, font.source_mtime_ns) != source:
+        __logger.warning(f"{path} doesn't match {font_path} anymore. Using the font file. Run the asset baking again.")
+        return None
+    return font
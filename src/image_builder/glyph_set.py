@@ -0,0 +1,49 @@
+import math
+from typing import Dict
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.image_builder.image_builder_types import ImageBuilderConfig
+
+
+class GlyphSet:
+    """
+    A small set of characters rendered once into fixed-size cells.
+
+    Text made only of these characters (e.g.: a clock) is drawn by pasting the cells, without rasterizing the font
+    again. Since every cell has the same size, a character always lands in the same place, so changing one character
+    only touches its own cell.
+    """
+    def __init__(
+            self,
+            characters: str,
+            font: ImageFont.FreeTypeFont,
+            config: ImageBuilderConfig = None,
+            color: str = None
+    ):
+        self.config = config or ImageBuilderConfig()
+        self.ascent, self.descent = font.getmetrics()
+        self.cell_width = max(int(math.ceil(font.getlength(character))) for character in characters)
+        self.cell_height = self.ascent + self.descent
+
+        color = color or self.config.default_text_color
+        self._glyphs: Dict[str, Image.Image] = {}
+        for character in characters:
+            glyph = Image.new(
+                self.config.image_mode.to_str(),
+                (self.cell_width, self.cell_height),
+                self.config.background_color
+            )
+            # Centered in the cell, so narrow characters (e.g.: ":") don't look out of place
+            x = (self.cell_width - font.getlength(character)) / 2
+            ImageDraw.Draw(glyph).text((x, 0), character, fill=color, font=font)
+            self._glyphs[character] = glyph
+
+    def __contains__(self, character: str) -> bool:
+        return character in self._glyphs
+
+    def get(self, character: str) -> Image.Image:
+        return self._glyphs[character]
+
+    def text_width(self, text: str) -> int:
+        return len(text) * self.cell_width
@@ -1,22 +1,70 @@
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Union
+from typing import Optional, Sequence, Tuple, Union
 
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageFont
 
+from src.config import TEXT_CACHE_SIZE
+from src.image_builder.glyph_set import GlyphSet
 from src.image_builder.image_builder_types import ImageBuilderConfig, ImageElementInfo, ImageElementExtraInfo
+from src.image_builder.render_cache import RenderCache
+from src.image_builder.sprite_atlas import load_baked_sprite
+from src.metrics.stage_metrics import get_metrics, timed
 from src.utils.asset_utils import get_available_images
+from src.utils.series_utils import MinMaxPyramid, min_max_downsample
+
+
+@lru_cache(maxsize=32)
+def load_sprite(image_path: str, scale: float) -> Image.Image:
+    """
+    Decodes and scales an image the way add_image does. Cached: shared by every builder (and every panel), so icons are
+    decoded and scaled once, not on every frame.
+
+    :param image_path: The image.
+    :param scale: Scale factor.
+    :return: The scaled image.
+    """
+    with Image.open(image_path) as image:
+        image.load()
+        if scale != 1.0:
+            new_size = (int(image.width * scale), int(image.height * scale))
+            return image.resize(new_size, Image.Resampling.LANCZOS)
+        return image.copy()
+
+
+# Text bounding box (relative to the drawing position) and its mask (None if it has no ink)
+TextTile = Tuple[Tuple[int, int, int, int], Optional[Image.Image]]
+_text_tiles: RenderCache[TextTile] = RenderCache("text", TEXT_CACHE_SIZE)
+
+
+def _render_text_tile(text: str, font: ImageFont.ImageFont, mask_mode: str) -> TextTile:
+    # Pasting the color through this mask gives the same pixels as drawing the text in place, in any image mode
+    draw = ImageDraw.Draw(Image.new(mask_mode, (1, 1)))
+    bbox = draw.textbbox((0, 0), text, font=font)
+    width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    if width <= 0 or height <= 0:
+        return bbox, None
+
+    mask = Image.new(mask_mode, (width, height), 0)
+    ImageDraw.Draw(mask).text((-bbox[0], -bbox[1]), text, fill=255 if mask_mode == "L" else 1, font=font)
+    return bbox, mask
 
 
 class ImageBuilder:
-    def __init__(self, width: int, height: int, config: ImageBuilderConfig = None):
+    def __init__(self, width: int, height: int, config: ImageBuilderConfig = None, base_image: Image.Image = None):
         self.width = width
         self.height = height
         self.config = config or ImageBuilderConfig()
-        self.image = Image.new(
-            self.config.image_mode.to_str(),
-            (self.width, self.height),
-            self.config.background_color
-        )
+        if base_image is not None:
+            # Draw on a copy, so the base image (e.g.: the frame on the panel) stays untouched
+            self.image = base_image.copy()
+        else:
+            self.image = Image.new(
+                self.config.image_mode.to_str(),
+                (self.width, self.height),
+                self.config.background_color
+            )
         self.draw = ImageDraw.Draw(self.image)
 
     def width_to_percent(self, width: Union[int, float]) -> float:
@@ -25,6 +73,82 @@ class ImageBuilder:
     def height_to_percent(self, height: Union[int, float]) -> float:
         return height / self.height
 
+    def _text_tile(
+            self,
+            text: str,
+            text_type: str,
+            bold: bool = False,
+            font_size_override: int = None,
+            font_family_override: str = None
+    ) -> Tuple[TextTile, Tuple[int, int], str]:
+        """
+        Rasterizes text (or takes it from the cache) for this builder's image mode.
+
+        :return: The text tile, the ascent and descent of the font and how it was rasterized ("bitmap" or "truetype").
+        """
+        # Text is rasterized once per text and font, then pasted (same as ImageDraw's own choice of anti-aliasing)
+        mask_mode = "1" if self.image.mode in ("1", "P", "I", "F") else "L"
+
+        # The baked bitmap fonts if there are some for this font and size, and they have every character of the text.
+        # Otherwise the font files.
+        font, bold_font = self.config.get_bitmap_fonts(
+            text_type,
+            font_size_override=font_size_override,
+            font_family_override=font_family_override
+        )
+        active_font = bold_font if bold else font
+        if font is not None and active_font is not None and active_font.covers(text):
+            bitmap_font = active_font
+            tile = _text_tiles.get_or_render(
+                (text, bitmap_font, mask_mode),
+                lambda: bitmap_font.render(text, mask_mode)
+            )
+            return tile, font.getmetrics(), "bitmap"
+
+        font, bold_font = self.config.get_font(
+            text_type,
+            font_size_override=font_size_override,
+            font_family_override=font_family_override
+        )
+        active_font = bold_font if bold else font
+        tile = _text_tiles.get_or_render(
+            (text, active_font, mask_mode),
+            lambda: _render_text_tile(text, active_font, mask_mode)
+        )
+        return tile, font.getmetrics(), "truetype"
+
+    def text_bbox(self, text: str, text_type: str, bold: bool = False) -> Tuple[int, int, int, int]:
+        """
+        :return: Bounding box of the text as add_text would draw it, relative to the drawing position (add_text's x and y).
+        """
+        (bbox, _), _, _ = self._text_tile(text, text_type, bold)
+        return bbox
+
+    def fit_text(self, text: str, text_type: str, max_width: int, bold: bool = False, ellipsis: str = "...") -> str:
+        """
+        Shortens text until it's at most max_width pixels wide once drawn by add_text.
+
+        :param text: The text.
+        :param text_type: See add_text.
+        :param max_width: Maximum width, in pixels.
+        :param bold: See add_text.
+        :param ellipsis: Appended to text that was shortened.
+        :return: The text as is if it fits, otherwise its longest prefix that fits with the ellipsis (which can be just
+        the ellipsis, or an empty string if even that doesn't fit).
+        """
+        def width(candidate: str) -> int:
+            bbox = self.text_bbox(candidate, text_type, bold)
+            return bbox[2] - bbox[0]
+
+        if width(text) <= max_width:
+            return text
+
+        for length in range(len(text) - 1, -1, -1):
+            candidate = text[:length].rstrip() + ellipsis
+            if width(candidate) <= max_width:
+                return candidate
+        return ""
+
     def add_text(
             self,
             text: str,
@@ -36,18 +160,15 @@ class ImageBuilder:
             font_size_override: int = None,
             font_family_override: str = None
     ) -> ImageElementInfo:
-        font, bold_font = self.config.get_font(
+        start = time.perf_counter()
+        color = color or self.config.default_text_color
+        (bbox, mask), (ascent, descent), method = self._text_tile(
+            text,
             text_type,
+            bold,
             font_size_override=font_size_override,
             font_family_override=font_family_override
         )
-
-        color = color or self.config.default_text_color
-
-        active_font = bold_font if bold else font
-
-        # Get the bounding box of the text
-        bbox = self.draw.textbbox((0, 0), text, font=active_font)
         text_width = bbox[2] - bbox[0]
         text_height = bbox[3] - bbox[1]
 
@@ -60,7 +181,6 @@ class ImageBuilder:
             x = int(self.width * x_percent - text_width / 2)
 
         # Calculate the y position
-        ascent, descent = font.getmetrics()
         if y_percent == 0:
             y = 0
         elif y_percent == 1:
@@ -72,11 +192,10 @@ class ImageBuilder:
         x = max(0, min(x, self.width - text_width))
         y = max(0, min(y, self.height - text_height))
 
-        # Define the position of the text
-        position = (x, y)
-
         # Draw the text
-        self.draw.text(position, text, fill=color, font=active_font)
+        if mask is not None:
+            self.image.paste(color, (x + bbox[0], y + bbox[1]), mask)
+        get_metrics().observe("text", time.perf_counter() - start, method=method)
 
         # Return text position and size info
         return ImageElementInfo(
@@ -85,9 +204,75 @@ class ImageBuilder:
             x=x,
             y=y,
             width=text_width,
-            height=text_height
+            height=text_height,
+            extra=ImageElementExtraInfo(ink_box=(x + bbox[0], y + bbox[1], x + bbox[2] - 1, y + bbox[3] - 1)),
+            text=text
+        )
+
+    @timed("text", method="glyph")
+    def add_glyph_text(
+            self,
+            text: str,
+            glyph_set: GlyphSet,
+            x_percent: float,  # 0 to 1.0 (percentage of image width), center of the text
+            y_percent: float,  # 0 to 1.0 (percentage of image height)
+            previous_text: str = None
+    ) -> ImageElementInfo:
+        """
+        Writes text by pasting pre-rendered glyphs. Placement follows the same rules as add_text.
+
+        :param text: Text to write. Every character must be in the glyph set.
+        :param glyph_set: The pre-rendered glyphs.
+        :param x_percent: Horizontal center of the text.
+        :param y_percent: Vertical position of the text.
+        :param previous_text: What is already written at this position (same length). Only the characters that differ
+        are pasted.
+        :return: Info about the whole text. ink_box covers only the cells that were pasted (None if none were).
+        """
+        text_width = glyph_set.text_width(text)
+        text_height = glyph_set.cell_height
+
+        x = int(self.width * x_percent - text_width / 2)
+        y = int(self.height * y_percent - (glyph_set.ascent + glyph_set.descent) / 2 + glyph_set.descent)
+        x = max(0, min(x, self.width - text_width))
+        y = max(0, min(y, self.height - text_height))
+
+        if previous_text is None or len(previous_text) != len(text):
+            previous_text = None
+
+        changed = [
+            index for index, character in enumerate(text)
+            if previous_text is None or previous_text[index] != character
+        ]
+        for index in changed:
+            self.image.paste(glyph_set.get(text[index]), (x + index * glyph_set.cell_width, y))
+
+        ink_box = None
+        if changed:
+            ink_box = (
+                x + changed[0] * glyph_set.cell_width,
+                y,
+                x + (changed[-1] + 1) * glyph_set.cell_width - 1,
+                y + text_height - 1
+            )
+
+        return ImageElementInfo(
+            x_percent=x_percent,
+            y_percent=y_percent,
+            x=x,
+            y=y,
+            width=text_width,
+            height=text_height,
+            extra=ImageElementExtraInfo(ink_box=ink_box),
+            text=text
         )
 
+    def clear_region(self, x0: int, y0: int, x1: int, y1: int):
+        """
+        Fills a region (in pixels, inclusive) with the background color.
+        """
+        self.draw.rectangle((x0, y0, x1, y1), fill=self.config.background_color)
+
     def add_outline_square(
             self,
             x_start: float = 0,  # 0 to 1.0 (percentage of image width)
@@ -159,6 +344,7 @@ class ImageBuilder:
             y_end=y1
         )
 
+    @timed("sprite")
     def add_image(
             self,
             image_path: Union[str, Path],  # Path to the image to add
@@ -169,13 +355,14 @@ class ImageBuilder:
             expand: bool = False,  # If True, resize the image to the specified width and height
             scale: float = 1.0  # Scale factor for the image
     ):
-        # Load the image to add
-        added_image = Image.open(image_path)
-
-        # Scale the image
-        if scale != 1.0:
-            new_size = (int(added_image.width * scale), int(added_image.height * scale))
-            added_image = added_image.resize(new_size, Image.Resampling.LANCZOS)
+        # A baked sprite (already scaled and 1-bit) if there's an up-to-date one. Otherwise the original, decoded and
+        # scaled (cached).
+        baked = None if expand else load_baked_sprite(image_path, scale)
+        if baked is not None:
+            added_image, mask = baked
+        else:
+            added_image = load_sprite(str(image_path), scale)
+            mask = None
 
         if expand:
             # Calculate the size of the added image
@@ -194,7 +381,7 @@ class ImageBuilder:
         y = max(0, min(y, self.height - added_image_height))
 
         # Paste the added image onto the main image
-        self.image.paste(added_image, (x, y), added_image.convert('RGBA'))
+        self.image.paste(added_image, (x, y), mask if mask is not None else added_image.convert('RGBA'))
 
         # Return added image position and size info
         return ImageElementInfo(
@@ -206,6 +393,68 @@ class ImageBuilder:
             height=added_image_height
         )
 
+    def add_sparkline(
+            self,
+            values: Union[Sequence[float], MinMaxPyramid],  # The series to plot. Can be far longer than the box
+            x_start: float = 0,  # 0 to 1.0 (percentage of image width)
+            y_start: float = 0,  # 0 to 1.0 (percentage of image height)
+            x_end: float = 1.0,  # 0 to 1.0 (percentage of image width)
+            y_end: float = 1.0,  # 0 to 1.0 (percentage of image height)
+            line_width: int = 1,
+            color: str = "black"
+    ) -> ImageElementInfo:
+        # Calculate the bounding box
+        x0 = int(self.width * x_start)
+        y0 = int(self.height * y_start)
+        x1 = int(self.width * x_end) - 1
+        y1 = int(self.height * y_end) - 1
+        box_width = max(x1 - x0 + 1, 1)
+        box_height = max(y1 - y0, 1)
+
+        # One (min, max) pair per pixel column, so drawing costs O(box width). Getting the pairs costs O(box width)
+        # from a MinMaxPyramid (e.g.: TimeSeriesStore.min_max_pyramid), but O(series length) from a plain sequence.
+        if isinstance(values, MinMaxPyramid):
+            columns = values.downsample(box_width)
+        else:
+            columns = min_max_downsample(values, box_width)
+
+        if columns:
+            lowest = min(low for low, _ in columns)
+            highest = max(high for _, high in columns)
+            value_range = highest - lowest
+
+            def to_y(value: float) -> int:
+                if value_range == 0:
+                    return y0 + box_height // 2
+                return y1 - round((value - lowest) / value_range * box_height)
+
+            step = box_width / len(columns)
+            points = []
+            for index, (low, high) in enumerate(columns):
+                x = x0 + int(index * step)
+                points.append((x, to_y(low)))
+                if high != low:
+                    points.append((x, to_y(high)))
+
+            if len(points) == 1:
+                self.draw.point(points, fill=color)
+            else:
+                self.draw.line(points, fill=color, width=line_width)
+
+        # Return sparkline position and size info
+        return ImageElementInfo(
+            x_percent=x_start,
+            y_percent=y_start,
+            x_percent_end=x_end,
+            y_percent_end=y_end,
+            x=x0,
+            y=y0,
+            width=x1 - x0,
+            height=y1 - y0,
+            x_end=x1,
+            y_end=y1
+        )
+
     def build(self) -> Image:
         return self.image
 
@@ -241,6 +490,15 @@ if __name__ == "__main__":
         y_percent=0.5
     )
 
+    # Two weeks of 1-minute samples squeezed into the bottom left corner
+    builder.add_sparkline(
+        MinMaxPyramid(60 * 24 * 14, (100 + (i % 1440) / 100 + (i // 1440) for i in range(60 * 24 * 14))),
+        x_start=0.05,
+        y_start=0.7,
+        x_end=0.45,
+        y_end=0.95
+    )
+
     builder.add_text(
         text="Hello World!",
         text_type="title",
@@ -1,13 +1,17 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Union, Tuple
+from typing import Dict, Optional, Union, Tuple
+from pydantic import ConfigDict
 from pydantic.dataclasses import dataclass
 from enum import Enum
 
 from PIL import ImageFont
+from PIL.Image import Image
 
 from simple_log_factory.log_factory import log_factory
 
 from src.config import FONT_ROBOTO_REGULAR, FONT_ROBOTO_BOLD
+from src.image_builder.bitmap_font import BitmapFont, load_bitmap_font
 
 
 class ImageMode(Enum):
@@ -35,6 +39,12 @@ class ImageMode(Enum):
         return False
 
 
+@lru_cache(maxsize=None)
+def _load_font(font_family: str, font_size: int) -> ImageFont.FreeTypeFont:
+    # Shared by every builder (and every panel), so each font file is only parsed once per size.
+    return ImageFont.truetype(font_family, font_size)
+
+
 @dataclass(frozen=True)
 class ConfigFontSizes:
     title: Optional[int] = 24
@@ -71,18 +81,35 @@ class ImageBuilderConfig:
         bold_font_family = bold_font_family_override or self.default_font_bold
         font_size = font_size_override or getattr(self.default_font_sizes, font_type)
         try:
-            regular_font = ImageFont.truetype(font_family, font_size)
-            bold_font = ImageFont.truetype(bold_font_family, font_size)
+            regular_font = _load_font(str(font_family), font_size)
+            bold_font = _load_font(str(bold_font_family), font_size)
             return regular_font, bold_font
         except IOError:
             self.__logger.error(f"Could not load font {font_family}. Using default font.")
             default_font = ImageFont.load_default()
             return default_font, default_font
 
+    def get_bitmap_fonts(
+            self,
+            font_type: str,
+            font_size_override: Optional[int] = None,
+            font_family_override: Optional[str] = None,
+            bold_font_family_override: Optional[str] = None
+    ) -> Tuple[Optional[BitmapFont], Optional[BitmapFont]]:
+        """
+        Same as get_font, for the baked bitmap fonts (see src/image_builder/bitmap_font.py). Either is None if that font
+        wasn't baked at that size.
+        """
+        font_family = font_family_override or self.default_font
+        bold_font_family = bold_font_family_override or self.default_font_bold
+        font_size = font_size_override or getattr(self.default_font_sizes, font_type)
+        return load_bitmap_font(str(font_family), font_size), load_bitmap_font(str(bold_font_family), font_size)
+
 
 @dataclass(frozen=True)
 class ImageElementExtraInfo:
     border_width: Optional[int] = None
+    ink_box: Optional[Tuple[int, int, int, int]] = None  # Pixels actually drawn (x0, y0, x1, y1), inclusive
 
 
 @dataclass(frozen=True)
@@ -98,3 +125,40 @@ class ImageElementInfo:
     x_percent_end: Optional[Union[float, None]] = None
     y_percent_end: Optional[Union[float, None]] = None
     extra: Optional[ImageElementExtraInfo] = None
+    text: Optional[str] = None  # For text elements, what was written
+
+
+@dataclass(frozen=True)
+class BakedSprite:
+    """
+    A sprite in a baked atlas (see src/image_builder/sprite_atlas.py): an image pre-scaled and reduced to 1 bit.
+    """
+    name: str  # File name of the original image
+    scale: float
+    width: int
+    height: int
+    source_size: int  # Size and modification time of the original when it was baked
+    source_mtime_ns: int
+
+
+@dataclass(frozen=True)
+class FrameInputs:
+    """
+    Everything a frame shows, as formatted text. Two frames with the same inputs have the same pixels.
+    """
+    layout_version: int  # Bumped whenever the layout code changes what a frame looks like
+    coin: str
+    display_size: Tuple[int, int]
+    wallet_value: str
+    usd_value: str
+    wallet_worth_value: str
+    status_text: str
+    clock_text: str
+    clock_ticker: bool
+
+
+@dataclass(frozen=True, config=ConfigDict(arbitrary_types_allowed=True))
+class RenderedFrame:
+    image: Image
+    elements: Dict[str, ImageElementInfo]  # Named elements that can be re-rendered on their own later
+    inputs: Optional[FrameInputs] = None  # What the frame shows (None if unknown)
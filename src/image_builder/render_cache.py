@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+from src.metrics.stage_metrics import MetricsRegistry, get_metrics
+
+V = TypeVar("V")
+
+
+class RenderCache(Generic[V]):
+    """
+    Small LRU cache for rendered things (frames, text tiles...), keyed on the exact inputs they were rendered from.
+
+    Every lookup is recorded in the metrics registry as the "render_cache" stage, labelled with the cache name and the
+    outcome (hit or miss), so the hit rate is the count of hits over the count of lookups.
+    """
+    def __init__(self, name: str, capacity: int, registry: Optional[MetricsRegistry] = None):
+        """
+        :param name: Name of the cache, in the metrics.
+        :param capacity: Max entries. The least recently used entry goes first.
+        :param registry: Where lookups are recorded. Defaults to the process-wide registry.
+        """
+        if capacity <= 0:
+            raise ValueError(f"Cache capacity must be positive. Got {capacity}.")
+
+        self.name = name
+        self._capacity = capacity
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, V]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], V]) -> V:
+        """
+        :param key: Everything the result depends on.
+        :param render: Renders the result, on a miss. Called without holding the cache lock.
+        :return: The cached result, or the one just rendered.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            value = self._entries.get(key)
+            hit = value is not None
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if not hit:
+            value = render()
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._capacity:
+                    self._entries.popitem(last=False)
+                self.misses += 1
+
+        registry = self._registry if self._registry is not None else get_metrics()
+        registry.observe("render_cache", time.perf_counter() - start, cache=self.name, outcome="hit" if hit else "miss")
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,174 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from PIL import Image
+from simple_log_factory.log_factory import log_factory
+
+from src.config import BAKED_ASSETS_FOLDER
+from src.image_builder.image_builder_types import BakedSprite
+from src.utils.file_utils import atomic_write_bytes
+
+# File layout (little-endian):
+#   header: magic, format version, number of sprites
+#   index: one entry per sprite (see _ENTRY)
+#   data: for each sprite, its ink plane then its mask plane, packed like PIL's "1" mode (rows padded to a byte,
+#         most significant bit first). Ink: 0 is black. Mask: 1 where the sprite covers the background.
+ATLAS_SUFFIX = ".sprites"
+ATLAS_MAGIC = b"SPRT"
+ATLAS_VERSION = 1
+_HEADER = struct.Struct("<4sHH")
+# Source file name, scale, width, height, data offset, source size and mtime (to spot stale sprites)
+_ENTRY = struct.Struct("<64sdHHIQq")
+
+__logger = log_factory("sprite_atlas", unique_handler_types=True)
+# Stale sprites already reported, so the warning isn't repeated on every frame
+_reported_stale = set()
+# Atlas files (path, size, mtime) of the folder last opened, and the atlases opened from them
+_opened: Tuple[Tuple[Tuple[str, int, int], ...], Tuple["SpriteAtlas", ...]] = ((), ())
+
+
+def _plane_size(width: int, height: int) -> int:
+    return (width + 7) // 8 * height
+
+
+def write_atlas(path: Union[str, Path], sprites: Iterable[Tuple[BakedSprite, Image.Image, Image.Image]]) -> int:
+    """
+    Writes sprites to an atlas file.
+
+    :param path: Atlas file.
+    :param sprites: (sprite info, ink, mask) of each sprite. Ink and mask are "1" mode images of the sprite's size.
+    :return: Size of the file, in bytes.
+    """
+    sprites = list(sprites)
+    offset = _HEADER.size + _ENTRY.size * len(sprites)
+    index, data = bytearray(), bytearray()
+    for info, ink, mask in sprites:
+        name = info.name.encode("utf-8")
+        if len(name) > 64:
+            raise ValueError(f"Sprite names are limited to 64 bytes. Got '{info.name}'.")
+
+        index += _ENTRY.pack(name, info.scale, info.width, info.height, offset + len(data), info.source_size,
+                             info.source_mtime_ns)
+        data += ink.tobytes("raw", "1") + mask.tobytes("raw", "1")
+
+    content = _HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, len(sprites)) + index + data
+    atomic_write_bytes(path, content)
+    return len(content)
+
+
+class SpriteAtlas:
+    """
+    A baked atlas, memory-mapped: sprites are read straight from the page cache, with no decoding or scaling.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+            raise ValueError(f"{self.path} isn't a sprite atlas of version {ATLAS_VERSION}.")
+
+        # (source file name, scale) -> sprite and the offset of its data
+        self._entries: Dict[Tuple[str, float], Tuple[BakedSprite, int]] = {}
+        for i in range(count):
+            name, scale, width, height, offset, source_size, source_mtime_ns = _ENTRY.unpack_from(
+                self._map, _HEADER.size + i * _ENTRY.size)
+            if offset + 2 * _plane_size(width, height) > len(self._map):
+                raise ValueError(f"{self.path} is truncated.")
+
+            info = BakedSprite(name=name.rstrip(b"\0").decode("utf-8"), scale=scale, width=width, height=height,
+                               source_size=source_size, source_mtime_ns=source_mtime_ns)
+            self._entries[(info.name, scale)] = info, offset
+        # Sprites already unpacked (they're small, and a layout only has a few)
+        self._loaded: Dict[Tuple[str, float], Tuple[Image.Image, Image.Image]] = {}
+
+    @property
+    def sprites(self) -> List[BakedSprite]:
+        return [info for info, _ in self._entries.values()]
+
+    def find(self, name: str, scale: float) -> Optional[BakedSprite]:
+        entry = self._entries.get((name, scale))
+        return entry[0] if entry is not None else None
+
+    def load(self, info: BakedSprite) -> Tuple[Image.Image, Image.Image]:
+        """
+        :return: The sprite's ink and mask ("1" mode images). Shared: don't draw on them.
+        """
+        key = (info.name, info.scale)
+        loaded = self._loaded.get(key)
+        if loaded is None:
+            _, offset = self._entries[key]
+            size = (info.width, info.height)
+            plane_size = _plane_size(info.width, info.height)
+            planes = memoryview(self._map)
+            ink = Image.frombuffer("1", size, planes[offset:offset + plane_size], "raw", "1", 0, 1)
+            mask = Image.frombuffer("1", size, planes[offset + plane_size:offset + 2 * plane_size], "raw", "1", 0, 1)
+            loaded = self._loaded[key] = ink, mask
+        return loaded
+
+
+def _atlas_files(folder: Path) -> Tuple[Tuple[str, int, int], ...]:
+    try:
+        with os.scandir(folder) as entries:
+            files = [(entry.path, entry.stat()) for entry in entries if entry.name.endswith(ATLAS_SUFFIX)]
+    except OSError:
+        return ()
+    return tuple(sorted((path, stat.st_size, stat.st_mtime_ns) for path, stat in files))
+
+
+def _open_atlases(folder: Path) -> Tuple[SpriteAtlas, ...]:
+    """
+    :return: The atlases in the folder. Opened again when an atlas is added, removed or rebaked (its size or mtime
+    changed), so baking the assets again doesn't need a restart.
+    """
+    global _opened
+    files = _atlas_files(folder)
+    if files == _opened[0]:
+        return _opened[1]
+
+    atlases = []
+    for path, _, _ in files:
+        try:
+            atlases.append(SpriteAtlas(path))
+        except (OSError, ValueError, struct.error) as e:
+            __logger.warning(f"Skipping sprite atlas {path}: {e}")
+    _opened = files, tuple(atlases)
+    _reported_stale.clear()
+    return _opened[1]
+
+
+def load_baked_sprite(image_path: Union[str, Path], scale: float,
+                      folder: Path = BAKED_ASSETS_FOLDER) -> Optional[Tuple[Image.Image, Image.Image]]:
+    """
+    Looks for a baked version of an image at a scale (see src/asset_baking/bake_assets.py).
+
+    :param image_path: The original image.
+    :param scale: Scale factor.
+    :param folder: Where the atlases are.
+    :return: The sprite's ink and mask, or None if it wasn't baked or the original changed since.
+    """
+    # Called on every frame, hence os.path rather than Path
+    name = os.path.basename(image_path)
+    for atlas in _open_atlases(folder):
+        info = atlas.find(name, scale)
+        if info is None:
+            continue
+
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (info.source_size, info.source_mtime_ns):
+            if (atlas.path, name, scale) not in _reported_stale:
+                _reported_stale.add((atlas.path, name, scale))
+                __logger.warning(f"The baked {name} in {atlas.path} doesn't match the original anymore. "
+                                 f"Using the original. Run the asset baking again.")
+            return None
+
+        return atlas.load(info)
+
+    return None
@@ -0,0 +1,175 @@
+import cProfile
+import io
+import pstats
+import signal
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.config import PROFILE_MAX_CYCLES, PROFILE_MAX_SECONDS, PROFILE_MAX_FOLDER_BYTES, PROFILE_TOP_ENTRIES, \
+    PROFILE_TRACEBACK_FRAMES
+
+
+class CycleProfiler:
+    """
+    Wraps a few cycles of the main loop in cProfile and tracemalloc, then dumps the results under the output folder:
+    - profile-<timestamp>.pstats: the raw cProfile stats (open with pstats or snakeviz)
+    - profile-<timestamp>.txt: the top functions by cumulative time
+    - profile-<timestamp>-allocations.txt: the top allocation sites at the end of the session
+
+    It's safe to leave enabled in production: a session never runs for more than max_cycles cycles or max_seconds,
+    tracemalloc keeps only a few frames per allocation, and the oldest dumps are deleted once the folder grows past
+    max_folder_bytes. Only the main thread is profiled.
+    """
+    def __init__(
+            self,
+            output_folder: Union[str, Path],
+            max_cycles: int = PROFILE_MAX_CYCLES,
+            max_seconds: float = PROFILE_MAX_SECONDS,
+            max_folder_bytes: int = PROFILE_MAX_FOLDER_BYTES,
+            top_entries: int = PROFILE_TOP_ENTRIES,
+            traceback_frames: int = PROFILE_TRACEBACK_FRAMES,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        self._logger = log_factory("CycleProfiler", unique_handler_types=True)
+        self.output_folder = Path(output_folder)
+        self._max_cycles = max_cycles
+        self._max_seconds = max_seconds
+        self._max_folder_bytes = max_folder_bytes
+        self._top_entries = top_entries
+        self._traceback_frames = traceback_frames
+        self._clock = clock
+
+        # Set from signal handlers, so it's a plain int that's only read at cycle boundaries
+        self._requested_cycles = 0
+
+        self._profile: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self._started_at = 0.0
+        self._target_cycles = 0
+        self._cycles_done = 0
+
+    @property
+    def is_active(self) -> bool:
+        return self._profile is not None
+
+    def request(self, cycles: int):
+        """
+        Asks for the next cycles to be profiled. Safe to call from a signal handler. Ignored while a session is running.
+
+        :param cycles: Number of cycles (capped at max_cycles).
+        """
+        if cycles > 0:
+            self._requested_cycles = min(cycles, self._max_cycles)
+
+    def install_signal_handler(self, cycles: int, signum: Optional[int] = None) -> bool:
+        """
+        Profiles the next cycles whenever the process gets the signal (SIGUSR1 by default), e.g.:
+        kill -USR1 <pid>
+
+        :param cycles: Number of cycles to profile per signal.
+        :param signum: Signal number.
+        :return: False if signals aren't available (e.g.: on Windows).
+        """
+        signum = signum if signum is not None else getattr(signal, "SIGUSR1", None)
+        if signum is None:
+            return False
+
+        signal.signal(signum, lambda received_signum, frame: self.request(cycles))
+        return True
+
+    def before_cycle(self):
+        """
+        Starts a session if one was requested. Call at the start of each cycle.
+        """
+        if self.is_active or self._requested_cycles <= 0:
+            return
+
+        self._target_cycles = self._requested_cycles
+        self._requested_cycles = 0
+        self._cycles_done = 0
+
+        # Someone else (e.g.: PYTHONTRACEMALLOC) may be tracing already. Then it's theirs to stop.
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(self._traceback_frames)
+
+        self._logger.info(f"Profiling the next {self._target_cycles} cycle(s)")
+        self._started_at = self._clock()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def after_cycle(self):
+        """
+        Counts the cycle and ends the session once it ran enough cycles (or for too long). Call at the end of each
+        cycle.
+        """
+        if not self.is_active:
+            return
+
+        self._cycles_done += 1
+        if self._cycles_done >= self._target_cycles or self._clock() - self._started_at >= self._max_seconds:
+            self.stop()
+
+    def stop(self):
+        """
+        Ends the running session (if any) and dumps the results.
+        """
+        if not self.is_active:
+            return
+
+        self._profile.disable()
+        profile = self._profile
+        self._profile = None
+
+        snapshot = tracemalloc.take_snapshot()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        try:
+            self._dump(profile, snapshot, traced_current, traced_peak)
+            self._prune()
+        except OSError as e:
+            self._logger.error(f"Could not write the profile: {e}")
+
+    def _dump(self, profile: cProfile.Profile, snapshot: tracemalloc.Snapshot, traced_current: int, traced_peak: int):
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        base_path = self.output_folder.joinpath(f"profile-{timestamp}")
+        elapsed = self._clock() - self._started_at
+
+        profile.dump_stats(f"{base_path}.pstats")
+
+        summary = io.StringIO()
+        summary.write(f"{self._cycles_done} cycle(s) in {elapsed:.1f}s\n\n")
+        pstats.Stats(profile, stream=summary).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self._top_entries)
+        base_path.with_suffix(".txt").write_text(summary.getvalue())
+
+        lines = [
+            f"{self._cycles_done} cycle(s) in {elapsed:.1f}s",
+            f"Traced memory: {traced_current / 1024:.1f} KiB, peak {traced_peak / 1024:.1f} KiB",
+            "",
+        ]
+        for statistic in snapshot.statistics("lineno")[:self._top_entries]:
+            lines.append(str(statistic))
+        self.output_folder.joinpath(f"profile-{timestamp}-allocations.txt").write_text("\n".join(lines) + "\n")
+
+        self._logger.info(f"Profile written to {base_path}.*")
+
+    def _prune(self):
+        files = sorted(
+            (path for path in self.output_folder.glob("profile-*") if path.is_file()),
+            key=lambda path: path.stat().st_mtime
+        )
+        total = sum(path.stat().st_size for path in files)
+
+        for path in files:
+            if total <= self._max_folder_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink()
@@ -0,0 +1,16 @@
+from typing import Dict, Optional
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class StageSummary:
+    stage: str
+    labels: Dict[str, str]
+    count: int  # Since start
+    total_seconds: float  # Since start
+    window: int  # Number of recent samples the figures below are computed from
+    mean_seconds: Optional[float] = None
+    p50_seconds: Optional[float] = None
+    p95_seconds: Optional[float] = None
+    max_seconds: Optional[float] = None
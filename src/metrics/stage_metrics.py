@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.config import METRICS_BUCKETS, METRICS_WINDOW
+from src.metrics.metrics_types import StageSummary
+from src.utils.file_utils import atomic_write_text
+
+METRIC_NAME = "crypto_display_stage_duration_seconds"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class RollingHistogram:
+    """
+    Cumulative histogram (what Prometheus expects) plus a window of the most recent samples, for percentiles that
+    reflect how things are going right now.
+    """
+    def __init__(self, buckets: Sequence[float], window: int):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def cumulative_counts(self) -> List[int]:
+        counts = []
+        running = 0
+        for bucket_count in self.bucket_counts:
+            running += bucket_count
+            counts.append(running)
+        return counts
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey, extra: Tuple[str, str] = None) -> str:
+    pairs = list(labels) + ([extra] if extra is not None else [])
+    return ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs)
+
+
+class MetricsRegistry:
+    """
+    Time spent in each stage of a cycle (fetch, render, pack, SPI transfer, busy wait...), per stage and labels.
+
+    Thread safe: panel workers record their stages from their own threads.
+    """
+    def __init__(
+            self,
+            buckets: Sequence[float] = METRICS_BUCKETS,
+            window: int = METRICS_WINDOW,
+            clock: Callable[[], float] = time.perf_counter
+    ):
+        self._buckets = buckets
+        self._window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelKey], RollingHistogram] = {}
+
+    def observe(self, stage: str, seconds: float, **labels: str):
+        key = (stage, tuple(sorted((name, str(value)) for name, value in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram(self._buckets, self._window)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str, **labels: str) -> Iterator[None]:
+        """
+        Times the body of a with block (exceptions included).
+
+        :param stage: Stage name.
+        :param labels: Extra labels (e.g.: source="price").
+        """
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.observe(stage, self._clock() - start, **labels)
+
+    def _snapshot(self) -> List[Tuple[str, LabelKey, List[int], int, float, List[float]]]:
+        with self._lock:
+            return [
+                (stage, labels, histogram.cumulative_counts(), histogram.count, histogram.total, list(histogram.recent))
+                for (stage, labels), histogram in sorted(self._histograms.items())
+            ]
+
+    def summaries(self) -> List[StageSummary]:
+        summaries = []
+        for stage, labels, _, count, total, recent in self._snapshot():
+            ordered = sorted(recent)
+            summaries.append(StageSummary(
+                stage=stage,
+                labels=dict(labels),
+                count=count,
+                total_seconds=total,
+                window=len(ordered),
+                mean_seconds=sum(ordered) / len(ordered) if ordered else None,
+                p50_seconds=_percentile(ordered, 50) if ordered else None,
+                p95_seconds=_percentile(ordered, 95) if ordered else None,
+                max_seconds=ordered[-1] if ordered else None
+            ))
+        return summaries
+
+    def to_prometheus(self) -> str:
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each stage of a display cycle.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for stage, labels, cumulative_counts, count, total, _ in self._snapshot():
+            stage_labels = (("stage", stage),) + labels
+            for bound, bucket_count in zip(self._buckets, cumulative_counts):
+                lines.append(f"{METRIC_NAME}_bucket{{{_format_labels(stage_labels, ('le', repr(float(bound))))}}} "
+                             f"{bucket_count}")
+            lines.append(f"{METRIC_NAME}_bucket{{{_format_labels(stage_labels, ('le', '+Inf'))}}} {count}")
+            lines.append(f"{METRIC_NAME}_sum{{{_format_labels(stage_labels)}}} {total!r}")
+            lines.append(f"{METRIC_NAME}_count{{{_format_labels(stage_labels)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "generated_at": time.time(),
+            "stages": [asdict(summary) for summary in self.summaries()],
+        }, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+class MetricsExporter:
+    """
+    Writes the metrics to a Prometheus node-exporter textfile and/or a JSON file, atomically, at most once per
+    interval.
+    """
+    def __init__(
+            self,
+            registry: MetricsRegistry,
+            textfile: Optional[Union[str, Path]] = None,
+            json_file: Optional[Union[str, Path]] = None,
+            interval: float = 60,
+            clock: Callable[[], float] = time.time
+    ):
+        self._logger = log_factory("MetricsExporter", unique_handler_types=True)
+        self._registry = registry
+        self._textfile = Path(textfile) if textfile is not None else None
+        self._json_file = Path(json_file) if json_file is not None else None
+        self._interval = interval
+        self._clock = clock
+        self._last_write: Optional[float] = None
+
+    def write(self):
+        try:
+            if self._textfile is not None:
+                atomic_write_text(self._textfile, self._registry.to_prometheus())
+            if self._json_file is not None:
+                atomic_write_text(self._json_file, self._registry.to_json())
+        except OSError as e:
+            # Metrics are nice to have. Never let them take the display down.
+            self._logger.error(f"Could not write metrics: {e}")
+
+        self._last_write = self._clock()
+
+    def write_if_due(self) -> bool:
+        """
+        Writes the files if the interval passed since the last write.
+
+        :return: True if the files were written.
+        """
+        if self._last_write is not None and self._clock() - self._last_write < self._interval:
+            return False
+
+        self.write()
+        return True
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
+
+
+def timed(stage: str, **labels: str):
+    """
+    Times a with block into the process-wide registry, e.g.: with timed("fetch", source="price"): ...
+    """
+    return _registry.time(stage, **labels)
@@ -0,0 +1,71 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from simple_log_factory.log_factory import log_factory
+
+from src.metrics.stage_metrics import MetricsRegistry, get_metrics
+
+
+class StartupReport:
+    """
+    Breaks the time from process start to the first frame on the panel down into phases (imports, settings, history,
+    first render...). Each phase is logged and recorded in the metrics registry as the "startup" stage.
+    """
+    def __init__(
+            self,
+            started_at: float,
+            registry: Optional[MetricsRegistry] = None,
+            clock: Callable[[], float] = time.perf_counter
+    ):
+        """
+        :param started_at: When the process started, on the same clock (e.g.: time.perf_counter() at the top of main.py).
+        :param registry: Where phases are recorded. Defaults to the process-wide registry.
+        :param clock: Monotonic clock.
+        """
+        self._logger = log_factory("StartupReport", unique_handler_types=True)
+        self._started_at = started_at
+        self._registry = registry if registry is not None else get_metrics()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_mark = started_at
+        self._phases: List[Tuple[str, float]] = []
+
+    @property
+    def phases(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return list(self._phases)
+
+    def elapsed(self) -> float:
+        return self._clock() - self._started_at
+
+    def mark(self, phase: str) -> float:
+        """
+        Ends a phase: the time since the previous mark (or the start) is charged to it.
+
+        :param phase: Name of the phase that just ended.
+        :return: Duration of the phase, in seconds.
+        """
+        with self._lock:
+            now = self._clock()
+            duration = now - self._last_mark
+            self._last_mark = now
+            self._phases.append((phase, duration))
+
+        self._registry.observe("startup", duration, phase=phase)
+        return duration
+
+    def log_summary(self):
+        breakdown = ", ".join(f"{phase} {duration:.2f}s" for phase, duration in self.phases)
+        self._logger.info(f"Started in {self.elapsed():.2f}s ({breakdown})")
+
+    def panel_ready(self, panel_name: str):
+        """
+        Records when a panel finished showing its first frame. Panels do that on their own threads, so this is
+        recorded against the start, not as a phase.
+
+        :param panel_name: Name of the panel.
+        """
+        elapsed = self.elapsed()
+        self._registry.observe("startup", elapsed, phase="first_frame", panel=panel_name)
+        self._logger.info(f"First frame on {panel_name} {elapsed:.2f}s after start")
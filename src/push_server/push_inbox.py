@@ -0,0 +1,154 @@
+import math
+import threading
+import time
+from typing import Callable, Collection, Dict, Optional
+
+from simple_log_factory.log_factory import log_factory
+
+from src.config import PUSH_DEBOUNCE_SECONDS, PUSH_MAX_DELAY_SECONDS, PUSH_STATUS_MAX_LENGTH
+from src.push_server.push_server_types import PushedChanges
+
+
+class PushInbox:
+    """
+    Pushed values and status text, waiting to be picked up by the main loop.
+
+    Bursts are coalesced: on_ready is called once the pushes go quiet for debounce seconds (or max_delay seconds after
+    the first change of the burst, so a steady stream still gets drawn). Pushes that don't change anything never call
+    it, so they never cost a refresh.
+
+    Thread safe: the push servers call push() from their own threads.
+    """
+    def __init__(
+            self,
+            value_names: Collection[str],
+            on_ready: Callable[[], None],
+            debounce: float = PUSH_DEBOUNCE_SECONDS,
+            max_delay: float = PUSH_MAX_DELAY_SECONDS,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        :param value_names: Names of the values that can be pushed (the source names).
+        :param on_ready: Called (from the inbox's thread) when a burst of changes is ready to be drawn.
+        :param debounce: Seconds without changes before on_ready is called.
+        :param max_delay: Max seconds between the first change of a burst and on_ready.
+        :param clock: Monotonic clock.
+        """
+        self._logger = log_factory("PushInbox", unique_handler_types=True)
+        self.value_names = frozenset(value_names)
+        self._on_ready = on_ready
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._values: Dict[str, float] = {}
+        self._status: Optional[str] = None
+        self._changed_values: Dict[str, float] = {}
+        self._status_changed = False
+
+        # When the current burst started and when on_ready is due (None when there's nothing pending)
+        self._burst_started_at: Optional[float] = None
+        self._ready_at: Optional[float] = None
+
+        self._thread = threading.Thread(target=self._run, name="PushInbox", daemon=True)
+        self._thread.start()
+
+    def _validate(self, values: Dict[str, float], status: Optional[str]):
+        unknown = set(values) - self.value_names
+        if unknown:
+            raise ValueError(f"Unknown value(s): {', '.join(sorted(unknown))}. "
+                             f"Known values: {', '.join(sorted(self.value_names))}.")
+
+        for name, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+                raise ValueError(f"{name} must be a non-negative number. Got {value!r}.")
+
+        if status is not None and len(status) > PUSH_STATUS_MAX_LENGTH:
+            raise ValueError(f"status can't be longer than {PUSH_STATUS_MAX_LENGTH} characters.")
+
+    def push(self, values: Optional[Dict[str, float]] = None, status: Optional[str] = None) -> bool:
+        """
+        Records pushed values and/or status text.
+
+        :param values: Source name to value.
+        :param status: Status text to show in the caption. An empty string clears it, None leaves it as is.
+        :return: True if anything changed (and will be drawn).
+        :raises ValueError: If a value name is unknown, a value isn't a non-negative number or the status is too long.
+        """
+        values = values or {}
+        self._validate(values, status)
+
+        with self._condition:
+            changed = False
+            for name, value in values.items():
+                value = float(value)
+                if self._values.get(name) != value:
+                    self._values[name] = value
+                    self._changed_values[name] = value
+                    changed = True
+
+            if status is not None:
+                status = status or None
+                if status != self._status:
+                    self._status = status
+                    self._status_changed = True
+                    changed = True
+
+            if changed:
+                now = self._clock()
+                if self._burst_started_at is None:
+                    self._burst_started_at = now
+                self._ready_at = min(now + self._debounce, self._burst_started_at + self._max_delay)
+                self._condition.notify()
+
+        return changed
+
+    def state(self) -> dict:
+        """
+        :return: Everything pushed so far: {"values": {...}, "status": "..."}.
+        """
+        with self._condition:
+            return {"values": dict(self._values), "status": self._status}
+
+    def take(self) -> Optional[PushedChanges]:
+        """
+        :return: What changed since the last call, or None if nothing did.
+        """
+        with self._condition:
+            if not self._changed_values and not self._status_changed:
+                return None
+
+            changes = PushedChanges(
+                values=self._changed_values,
+                status_changed=self._status_changed,
+                status=self._status
+            )
+            self._changed_values = {}
+            self._status_changed = False
+            return changes
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (self._ready_at is None or self._ready_at > self._clock()):
+                    timeout = None if self._ready_at is None else self._ready_at - self._clock()
+                    self._condition.wait(timeout)
+
+                if self._closed:
+                    return
+
+                self._ready_at = None
+                self._burst_started_at = None
+
+            try:
+                self._on_ready()
+            except Exception as e:
+                self._logger.error(f"Push callback failed: {e}")
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=1)
@@ -0,0 +1,201 @@
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.push_server.push_inbox import PushInbox
+
+# Requests bigger than this are rejected: an update is a few numbers and a short status text.
+MAX_REQUEST_BYTES = 4096
+# Seconds an HTTP client gets to send its request. A stalled one is dropped instead of holding a handler thread.
+HTTP_REQUEST_TIMEOUT = 10
+
+
+def handle_update(inbox: PushInbox, payload: object) -> dict:
+    """
+    Applies one update, e.g.: {"balance": 0.0123, "price": 151.2, "status": "3 rigs up"}. Every key except "status" is
+    a value name. An empty (or null) status clears the pushed status.
+
+    :param inbox: Where the update goes.
+    :param payload: The decoded JSON.
+    :return: The response: {"ok": true, "changed": <bool>} or {"ok": false, "error": "..."}.
+    """
+    if not isinstance(payload, dict):
+        return {"ok": False, "error": "The update must be a JSON object."}
+
+    values = {name: value for name, value in payload.items() if name != "status"}
+    status = None
+    if "status" in payload:
+        status = payload["status"] if payload["status"] is not None else ""
+        if not isinstance(status, str):
+            return {"ok": False, "error": "status must be a string."}
+
+    try:
+        changed = inbox.push(values, status)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
+    return {"ok": True, "changed": changed}
+
+
+class _UnixSocketHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON update per line. Each one gets a JSON response line.
+    """
+    server: "_UnixSocketServer"
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            if not line:
+                return
+
+            if len(line) > MAX_REQUEST_BYTES:
+                response = {"ok": False, "error": f"Updates are limited to {MAX_REQUEST_BYTES} bytes."}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                return
+
+            if not line.strip():
+                continue
+
+            try:
+                response = handle_update(self.server.inbox, json.loads(line))
+            except ValueError as e:
+                # Not JSON, or not UTF-8 (UnicodeDecodeError)
+                response = {"ok": False, "error": f"Invalid JSON: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class _UnixSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, inbox: PushInbox):
+        self.inbox = inbox
+        super().__init__(socket_path, _UnixSocketHandler)
+
+
+class _HttpHandler(BaseHTTPRequestHandler):
+    """
+    POST /update with a JSON update as the body. GET /state returns everything pushed so far.
+    """
+    server: "_HttpServer"
+    # Applies to every read and write on the connection. A timeout closes it (see handle_one_request).
+    timeout = HTTP_REQUEST_TIMEOUT
+
+    def _respond(self, status_code: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/state":
+            self._respond(404, {"ok": False, "error": "Not found."})
+            return
+
+        self._respond(200, {"ok": True, **self.server.inbox.state()})
+
+    def do_POST(self):
+        if self.path != "/update":
+            self._respond(404, {"ok": False, "error": "Not found."})
+            return
+
+        if self.headers.get("Content-Length") is None:
+            self._respond(411, {"ok": False, "error": "Content-Length is required."})
+            return
+
+        try:
+            length = int(self.headers["Content-Length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._respond(400, {"ok": False, "error": f"Invalid Content-Length: {self.headers['Content-Length']!r}."})
+            return
+
+        if length > MAX_REQUEST_BYTES:
+            self._respond(413, {"ok": False, "error": f"Updates are limited to {MAX_REQUEST_BYTES} bytes."})
+            return
+
+        try:
+            response = handle_update(self.server.inbox, json.loads(self.rfile.read(length)))
+        except ValueError as e:
+            # Not JSON, or not UTF-8 (UnicodeDecodeError)
+            response = {"ok": False, "error": f"Invalid JSON: {e}"}
+        self._respond(200 if response["ok"] else 400, response)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+
+class _HttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, inbox: PushInbox, logger):
+        self.inbox = inbox
+        self.logger = logger
+        super().__init__(address, _HttpHandler)
+
+
+class PushServer:
+    """
+    Local API to push values and status text into a PushInbox, over a Unix domain socket and/or HTTP on localhost.
+
+    Examples:
+        echo '{"balance": 0.0123, "status": "3 rigs up"}' | socat - UNIX-CONNECT:/run/crypto-display.sock
+        curl -d '{"balance": 0.0123}' http://127.0.0.1:8765/update
+    """
+    def __init__(
+            self,
+            inbox: PushInbox,
+            socket_path: Optional[Union[str, Path]] = None,
+            http_port: Optional[int] = None,
+            http_host: str = "127.0.0.1"
+    ):
+        """
+        :param inbox: Where the updates go.
+        :param socket_path: Unix domain socket to listen on (None to disable). A stale socket file is replaced.
+        :param http_port: HTTP port to listen on (None to disable).
+        :param http_host: HTTP address to listen on. Keep it on localhost: there's no authentication.
+        """
+        self._logger = log_factory("PushServer", unique_handler_types=True)
+        self._inbox = inbox
+        self._socket_path = Path(socket_path) if socket_path is not None else None
+        self._http_address = (http_host, http_port) if http_port is not None else None
+        self._servers: List[socketserver.BaseServer] = []
+        self._threads: List[threading.Thread] = []
+
+    def _serve(self, server: socketserver.BaseServer, name: str):
+        thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+        thread.start()
+        self._servers.append(server)
+        self._threads.append(thread)
+
+    def start(self):
+        if self._socket_path is not None:
+            if self._socket_path.is_socket():
+                self._socket_path.unlink()
+            self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+            self._serve(_UnixSocketServer(str(self._socket_path), self._inbox), "PushServer:socket")
+            self._logger.info(f"Listening for pushes on {self._socket_path}")
+
+        if self._http_address is not None:
+            self._serve(_HttpServer(self._http_address, self._inbox, self._logger), "PushServer:http")
+            self._logger.info(f"Listening for pushes on http://{self._http_address[0]}:{self._http_address[1]}")
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._servers.clear()
+        self._threads.clear()
+
+        if self._socket_path is not None and self._socket_path.is_socket():
+            self._socket_path.unlink(missing_ok=True)
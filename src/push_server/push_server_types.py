@@ -0,0 +1,10 @@
+from typing import Dict, Optional
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PushedChanges:
+    values: Dict[str, float]  # Source name to value, only for the values that changed
+    status_changed: Optional[bool] = False
+    status: Optional[str] = None  # The pushed status text (None if it was cleared)
@@ -0,0 +1,370 @@
+import json
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.metrics.stage_metrics import timed
+from src.scheduler.scheduler_types import PollingPolicy, RequestBudgetConfig, SourceUpdate
+from src.utils.file_utils import atomic_write_text
+
+
+class RequestBudget:
+    """
+    Keeps track of how many requests were spent in the current day and month, so we never go over the API quota.
+
+    With a state file, the counts are saved after every request and loaded back on startup, so a restart doesn't
+    hand out the whole quota again.
+    """
+    def __init__(
+            self,
+            config: RequestBudgetConfig,
+            clock: Callable[[], float] = time.time,
+            state_file: Optional[Union[str, Path]] = None
+    ):
+        """
+        :param config: Quotas.
+        :param clock: Time source.
+        :param state_file: JSON file the counts are kept in (None: in memory only).
+        """
+        self._logger = log_factory("RequestBudget", unique_handler_types=True)
+        self.config = config
+        self._clock = clock
+        self._state_file = Path(state_file) if state_file is not None else None
+        # Spent from the polling loop and from the circuit breakers' probe threads
+        self._lock = threading.RLock()
+        self._day_key = None
+        self._month_key = None
+        self._day_count = 0
+        self._month_count = 0
+        self._load()
+
+    def _load(self):
+        if self._state_file is None or not self._state_file.exists():
+            return
+
+        try:
+            state = json.loads(self._state_file.read_text())
+            self._day_key = date.fromisoformat(state["day"])
+            self._month_key = tuple(state["month"])
+            self._day_count = int(state["day_count"])
+            self._month_count = int(state["month_count"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._logger.warning(f"Ignoring the saved request budget ({self._state_file}): {e}")
+            self._day_key = self._month_key = None
+            self._day_count = self._month_count = 0
+
+    def _save(self):
+        if self._state_file is None:
+            return
+
+        state = {
+            "day": self._day_key.isoformat(),
+            "month": list(self._month_key),
+            "day_count": self._day_count,
+            "month_count": self._month_count,
+        }
+        try:
+            atomic_write_text(self._state_file, json.dumps(state))
+        except OSError as e:
+            self._logger.warning(f"Could not save the request budget: {e}")
+
+    def _roll(self, now: float):
+        current = datetime.fromtimestamp(now)
+        day_key = current.date()
+        month_key = (current.year, current.month)
+
+        if day_key != self._day_key:
+            self._day_key = day_key
+            self._day_count = 0
+
+        if month_key != self._month_key:
+            self._month_key = month_key
+            self._month_count = 0
+
+    @staticmethod
+    def _next_day_start(now: float) -> float:
+        current = datetime.fromtimestamp(now)
+        day_start = current.replace(hour=0, minute=0, second=0, microsecond=0)
+        return day_start.timestamp() + 24 * 60 * 60
+
+    @staticmethod
+    def _next_month_start(now: float) -> float:
+        current = datetime.fromtimestamp(now)
+        if current.month == 12:
+            next_month = current.replace(year=current.year + 1, month=1, day=1)
+        else:
+            next_month = current.replace(month=current.month + 1, day=1)
+        return next_month.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    def _day_exhausted(self) -> bool:
+        return self.config.per_day is not None and self._day_count >= self.config.per_day
+
+    def _month_exhausted(self) -> bool:
+        return self.config.per_month is not None and self._month_count >= self.config.per_month
+
+    def can_spend(self, now: Optional[float] = None) -> bool:
+        with self._lock:
+            self._roll(now if now is not None else self._clock())
+            return not self._day_exhausted() and not self._month_exhausted()
+
+    def spend(self, now: Optional[float] = None):
+        with self._lock:
+            self._roll(now if now is not None else self._clock())
+            self._day_count += 1
+            self._month_count += 1
+            self._save()
+
+    def try_spend(self, now: Optional[float] = None) -> bool:
+        """
+        Spends one request if the budget allows it.
+
+        :param now: Current timestamp.
+        :return: True if the request can go ahead.
+        """
+        now = now if now is not None else self._clock()
+        with self._lock:
+            if not self.can_spend(now):
+                return False
+
+            self.spend(now)
+            return True
+
+    def next_reset(self, now: Optional[float] = None) -> float:
+        """
+        When the budget will allow requests again.
+
+        :param now: Current timestamp.
+        :return: Timestamp of the next reset that frees the exhausted period(s).
+        """
+        now = now if now is not None else self._clock()
+        with self._lock:
+            self._roll(now)
+
+            if self._month_exhausted():
+                return self._next_month_start(now)
+
+            if self._day_exhausted():
+                return self._next_day_start(now)
+
+            return now
+
+    def min_interval(self, now: Optional[float] = None) -> float:
+        """
+        Smallest interval between requests that still makes the remaining budget last until the end of the period.
+
+        :param now: Current timestamp.
+        :return: Interval in seconds (0 if the budget is unlimited).
+        """
+        now = now if now is not None else self._clock()
+        with self._lock:
+            self._roll(now)
+            day_count, month_count = self._day_count, self._month_count
+        interval = 0.0
+
+        if self.config.per_day is not None:
+            remaining = max(self.config.per_day - day_count, 1)
+            interval = max(interval, (self._next_day_start(now) - now) / remaining)
+
+        if self.config.per_month is not None:
+            remaining = max(self.config.per_month - month_count, 1)
+            interval = max(interval, (self._next_month_start(now) - now) / remaining)
+
+        return interval
+
+
+class PolledSource:
+    """
+    A single data source with its own polling interval.
+
+    The interval grows (up to max_interval) while the value stays flat and shrinks (down to min_interval) when it
+    moves beyond the change threshold. Fetch functions signal failure by returning a negative value.
+    """
+    def __init__(
+            self,
+            name: str,
+            fetch: Callable[[], float],
+            policy: PollingPolicy,
+            budget: RequestBudget = None,
+            initial_value: Optional[float] = None,
+            spend_budget: bool = True
+    ):
+        """
+        :param name: Source name.
+        :param fetch: The fetch function. Must return a negative value on failure.
+        :param policy: Polling intervals.
+        :param budget: Request budget. No polls while it's exhausted, and the interval is kept long enough for it to
+        last until the end of the period.
+        :param initial_value: Last known value (e.g.: from the history store).
+        :param spend_budget: If False, the fetch function spends the budget itself, once per actual request (e.g.: a
+        CircuitBreaker, which makes no request while the circuit is open).
+        """
+        self._logger = log_factory(f"PolledSource:{name}", unique_handler_types=True)
+        self.name = name
+        self.policy = policy
+        self.budget = budget
+        self._spend_budget = spend_budget
+        self.value: Optional[float] = initial_value
+        self.interval = policy.base_interval
+        self.next_poll_at = 0.0
+        self._fetch = fetch
+
+    def is_due(self, now: float) -> bool:
+        return now >= self.next_poll_at
+
+    def _has_moved(self, value: float) -> bool:
+        if self.value is None or self.value == 0:
+            return value != 0
+
+        return abs(value - self.value) / abs(self.value) >= self.policy.change_threshold
+
+    def _adjust_interval(self, moved: bool, now: float):
+        if self.value is None:
+            interval = self.policy.base_interval
+        elif moved:
+            interval = self.interval * self.policy.tighten_factor
+        else:
+            interval = self.interval * self.policy.backoff_factor
+
+        interval = max(self.policy.min_interval, min(interval, self.policy.max_interval))
+
+        if self.budget is not None:
+            interval = max(interval, self.budget.min_interval(now))
+
+        self.interval = interval
+
+    def poll(self, now: float, schedule_from: Optional[float] = None) -> Optional[SourceUpdate]:
+        """
+        Fetches the source (if the budget allows it) and reschedules the next poll.
+
+        :param now: Current timestamp. The update is stamped with it.
+        :param schedule_from: Timestamp the next poll is scheduled from, if later than now (e.g.: the poll was due by
+        then, and was only fetched early).
+        :return: The update, or None if nothing was fetched.
+        """
+        schedule_from = now if schedule_from is None else max(now, schedule_from)
+        if self.budget is not None and not self.budget.can_spend(now):
+            self.next_poll_at = self.budget.next_reset(now)
+            self._logger.warning(f"Request budget exhausted. Next poll at {datetime.fromtimestamp(self.next_poll_at)}.")
+            return None
+
+        if self.budget is not None and self._spend_budget:
+            self.budget.spend(now)
+
+        with timed("fetch", source=self.name):
+            value = self._fetch()
+
+        if value is None or value < 0:
+            self._logger.warning(f"Fetch failed. Retrying in {self.policy.base_interval} seconds.")
+            self.next_poll_at = schedule_from + self.policy.base_interval
+            return None
+
+        previous_value = self.value
+        self._adjust_interval(self._has_moved(value), now)
+        self.value = value
+        self.next_poll_at = schedule_from + self.interval
+
+        self._logger.debug(f"Fetched {value}. Next poll in {self.interval:.0f} seconds.")
+
+        return SourceUpdate(
+            name=self.name,
+            value=value,
+            previous_value=previous_value,
+            changed=value != previous_value,
+            timestamp=now
+        )
+
+    def push(self, value: float, now: float) -> SourceUpdate:
+        """
+        Takes a value pushed by someone else (e.g.: a mining rig that knows its balance). It's as fresh as a fetch, so
+        the next poll is pushed back by the current interval.
+
+        :param value: The pushed value.
+        :param now: Current timestamp.
+        :return: The update.
+        """
+        previous_value = self.value
+        self.value = value
+        self.next_poll_at = max(self.next_poll_at, now + self.interval)
+
+        return SourceUpdate(
+            name=self.name,
+            value=value,
+            previous_value=previous_value,
+            changed=value != previous_value,
+            timestamp=now
+        )
+
+
+class PollingScheduler:
+    def __init__(
+            self,
+            sources: List[PolledSource],
+            clock: Callable[[], float] = time.time,
+            on_update: Optional[Callable[[SourceUpdate], None]] = None
+    ):
+        self._logger = log_factory("PollingScheduler", unique_handler_types=True)
+        self._sources = {source.name: source for source in sources}
+        self._clock = clock
+        self._on_update = on_update
+
+    def get_value(self, name: str, default: Optional[float] = None) -> Optional[float]:
+        value = self._sources[name].value
+        return default if value is None else value
+
+    def next_poll_at(self) -> float:
+        return min(source.next_poll_at for source in self._sources.values())
+
+    def seconds_until_next_poll(self) -> float:
+        return max(0.0, self.next_poll_at() - self._clock())
+
+    def poll_due(self, force: bool = False, due_by: Optional[float] = None) -> Dict[str, SourceUpdate]:
+        """
+        Polls every source that is due.
+
+        :param force: If True, polls every source regardless of its schedule.
+        :param due_by: Also poll sources that will be due by this timestamp (used to fetch ahead of a deadline). Their
+        next poll is scheduled from this timestamp, so fetching early doesn't make the schedule drift. The updates are
+        still stamped with the time they were actually fetched.
+        :return: Dictionary of source name to update, for the sources that produced a value. Every update (changed or
+        not) is also passed to the on_update callback.
+        """
+        due_check = self._clock() if due_by is None else max(self._clock(), due_by)
+        updates = {}
+
+        for source in self._sources.values():
+            if not force and not source.is_due(due_check):
+                continue
+
+            update = source.poll(self._clock(), schedule_from=due_by)
+            if update is None:
+                continue
+
+            updates[source.name] = update
+            if self._on_update is not None:
+                self._on_update(update)
+
+        return updates
+
+    def poll_all(self) -> Dict[str, SourceUpdate]:
+        return self.poll_due(force=True)
+
+    def push(self, name: str, value: float) -> SourceUpdate:
+        """
+        Sets a source's value from a push instead of a fetch. The update is also passed to the on_update callback.
+
+        :param name: Source name.
+        :param value: The pushed value.
+        :return: The update.
+        """
+        update = self._sources[name].push(value, self._clock())
+        if self._on_update is not None:
+            self._on_update(update)
+        return update
+
+    @property
+    def source_names(self) -> List[str]:
+        return list(self._sources)
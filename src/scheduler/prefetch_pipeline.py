@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+from simple_log_factory.log_factory import log_factory
+
+T = TypeVar("T")
+
+
+class PrefetchPipeline(Generic[T]):
+    """
+    Runs the work for the next frame (fetch, render, panel wake-up) ahead of a deadline, so the result is ready the
+    moment the deadline expires.
+
+    How early we start (the lead time) is learned from how long the work actually took: an exponential moving average
+    of the duration, with some safety margin on top.
+
+    interrupt() cuts the wait short (e.g.: when new data is pushed): the work runs right away and its result is
+    returned without waiting for the deadline.
+    """
+    def __init__(
+            self,
+            produce: Callable[[float], Optional[T]],
+            initial_lead_time: float = 30.0,
+            min_lead_time: float = 1.0,
+            max_lead_time: float = 5 * 60,
+            safety_factor: float = 1.5,
+            smoothing: float = 0.3,
+            clock: Callable[[], float] = time.time,
+            sleep: Optional[Callable[[float], None]] = None
+    ):
+        """
+        :param produce: Does the work. Receives the deadline and returns the result, or None if there's nothing new.
+        :param initial_lead_time: Lead time (seconds) used until we have measurements.
+        :param min_lead_time: Never start later than this before the deadline.
+        :param max_lead_time: Never start earlier than this before the deadline.
+        :param safety_factor: Multiplier applied to the average duration.
+        :param smoothing: Weight of the latest measurement in the moving average (0 to 1).
+        :param clock: Time source.
+        :param sleep: Sleep function. It must return early when the interrupted event is set, which the default
+        (interrupted.wait) does.
+        """
+        self._logger = log_factory("PrefetchPipeline", unique_handler_types=True)
+        self._produce = produce
+        self._min_lead_time = min_lead_time
+        self._max_lead_time = max_lead_time
+        self._safety_factor = safety_factor
+        self._smoothing = smoothing
+        self._clock = clock
+        self.interrupted = threading.Event()
+        self._sleep = sleep if sleep is not None else self.interrupted.wait
+        self._average_duration: Optional[float] = None
+        self._initial_lead_time = initial_lead_time
+
+    @property
+    def lead_time(self) -> float:
+        if self._average_duration is None:
+            return self._initial_lead_time
+
+        lead_time = self._average_duration * self._safety_factor
+        return max(self._min_lead_time, min(lead_time, self._max_lead_time))
+
+    def _record_duration(self, duration: float):
+        if self._average_duration is None:
+            self._average_duration = duration
+        else:
+            self._average_duration = self._smoothing * duration + (1 - self._smoothing) * self._average_duration
+
+    def interrupt(self):
+        """
+        Makes the current (or next) run_until produce its result right away. Thread safe.
+        """
+        self.interrupted.set()
+
+    def run_until(self, deadline: float) -> Optional[T]:
+        """
+        Sleeps until it's time to start, produces the result, then sleeps until the deadline.
+
+        :param deadline: When the result should be ready (timestamp).
+        :return: The produced result, or None if there was nothing new (in which case it returns right away instead of
+        waiting for the deadline).
+        """
+        if not self.interrupted.is_set():
+            self._sleep(max(0.0, deadline - self.lead_time - self._clock()))
+
+        started = self._clock()
+        interrupted = self.interrupted.is_set()
+        self.interrupted.clear()
+        if interrupted:
+            # Whatever woke us up is due now, not at the deadline.
+            deadline = min(deadline, started)
+
+        result = self._produce(deadline)
+        finished = self._clock()
+        if not interrupted:
+            self._record_duration(finished - started)
+
+        if result is None or interrupted:
+            return result
+
+        remaining = deadline - finished
+        if remaining > 0:
+            self._sleep(remaining)
+        # Work that was already overdue when it started (e.g.: the first fetch after startup) isn't late.
+        elif started < deadline:
+            self._logger.warning(f"Frame was ready {-remaining:.1f}s after the deadline. "
+                                 f"Lead time is now {self.lead_time:.1f}s.")
+
+        return result
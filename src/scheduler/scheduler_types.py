@@ -0,0 +1,28 @@
+from typing import Optional
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PollingPolicy:
+    base_interval: float  # Seconds between polls when nothing is happening
+    min_interval: float  # Fastest we're allowed to poll when the value is moving
+    max_interval: float  # Slowest we'll back off to when the value is flat
+    backoff_factor: Optional[float] = 1.5  # Interval multiplier after an unchanged value
+    tighten_factor: Optional[float] = 0.5  # Interval multiplier after a significant change
+    change_threshold: Optional[float] = 0.001  # Relative change (0.001 = 0.1%) that counts as "moved"
+
+
+@dataclass(frozen=True)
+class RequestBudgetConfig:
+    per_day: Optional[int] = None  # None means unlimited
+    per_month: Optional[int] = None  # None means unlimited
+
+
+@dataclass(frozen=True)
+class SourceUpdate:
+    name: str
+    value: float
+    previous_value: Optional[float] = None
+    changed: Optional[bool] = False
+    timestamp: Optional[float] = None
@@ -0,0 +1,139 @@
+import dataclasses
+import json
+import os
+from pathlib import Path
+from typing import List, Optional, Union
+
+from dotenv import dotenv_values, find_dotenv
+from simple_log_factory.log_factory import log_factory
+
+from src.config import ROOT_FOLDER
+from src.display_controller.display_types import PanelConfig
+from src.settings.settings_types import Settings
+
+__logger = log_factory("Settings", unique_handler_types=True)
+
+_settings: Optional[Settings] = None
+_env_file: Optional[Path] = None
+_env_file_mtime: Optional[float] = None
+
+
+def _find_env_file() -> Optional[Path]:
+    default_env_file = ROOT_FOLDER.joinpath(".env")
+    if default_env_file.exists():
+        return default_env_file
+
+    found = find_dotenv(usecwd=True)
+    return Path(found) if found else None
+
+
+def _get_mtime(env_file: Optional[Path]) -> Optional[float]:
+    try:
+        return env_file.stat().st_mtime if env_file is not None else None
+    except OSError:
+        return None
+
+
+def load_settings(env_file: Optional[Union[str, Path]] = None) -> Settings:
+    """
+    Reads the .env file (if any) and the environment into a Settings object. Environment variables win over the
+    .env file.
+
+    :param env_file: Path to the .env file. If None, looks for one in the project root, then from the current
+    working directory up.
+    :return: The validated settings.
+    """
+    global _settings, _env_file, _env_file_mtime
+
+    env_file = Path(env_file) if env_file is not None else _find_env_file()
+    file_values = dotenv_values(env_file) if env_file is not None and env_file.exists() else {}
+
+    values = {}
+    for field in dataclasses.fields(Settings):
+        env_name = field.name.upper()
+        value = os.environ.get(env_name, file_values.get(env_name))
+        if value is not None and value != "":
+            values[field.name] = value
+
+    settings = Settings(**values)
+
+    if not settings.coinmarketcap_api_key:
+        __logger.warning("COINMARKETCAP_API_KEY is not set. Price requests will fail.")
+
+    if not settings.monero_wallet:
+        __logger.warning("MONERO_WALLET is not set. Balance requests will fail.")
+
+    _settings = settings
+    _env_file = env_file
+    _env_file_mtime = _get_mtime(env_file)
+    return settings
+
+
+def get_settings() -> Settings:
+    """
+    Returns the settings, loading them on the first call only.
+
+    :return: The current settings.
+    """
+    if _settings is None:
+        return load_settings()
+    return _settings
+
+
+def reload_settings_if_changed() -> bool:
+    """
+    Reloads the settings if the .env file changed since the last load. It's just a stat() call when nothing changed,
+    so it's cheap enough to call once per cycle.
+
+    Note: values that are only read at startup (polling intervals, budgets, panel model, cache paths) still require
+    a restart to take effect.
+
+    :return: True if the settings were reloaded.
+    """
+    global _env_file_mtime
+
+    if _settings is None or _env_file is None:
+        return False
+
+    mtime = _get_mtime(_env_file)
+    if mtime == _env_file_mtime:
+        return False
+
+    try:
+        load_settings(_env_file)
+    except ValueError as e:
+        __logger.error(f"Ignoring changes to {_env_file}: {e}")
+        # Don't keep retrying the same broken file every cycle.
+        _env_file_mtime = mtime
+        return False
+
+    __logger.info(f"Reloaded settings from {_env_file}")
+    return True
+
+
+def load_panel_configs(panels_file: Optional[Union[str, Path]] = None) -> List[PanelConfig]:
+    """
+    Reads the panels to drive from a JSON file: a list of objects with the PanelConfig fields, e.g.:
+    [{"name": "left"}, {"name": "right", "spi_device": 1, "rst_pin": 5, "dc_pin": 6, "busy_pin": 13, "pwr_pin": 19}]
+
+    :param panels_file: Path to the JSON file. Relative paths are relative to the project root. If None, there's a
+    single panel with the default wiring.
+    :return: The validated panel configs.
+    """
+    if panels_file is None:
+        return [PanelConfig()]
+
+    panels_file = Path(panels_file)
+    if not panels_file.is_absolute():
+        panels_file = ROOT_FOLDER.joinpath(panels_file)
+
+    try:
+        with open(panels_file, "r") as f:
+            raw_panels = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read panels file {panels_file}: {e}")
+
+    if not isinstance(raw_panels, list) or not raw_panels:
+        raise ValueError(f"{panels_file} must contain a non-empty list of panels.")
+
+    return [PanelConfig(**raw_panel) for raw_panel in raw_panels]
@@ -0,0 +1,126 @@
+import dataclasses
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic.dataclasses import dataclass
+
+from src.config import ROOT_FOLDER, WAVESHARE_DISPLAY, DISPLAY_SIZES, HISTORY_FOLDER, HISTORY_CAPACITY, PRICE_POLL_INTERVAL, \
+    PRICE_POLL_MIN_INTERVAL, PRICE_POLL_MAX_INTERVAL, PRICE_CHANGE_THRESHOLD, BALANCE_POLL_INTERVAL, \
+    BALANCE_POLL_MIN_INTERVAL, BALANCE_POLL_MAX_INTERVAL, BALANCE_CHANGE_THRESHOLD, COINMARKETCAP_BASE_URL, \
+    UNMINEABLE_BASE_URL, REQUEST_TIMEOUT_SECONDS, COINMARKETCAP_DAILY_REQUEST_BUDGET, \
+    COINMARKETCAP_MONTHLY_REQUEST_BUDGET, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_PROBE_INTERVAL, CLOCK_TICKER, \
+    METRICS_JSON_FILE, METRICS_WRITE_INTERVAL, PROFILE_FOLDER, PROFILE_CYCLES, PROFILE_SIGNAL_CYCLES, \
+    PUSH_DEBOUNCE_SECONDS, PUSH_MAX_DELAY_SECONDS, PANEL_STATE_FOLDER, REQUEST_BUDGET_FILE
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Everything the app reads from the environment (or .env file). Each field maps to the env var with the same name
+    in upper case (e.g.: price_poll_interval -> PRICE_POLL_INTERVAL). Relative paths are relative to the project root.
+    """
+    # API keys and wallets
+    coinmarketcap_api_key: Optional[str] = None
+    monero_wallet: Optional[str] = None
+    coin: Optional[str] = "XMR"
+
+    # Upstream APIs
+    coinmarketcap_base_url: Optional[str] = COINMARKETCAP_BASE_URL
+    unmineable_base_url: Optional[str] = UNMINEABLE_BASE_URL
+    request_timeout_seconds: Optional[float] = REQUEST_TIMEOUT_SECONDS
+    circuit_failure_threshold: Optional[int] = CIRCUIT_FAILURE_THRESHOLD
+    circuit_probe_interval: Optional[float] = CIRCUIT_PROBE_INTERVAL
+
+    # Polling intervals (seconds) and budgets
+    price_poll_interval: Optional[float] = PRICE_POLL_INTERVAL
+    price_poll_min_interval: Optional[float] = PRICE_POLL_MIN_INTERVAL
+    price_poll_max_interval: Optional[float] = PRICE_POLL_MAX_INTERVAL
+    price_change_threshold: Optional[float] = PRICE_CHANGE_THRESHOLD
+    balance_poll_interval: Optional[float] = BALANCE_POLL_INTERVAL
+    balance_poll_min_interval: Optional[float] = BALANCE_POLL_MIN_INTERVAL
+    balance_poll_max_interval: Optional[float] = BALANCE_POLL_MAX_INTERVAL
+    balance_change_threshold: Optional[float] = BALANCE_CHANGE_THRESHOLD
+    coinmarketcap_daily_request_budget: Optional[int] = COINMARKETCAP_DAILY_REQUEST_BUDGET
+    coinmarketcap_monthly_request_budget: Optional[int] = COINMARKETCAP_MONTHLY_REQUEST_BUDGET
+    request_budget_file: Optional[Path] = REQUEST_BUDGET_FILE  # Requests spent this day and month
+
+    # Panel
+    panel_model: Optional[str] = WAVESHARE_DISPLAY
+    panels_file: Optional[Path] = None  # JSON list of panels (see PanelConfig). If not set, a single default panel
+    clock_ticker: Optional[bool] = CLOCK_TICKER
+    panel_state_folder: Optional[Path] = PANEL_STATE_FOLDER  # Last frame of each panel, kept across restarts
+
+    # Cache paths
+    history_folder: Optional[Path] = HISTORY_FOLDER
+    history_capacity: Optional[int] = HISTORY_CAPACITY
+
+    # Metrics. Point metrics_textfile at the node-exporter textfile collector folder (e.g.:
+    # /var/lib/node_exporter/textfile_collector/crypto_display.prom) to export them to Prometheus.
+    metrics_textfile: Optional[Path] = None
+    metrics_json_file: Optional[Path] = METRICS_JSON_FILE
+    metrics_write_interval: Optional[float] = METRICS_WRITE_INTERVAL
+
+    # Profiling (see src/metrics/cycle_profiler.py)
+    profile_cycles: Optional[int] = PROFILE_CYCLES
+    profile_signal_cycles: Optional[int] = PROFILE_SIGNAL_CYCLES
+    profile_folder: Optional[Path] = PROFILE_FOLDER
+
+    # Push API (see src/push_server). The HTTP server only listens on localhost.
+    push_socket: Optional[Path] = None
+    push_http_port: Optional[int] = None
+    push_debounce_seconds: Optional[float] = PUSH_DEBOUNCE_SECONDS
+    push_max_delay_seconds: Optional[float] = PUSH_MAX_DELAY_SECONDS
+
+    def __post_init__(self):
+        for field in dataclasses.fields(self):
+            value = getattr(self, field.name)
+            if isinstance(value, Path) and not value.is_absolute():
+                # Frozen, so it has to go around __setattr__
+                object.__setattr__(self, field.name, ROOT_FOLDER.joinpath(value))
+
+        for prefix in ("price", "balance"):
+            base = getattr(self, f"{prefix}_poll_interval")
+            low = getattr(self, f"{prefix}_poll_min_interval")
+            high = getattr(self, f"{prefix}_poll_max_interval")
+            if not 0 < low <= base <= high:
+                raise ValueError(f"{prefix} polling intervals must satisfy 0 < min <= base <= max. "
+                                 f"Got min={low}, base={base}, max={high}.")
+
+        if self.request_timeout_seconds <= 0:
+            raise ValueError(f"request_timeout_seconds must be positive. Got {self.request_timeout_seconds}.")
+
+        if self.circuit_failure_threshold <= 0 or self.circuit_probe_interval <= 0:
+            raise ValueError(f"circuit_failure_threshold and circuit_probe_interval must be positive. "
+                             f"Got {self.circuit_failure_threshold} and {self.circuit_probe_interval}.")
+
+        if self.history_capacity <= 0:
+            raise ValueError(f"history_capacity must be positive. Got {self.history_capacity}.")
+
+        if self.metrics_write_interval <= 0:
+            raise ValueError(f"metrics_write_interval must be positive. Got {self.metrics_write_interval}.")
+
+        if self.profile_cycles < 0 or self.profile_signal_cycles < 0:
+            raise ValueError(f"profile_cycles and profile_signal_cycles can't be negative. "
+                             f"Got {self.profile_cycles} and {self.profile_signal_cycles}.")
+
+        if not 0 <= self.push_debounce_seconds <= self.push_max_delay_seconds:
+            raise ValueError(f"push delays must satisfy 0 <= push_debounce_seconds <= push_max_delay_seconds. "
+                             f"Got {self.push_debounce_seconds} and {self.push_max_delay_seconds}.")
+
+        if self.panel_model not in DISPLAY_SIZES:
+            raise ValueError(f"Unknown panel_model '{self.panel_model}'. Known models: {', '.join(DISPLAY_SIZES)}.")
+
+    @property
+    def folders(self) -> List[Path]:
+        """
+        :return: Every folder the settings point at or keep a file in.
+        """
+        folders = [self.panel_state_folder, self.history_folder, self.profile_folder]
+        for file in (self.request_budget_file, self.metrics_textfile, self.metrics_json_file, self.push_socket):
+            if file is not None:
+                folders.append(file.parent)
+        return folders
+
+    @property
+    def display_size(self):
+        return DISPLAY_SIZES[self.panel_model]
@@ -0,0 +1,241 @@
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from simple_log_factory.log_factory import log_factory
+
+# Header: magic, version, capacity, head (next slot to write), count
+_HEADER = struct.Struct("<4sIQQQ")
+_HEADER_SIZE = 64
+_MAGIC = b"TSRB"
+_VERSION = 1
+
+# Record: timestamp (seconds since epoch), value
+_RECORD = struct.Struct("<dd")
+
+Sample = Tuple[float, float]
+
+
+class RingBufferSeries:
+    """
+    Fixed-size, memory-mapped ring buffer of (timestamp, value) records.
+
+    The file is allocated once, and appending only touches one record and the header, so the SD card never sees a
+    full rewrite. Once the buffer is full, the oldest records are overwritten. Timestamps must not go backwards.
+    """
+    def __init__(self, path: Union[str, Path], capacity: int):
+        self._logger = log_factory("RingBufferSeries", unique_handler_types=True)
+        self.path = Path(path)
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._open(capacity)
+
+    def _open(self, capacity: int):
+        if self.path.exists():
+            self._file = open(self.path, "r+b")
+            problem = self._open_existing()
+            if problem is None:
+                if self.capacity != capacity:
+                    self._logger.warning(f"{self.path.name} was created with capacity {self.capacity}. Ignoring "
+                                         f"requested capacity {capacity}.")
+                return
+
+            # Reading a damaged file (e.g.: cut short) would go past the end of the map. It's kept aside, not deleted.
+            self.close()
+            quarantined = self.path.with_name(f"{self.path.name}.{int(time.time())}.corrupt")
+            os.replace(self.path, quarantined)
+            self._logger.error(f"{self.path.name} {problem}. Moved it to {quarantined.name} and started a new series.")
+
+        file_size = _HEADER_SIZE + capacity * _RECORD.size
+        self._file = open(self.path, "w+b")
+        # truncate() gives us a sparse, zero-filled file without writing every block.
+        self._file.truncate(file_size)
+        self._map = mmap.mmap(self._file.fileno(), file_size)
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, capacity, 0, 0)
+
+    def _open_existing(self) -> Optional[str]:
+        """
+        Maps an existing file and checks that its header describes it.
+
+        :return: What's wrong with the file, or None if it's fine.
+        """
+        file_size = os.fstat(self._file.fileno()).st_size
+        if file_size < _HEADER_SIZE:
+            return f"is too short for a header ({file_size} bytes)"
+
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, capacity, head, count = _HEADER.unpack_from(self._map, 0)
+
+        if magic != _MAGIC or version != _VERSION:
+            return "is not a ring buffer series file (or has an unsupported version)"
+
+        expected_size = _HEADER_SIZE + capacity * _RECORD.size
+        if capacity <= 0 or file_size != expected_size:
+            return f"has {file_size} bytes, but its header says {expected_size} (capacity {capacity})"
+
+        if head >= capacity or count > capacity:
+            return f"has a damaged header (head {head}, count {count}, capacity {capacity})"
+
+        return None
+
+    @property
+    def capacity(self) -> int:
+        return _HEADER.unpack_from(self._map, 0)[2]
+
+    def _head_and_count(self) -> Tuple[int, int]:
+        _, _, _, head, count = _HEADER.unpack_from(self._map, 0)
+        return head, count
+
+    def __len__(self) -> int:
+        return self._head_and_count()[1]
+
+    def _offset(self, index: int) -> int:
+        """Byte offset of the record at the logical index (0 is the oldest record)."""
+        head, count = self._head_and_count()
+        slot = (head - count + index) % self.capacity
+        return _HEADER_SIZE + slot * _RECORD.size
+
+    def _timestamp_at(self, index: int) -> float:
+        return _RECORD.unpack_from(self._map, self._offset(index))[0]
+
+    def latest(self) -> Optional[Sample]:
+        count = len(self)
+        if count == 0:
+            return None
+        return _RECORD.unpack_from(self._map, self._offset(count - 1))
+
+    def append(self, timestamp: float, value: float) -> bool:
+        """
+        Appends a sample, overwriting the oldest one if the buffer is full.
+
+        :param timestamp: Sample timestamp (seconds since epoch).
+        :param value: Sample value.
+        :return: True if the sample was stored, False if it was older than the latest sample.
+        """
+        latest = self.latest()
+        if latest is not None and timestamp < latest[0]:
+            self._logger.warning(f"Ignoring out-of-order sample for {self.path.name}: {timestamp} < {latest[0]}")
+            return False
+
+        capacity = self.capacity
+        head, count = self._head_and_count()
+
+        # Record first, header last: if we die in between, the header still describes valid data.
+        _RECORD.pack_into(self._map, _HEADER_SIZE + head * _RECORD.size, timestamp, value)
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, capacity, (head + 1) % capacity, min(count + 1, capacity))
+        return True
+
+    def _bisect(self, timestamp: float, count: int, right: bool = False) -> int:
+        """First logical index whose timestamp is >= (or > if right is True) the given timestamp."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            middle_timestamp = self._timestamp_at(middle)
+            if middle_timestamp < timestamp or (right and middle_timestamp == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _iter_between(self, first: int, last: int) -> Iterator[Sample]:
+        """Iterates over logical indexes [first, last), unpacking contiguous chunks at C speed."""
+        if first >= last:
+            return
+
+        head, count = self._head_and_count()
+        capacity = self.capacity
+        start_slot = (head - count + first) % capacity
+        remaining = last - first
+
+        view = memoryview(self._map)
+        try:
+            while remaining > 0:
+                chunk = min(remaining, capacity - start_slot)
+                offset = _HEADER_SIZE + start_slot * _RECORD.size
+                yield from _RECORD.iter_unpack(view[offset:offset + chunk * _RECORD.size])
+                remaining -= chunk
+                start_slot = 0
+        finally:
+            view.release()
+
+    def read_range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Sample]:
+        """
+        Samples with start <= timestamp <= end.
+
+        :param start: Lower bound (inclusive). None means from the oldest sample.
+        :param end: Upper bound (inclusive). None means up to the latest sample.
+        :return: List of (timestamp, value) tuples, oldest first.
+        """
+        count = len(self)
+        first = 0 if start is None else self._bisect(start, count)
+        last = count if end is None else self._bisect(end, count, right=True)
+        return list(self._iter_between(first, last))
+
+    def read_downsampled(
+            self,
+            buckets: int,
+            start: Optional[float] = None,
+            end: Optional[float] = None
+    ) -> List[Sample]:
+        """
+        Averages the samples in [start, end] into equally sized time buckets.
+
+        :param buckets: Number of buckets.
+        :param start: Lower bound (inclusive). None means from the oldest sample.
+        :param end: Upper bound (inclusive). None means up to the latest sample.
+        :return: List of (bucket middle timestamp, mean value), skipping empty buckets.
+        """
+        count = len(self)
+        if count == 0 or buckets <= 0:
+            return []
+
+        first = 0 if start is None else self._bisect(start, count)
+        last = count if end is None else self._bisect(end, count, right=True)
+        if first >= last:
+            return []
+
+        start = self._timestamp_at(first) if start is None else start
+        end = self._timestamp_at(last - 1) if end is None else end
+        bucket_width = (end - start) / buckets or 1.0
+
+        sums = [0.0] * buckets
+        counts = [0] * buckets
+        for timestamp, value in self._iter_between(first, last):
+            bucket = min(int((timestamp - start) / bucket_width), buckets - 1)
+            sums[bucket] += value
+            counts[bucket] += 1
+
+        return [
+            (start + (bucket + 0.5) * bucket_width, sums[bucket] / counts[bucket])
+            for bucket in range(buckets)
+            if counts[bucket]
+        ]
+
+    def average(self, start: Optional[float] = None, end: Optional[float] = None) -> Optional[float]:
+        samples = self.read_range(start, end)
+        if not samples:
+            return None
+        return sum(value for _, value in samples) / len(samples)
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "RingBufferSeries":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
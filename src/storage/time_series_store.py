@@ -0,0 +1,67 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from simple_log_factory.log_factory import log_factory
+
+from src.storage.ring_buffer_series import RingBufferSeries, Sample
+from src.utils.series_utils import MinMaxPyramid
+
+
+class TimeSeriesStore:
+    """
+    One ring buffer file per series (e.g.: price, balance), all living in the same folder.
+
+    Series that get charted also get a MinMaxPyramid (see min_max_pyramid), kept up to date by append(), so a chart
+    reads a few hundred blocks instead of every sample.
+    """
+    def __init__(self, folder: Union[str, Path], capacity: int):
+        self._logger = log_factory("TimeSeriesStore", unique_handler_types=True)
+        self.folder = Path(folder)
+        self.capacity = capacity
+        self._series: Dict[str, RingBufferSeries] = {}
+        self._pyramids: Dict[str, MinMaxPyramid] = {}
+
+    def get_series(self, name: str) -> RingBufferSeries:
+        series = self._series.get(name)
+        if series is None:
+            series = RingBufferSeries(self.folder.joinpath(f"{name}.ring"), self.capacity)
+            self._series[name] = series
+        return series
+
+    def append(self, name: str, timestamp: float, value: float) -> bool:
+        stored = self.get_series(name).append(timestamp, value)
+        pyramid = self._pyramids.get(name)
+        if stored and pyramid is not None:
+            pyramid.append(value)
+        return stored
+
+    def min_max_pyramid(self, name: str) -> MinMaxPyramid:
+        """
+        :param name: Name of the series.
+        :return: Min/max blocks of the series' values (e.g.: for ImageBuilder.add_sparkline). Built from the file on
+        the first call (one pass over it), then kept up to date by append().
+        """
+        pyramid = self._pyramids.get(name)
+        if pyramid is None:
+            series = self.get_series(name)
+            pyramid = MinMaxPyramid(series.capacity, (value for _, value in series.read_range()))
+            self._pyramids[name] = pyramid
+        return pyramid
+
+    def read_range(self, name: str, start: Optional[float] = None, end: Optional[float] = None) -> List[Sample]:
+        return self.get_series(name).read_range(start, end)
+
+    def read_downsampled(
+            self,
+            name: str,
+            buckets: int,
+            start: Optional[float] = None,
+            end: Optional[float] = None
+    ) -> List[Sample]:
+        return self.get_series(name).read_downsampled(buckets, start, end)
+
+    def close(self):
+        for series in self._series.values():
+            series.close()
+        self._series.clear()
+        self._pyramids.clear()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Union
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes):
+    """
+    Writes a file atomically: readers see either the old file or the new one, never a partial write.
+
+    The data goes to a temporary file in the same folder first, which then replaces the target (os.replace is atomic
+    on the same file system).
+
+    :param path: File to write.
+    :param data: Content.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path: Union[str, Path], text: str):
+    atomic_write_bytes(path, text.encode("utf-8"))
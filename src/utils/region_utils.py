@@ -0,0 +1,55 @@
+from typing import Iterable, List, Optional, Tuple
+
+# (x0, y0, x1, y1), inclusive, in image pixels
+Region = Tuple[int, int, int, int]
+
+
+def union_regions(first: Optional[Region], second: Optional[Region]) -> Optional[Region]:
+    """
+    Smallest region containing both regions.
+
+    :param first: A region (or None).
+    :param second: Another region (or None).
+    :return: The union, or whichever one isn't None.
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+
+    return min(first[0], second[0]), min(first[1], second[1]), max(first[2], second[2]), max(first[3], second[3])
+
+
+def _touch(first: Region, second: Region) -> bool:
+    # Overlapping or adjacent (no pixel between them)
+    return (first[0] <= second[2] + 1 and second[0] <= first[2] + 1
+            and first[1] <= second[3] + 1 and second[1] <= first[3] + 1)
+
+
+def merge_regions(regions: Iterable[Region]) -> List[Region]:
+    """
+    Merges overlapping and adjacent regions into their union, until none of the remaining regions touch.
+
+    :param regions: Regions, in any order.
+    :return: Regions that don't overlap or touch each other, covering all the given ones.
+    """
+    merged: List[Region] = []
+    for region in regions:
+        # A union can grow into regions that were apart before, so keep merging until it stops growing
+        touching = [other for other in merged if _touch(region, other)]
+        while touching:
+            for other in touching:
+                merged.remove(other)
+                region = union_regions(region, other)
+            touching = [other for other in merged if _touch(region, other)]
+        merged.append(region)
+
+    return merged
+
+
+def clamp_region(region: Region, width: int, height: int) -> Region:
+    """
+    Clamps a region to the image bounds.
+    """
+    x0, y0, x1, y1 = region
+    return max(0, x0), max(0, y0), min(width - 1, x1), min(height - 1, y1)
@@ -0,0 +1,146 @@
+import math
+from array import array
+from typing import Iterable, List, Sequence, Tuple
+
+
+def min_max_downsample(values: Sequence[float], buckets: int) -> List[Tuple[float, float]]:
+    """
+    Reduces a series to (min, max) pairs, one per bucket.
+
+    Every value is read once, so the cost is O(len(values)). The Python loop only runs once per bucket, though: the
+    per-bucket reduction is done by the builtin min/max, in C. Each bucket is sliced first, which copies it once (also
+    in C, and cheaper than iterating it again from Python).
+
+    :param values: The series. Anything that can be sliced works (list, tuple, array.array, memoryview).
+    :param buckets: Number of buckets (usually the target width in pixels).
+    :return: A list of (min, max) tuples. If the series is shorter than the bucket count, one tuple per value.
+    """
+    count = len(values)
+    if count == 0 or buckets <= 0:
+        return []
+
+    if count <= buckets:
+        return [(value, value) for value in values]
+
+    result = []
+    for bucket in range(buckets):
+        start = bucket * count // buckets
+        end = (bucket + 1) * count // buckets
+        chunk = values[start:end]
+        result.append((min(chunk), max(chunk)))
+
+    return result
+
+
+class MinMaxPyramid:
+    """
+    Min and max of the latest samples of a series, per block of 1, 2, 4, 8... samples. Reducing the series to a few
+    hundred (min, max) pairs then reads about as many blocks, however many samples there are.
+
+    Appending is O(log capacity). Blocks are aligned on the number of samples ever appended, so dropping the oldest
+    samples doesn't move them: only the blocks that are entirely dropped go away.
+    """
+    def __init__(self, capacity: int, values: Iterable[float] = ()):
+        """
+        :param capacity: Number of samples kept. Older ones are dropped as new ones come in.
+        :param values: Initial samples, oldest first.
+        """
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+
+        self.capacity = capacity
+        # Samples [_start, _end) are kept, counting from the first sample ever appended
+        self._start = 0
+        self._end = 0
+        # Level k holds blocks of 2 ** k samples: _mins[k][i] covers block _offsets[k] + i. Level 0 holds the samples
+        # themselves, so its mins and maxs are the same array.
+        samples = array("d")
+        self._mins: List[array] = [samples]
+        self._maxs: List[array] = [samples]
+        self._offsets: List[int] = [0]
+        for _ in range(max(capacity - 1, 1).bit_length()):
+            self._mins.append(array("d"))
+            self._maxs.append(array("d"))
+            self._offsets.append(0)
+
+        for value in values:
+            self.append(value)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def append(self, value: float):
+        index = self._end
+        self._end += 1
+        self._mins[0].append(value)
+        for level in range(1, len(self._mins)):
+            position = (index >> level) - self._offsets[level]
+            mins, maxs = self._mins[level], self._maxs[level]
+            if position == len(mins):
+                mins.append(value)
+                maxs.append(value)
+            else:
+                if value < mins[position]:
+                    mins[position] = value
+                if value > maxs[position]:
+                    maxs[position] = value
+
+        if self._end - self._start > self.capacity:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        self._start += 1
+        for level, mins in enumerate(self._mins):
+            # Blocks that end at or before the oldest sample kept. Removed in batches: deleting from the front of an
+            # array moves the rest of it.
+            dropped = (self._start >> level) - self._offsets[level]
+            if dropped > 0 and dropped * 2 >= len(mins):
+                del mins[:dropped]
+                if self._maxs[level] is not mins:
+                    del self._maxs[level][:dropped]
+                self._offsets[level] += dropped
+
+    def _min_max(self, start: int, end: int) -> Tuple[float, float]:
+        """
+        Min and max of samples [start, end) (counting from the first sample ever appended), read from the biggest
+        blocks that fit.
+        """
+        top_level = len(self._mins) - 1
+        low, high = math.inf, -math.inf
+        while start < end:
+            # The biggest block that starts at start and doesn't go past end
+            level = min((start & -start).bit_length() - 1 if start else top_level, (end - start).bit_length() - 1,
+                        top_level)
+            position = (start >> level) - self._offsets[level]
+            low = min(low, self._mins[level][position])
+            high = max(high, self._maxs[level][position])
+            start += 1 << level
+        return low, high
+
+    def downsample(self, buckets: int) -> List[Tuple[float, float]]:
+        """
+        Same as min_max_downsample, in O(buckets + log capacity): bucket edges are moved to the nearest block edge
+        (by less than half a bucket), so each bucket is made of one to three whole blocks.
+
+        :param buckets: Number of buckets (usually the target width in pixels).
+        :return: A list of (min, max) tuples, oldest first. If there are fewer samples than buckets, one per sample.
+        """
+        count = len(self)
+        if count == 0 or buckets <= 0:
+            return []
+
+        if count <= buckets:
+            samples = self._mins[0]
+            first = self._start - self._offsets[0]
+            return [(value, value) for value in samples[first:first + count]]
+
+        # The biggest blocks that are no bigger than a bucket
+        level = (count // buckets).bit_length() - 1
+        half_block = (1 << level) >> 1
+        edges = [self._start]
+        for bucket in range(1, buckets):
+            edge = self._start + bucket * count // buckets
+            edges.append(((edge + half_block) >> level) << level)
+        edges.append(self._end)
+
+        return [self._min_max(start, end) for start, end in zip(edges, edges[1:])]
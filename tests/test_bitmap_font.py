@@ -0,0 +1,54 @@
+"""
+Baked bitmap fonts must draw text exactly like the font files do on 1-bit images: same bounding box, same pixels.
+"""
+import pytest
+from PIL import ImageFont
+
+import main as app
+from src.asset_baking.bake_assets import bake_font, font_sizes
+from src.config import BAKED_FONT_CHARACTERS
+from src.image_builder.bitmap_font import BitmapFont
+from src.image_builder.image_builder import _render_text_tile
+from src.image_builder.image_builder_types import ImageBuilderConfig
+
+CONFIG = ImageBuilderConfig()
+FONTS = [
+    pytest.param(font_path, size, id=f"{font_path.stem}-{size}")
+    for font_path in (CONFIG.default_font, CONFIG.default_font_bold)
+    for size in font_sizes()
+]
+
+
+def _layout_strings():
+    strings = {"USD", "1 XMR > USD", app.IDLE_STATUS, "Stale: P 12m, B 3h", "Stale: B 2d", "AVAyTo", "Wallet",
+               BAKED_FONT_CHARACTERS}
+    for wallet_value in (None, 0.0, 0.01234567, 1.5, 123.98765432):
+        for usd_value in (None, 0.0, 1.0, 150.25, 9876.54):
+            inputs = app.format_frame_inputs(wallet_value, usd_value, app.IDLE_STATUS, clock_time=0)
+            strings.update((inputs.wallet_value, inputs.usd_value, inputs.wallet_worth_value, inputs.clock_text))
+    return sorted(strings)
+
+
+LAYOUT_STRINGS = _layout_strings()
+
+
+@pytest.fixture(scope="module")
+def baked_fonts(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("baked")
+    return {(font_path, size): bake_font(font_path, size, folder, BAKED_FONT_CHARACTERS) for font_path, size in
+            (param.values for param in FONTS)}
+
+
+@pytest.mark.parametrize("font_path,size", FONTS)
+def test_bitmap_font_matches_the_font_file(baked_fonts, font_path, size):
+    font = ImageFont.truetype(str(font_path), size)
+    bitmap_font = BitmapFont(baked_fonts[font_path, size])
+    assert bitmap_font.covers(BAKED_FONT_CHARACTERS)
+
+    for text in [*LAYOUT_STRINGS, *BAKED_FONT_CHARACTERS]:
+        expected_bbox, expected_mask = _render_text_tile(text, font, "1")
+        bbox, mask = bitmap_font.render(text, "1")
+        assert bbox == expected_bbox, text
+        assert (mask is None) == (expected_mask is None), text
+        if mask is not None:
+            assert mask.tobytes() == expected_mask.tobytes(), text
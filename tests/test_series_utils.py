@@ -0,0 +1,34 @@
+"""
+MinMaxPyramid must give the exact min and max of every bucket it reports, including after old samples were dropped.
+"""
+import random
+
+import pytest
+
+from src.utils.series_utils import MinMaxPyramid
+
+
+def _expected(samples, start, buckets):
+    # downsample()'s buckets: an even split of samples[start:], with edges moved to the nearest block edge (blocks are
+    # aligned on the index among all the samples ever appended)
+    count = len(samples) - start
+    level = (count // buckets).bit_length() - 1
+    half_block = (1 << level) >> 1
+    edges = [start] + [((start + bucket * count // buckets + half_block) >> level) << level
+                       for bucket in range(1, buckets)] + [len(samples)]
+    return [(min(samples[first:last]), max(samples[first:last])) for first, last in zip(edges, edges[1:])]
+
+
+@pytest.mark.parametrize("capacity,appended", [(1, 5), (7, 3), (64, 64), (1000, 1000), (1000, 2345), (4096, 12289)])
+@pytest.mark.parametrize("buckets", [1, 3, 100, 250])
+def test_downsample_matches_the_samples(capacity, appended, buckets):
+    rng = random.Random(capacity * appended)
+    samples = [rng.uniform(-100, 100) for _ in range(appended)]
+    pyramid = MinMaxPyramid(capacity, samples)
+    start = max(appended - capacity, 0)
+
+    assert len(pyramid) == appended - start
+    if appended - start <= buckets:
+        assert pyramid.downsample(buckets) == [(value, value) for value in samples[start:]]
+    else:
+        assert pyramid.downsample(buckets) == _expected(samples, start, buckets)